@@ -10,9 +10,13 @@ from video_to_text.video_captioning import TarsierVideoCaptioningPipeline
 from text_to_video.embedding import FaissSearch
 from split_process.main_server.main_server_run import main as split_process_main
 from split_process.main_server.config import Config as SplitConfig
+from split_process.main_server.result_merge import load_delta_index
+from utils.annotation_index import get_annotation_index
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+YOUTUBE_8M_ANNOTATION_PATH = './videos/YouTube_8M/YouTube_8M_annotation/Movieclips_annotation.json'
+
 def video_to_text_process():
     """비디오를 텍스트로 변환하는 파이프라인"""
     print("\n🚀 비디오-텍스트 변환 파이프라인 시작...")
@@ -35,12 +39,15 @@ def video_to_text_process():
     # clips 디렉토리 생성
     os.makedirs(clips_dir, exist_ok=True)
 
+    # annotation은 한 번만 읽어(또는 디스크 인덱스에서) video_name/video_id로 조회
+    annotations = get_annotation_index(YOUTUBE_8M_ANNOTATION_PATH)
+
     # 파이프라인 초기화
     pipeline = TarsierVideoCaptioningPipeline(
         model_path=model_path,
         keep_clips=KEEP_CLIPS,
         mode="video2text",
-        video_metadata={},
+        video_metadata=annotations,
         clips_dir=clips_dir  # 클립 저장 경로 지정
     )
     
@@ -80,6 +87,9 @@ def video_to_text_process():
                 print(f"✅ 완료")
                 f.write("✅ 완료\n")
         
+        # 백그라운드 클립 저장 완료 대기
+        pipeline.wait_for_clips()
+        
         # 결과 출력
         print("\n📝 생성된 캡션:")
         print("=" * 80)
@@ -89,21 +99,10 @@ def video_to_text_process():
         for i, ((original_path, start_time, end_time), result) in enumerate(zip(video_list, results), 1):
             if 'YouTube_8M/YouTube_8M_video' in original_path:
                 video_name = os.path.basename(original_path)
-                mapping_path = './videos/YouTube_8M/YouTube_8M_annotation/Movieclips_annotation.json'
-                
-                try:
-                    with open(mapping_path, 'r', encoding='utf-8') as map_f:
-                        mapping_data = json.load(map_f)
-                        video_info = next(
-                            (item for item in mapping_data if item['video_name'] == video_name),
-                            None
-                        )
-                        if video_info:
-                            video_title = video_info['title']
-                            clip_info = f"\n🎬 클립 {i}: {video_title} (ID: {video_name})"
-                        else:
-                            clip_info = f"\n🎬 클립 {i}: {video_name}"
-                except Exception as e:
+                video_title = annotations.title(video_name)
+                if video_title:
+                    clip_info = f"\n🎬 클립 {i}: {video_title} (ID: {video_name})"
+                else:
                     clip_info = f"\n🎬 클립 {i}: {video_name}"
             else:
                 video_name = os.path.basename(original_path)
@@ -189,17 +188,15 @@ def text_to_video_search():
             
             print("📦 외부 비디오 전처리 시작...")
             process_start_time = time.time()
-            split_process_main()
+            try:
+                split_process_main()
+            except Exception as e:
+                # 그때까지 delta index에 합쳐진 결과로 계속 진행
+                print(f"⚠️ 분산 처리 중 오류 (병합된 결과까지만 사용): {str(e)}")
             
-            # JSON 결과 취합
+            # sub-server들이 스트리밍한 결과는 delta index에 중복 없이 합쳐져 있음
             print("\n📊 외부 비디오 전처리 결과 취합 중...")
-            json_results = []
-            json_dir = "/data/ephemeral/home/json"
-            
-            for json_file in os.listdir(json_dir):
-                if json_file.startswith("video_files_") and json_file.endswith(".json"):
-                    with open(os.path.join(json_dir, json_file), 'r') as f:
-                        json_results.extend(json.load(f))
+            json_results = load_delta_index(SplitConfig.DELTA_INDEX_PATH)
             
             # 새 결과를 DB에 저장
             with open(new_db_path, 'w', encoding='utf-8') as f:
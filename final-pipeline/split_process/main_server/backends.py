@@ -0,0 +1,241 @@
+import os
+import time
+import shlex
+import subprocess
+from .config import Config
+from .main_utils import remote_process_command, source_video_file
+from .scheduler import Worker, LocalProcessWorker
+from .transfer import SSHTransport, make_limiter
+from .local_worker import init_local_worker, process_local_unit
+
+# sub_server/inbox.py의 종료 표시와 같은 값
+END_OF_STREAM = "__END_OF_STREAM__"
+
+
+class SSHServerWorker(Worker):
+    """원격 서버 하나를 워커로 사용: 작업 단위의 파일을 tar 스트림 하나로 전송하고 그 파일들만 처리하도록 실행
+
+    전송과 원격 명령은 모두 transport의 멀티플렉싱된 SSH 연결 하나를 사용한다.
+    stream=True면 원격 소비자 프로세스를 처음에 한 번 띄워 두고, 작업 단위를 전송할 때마다 manifest에
+    파일명을 추가한다. 원격은 받는 즉시 캡션을 생성하므로 전송과 추론이 겹친다.
+    이때 원격에 쌓인 미처리 세그먼트가 prefetch개를 넘지 않을 때까지 기다렸다가 다음 단위를 가져간다.
+    처리 수는 원격 소비자가 실패, 건너뜀까지 포함해 기록하는 consumed 파일로 센다.
+    원격 소비자가 stall_timeout초 넘게 진행이 없으면 더 기다리지 않고 종료시킨다.
+    range_mode=True면 작업 단위의 항목은 구간 이름이고, 잘린 파일 대신 그 구간들의 원본 비디오를 보낸다
+    (이미 받은 원본은 크기 비교로 건너뛴다).
+    """
+
+    def __init__(self, server, transport, stream=False, prefetch=64, poll_interval=5.0, range_mode=False,
+                 stall_timeout=600):
+        super().__init__(server.ip)
+        self.server = server
+        self.transport = transport
+        self.stream = stream
+        self.range_mode = range_mode
+        self.prefetch = prefetch
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.manifest_path = os.path.join(Config.REMOTE_VIDEO_PATH, "manifest.txt")
+        self.consumer = None
+        self.enqueued = 0
+        self.processed_base = 0
+
+    def setup(self):
+        """원격 디렉토리 생성 및 스크립트 전송 (서버당 한 번), 스트리밍이면 소비자 시작"""
+        directories = ' '.join([Config.REMOTE_VIDEO_PATH, Config.REMOTE_JSON_PATH, Config.REMOTE_SCRIPT_PATH,
+                                Config.REMOTE_SOURCE_PATH])
+        if not self.transport.run(f'mkdir -p {directories}'):
+            return False
+        scripts = [os.path.basename(path) for path in Config.FILE_LIST if os.path.isfile(path)]
+        if not self.transport.send(scripts, Config.SCRIPT_FOLDER, Config.REMOTE_SCRIPT_PATH):
+            return False
+
+        # 상주 워커 데몬이 없으면 시작 (모델은 데몬에서 한 번만 로드, 이후 작업은 데몬에 제출됨)
+        if Config.USE_WORKER_DAEMON:
+            client = os.path.join(Config.REMOTE_SCRIPT_PATH, "worker_client.py")
+            if not self.transport.run(f'/opt/conda/bin/python {client} start'):
+                return False
+
+        if self.stream:
+            # 이전 실행의 manifest/종료 표시를 지우고 빈 manifest로 시작
+            end_marker = os.path.join(Config.REMOTE_VIDEO_PATH, END_OF_STREAM)
+            consumed = f"{shlex.quote(Config.REMOTE_JSON_PATH)}/consumed_*.txt"
+            if not self.transport.run(f'rm -f {shlex.quote(end_marker)} {consumed} '
+                                      f'&& : > {shlex.quote(self.manifest_path)}'):
+                return False
+            self.processed_base = self.processed_count() or 0
+            self.consumer = self.transport.spawn(remote_process_command(['--stream']))
+        return True
+
+    def processed_count(self):
+        """원격 소비자가 처리를 끝낸 세그먼트 수 (실패, 건너뜀 포함, 확인 실패 시 None)"""
+        output = self.transport.output(
+            f'cat {shlex.quote(Config.REMOTE_JSON_PATH)}/consumed_*.txt 2>/dev/null | wc -l')
+        return int(output.strip()) if output and output.strip().isdigit() else None
+
+    def process(self, unit):
+        if self.range_mode:
+            files = sorted({source_video_file(video_file) for video_file in unit.items})
+            sent = self.transport.send(files, Config.VIDEOS_DIR, Config.REMOTE_SOURCE_PATH)
+        else:
+            files = unit.items
+            sent = self.transport.send(files, Config.SPLIT_VIDEOS_DIR, Config.REMOTE_VIDEO_PATH)
+        if not sent:
+            raise RuntimeError(f"전송 실패: {self.server.ip} ({len(files)}개 파일)")
+        if not self.stream:
+            if not self.transport.run(remote_process_command(unit.items)):
+                raise RuntimeError(f"원격 처리 실패: {self.server.ip}")
+            return unit.items
+
+        if self.consumer.poll() is not None:
+            raise RuntimeError(f"원격 소비자 종료됨: {self.server.ip}")
+        names = ' '.join(shlex.quote(video_file) for video_file in unit.items)
+        if not self.transport.run(f"printf '%s\\n' {names} >> {shlex.quote(self.manifest_path)}"):
+            raise RuntimeError(f"manifest 추가 실패: {self.server.ip}")
+        self.enqueued += len(unit.items)
+        self._wait_for_backlog()
+        return unit.items
+
+    def healthy(self):
+        return not self.stream or (self.consumer is not None and self.consumer.poll() is None)
+
+    def heartbeat(self):
+        """SSH 연결로 원격 서버가 응답하는지 확인 (스트리밍이면 원격 소비자도 살아 있어야 함)"""
+        return self.healthy() and self.transport.output('echo ok') is not None
+
+    def _wait_for_backlog(self):
+        """원격 미처리 세그먼트가 prefetch개 이하가 될 때까지 대기 (stall_timeout초 넘게 진행이 없으면 실패)"""
+        last_processed, last_progress = None, time.time()
+        while self.consumer.poll() is None:
+            processed = self.processed_count()
+            if processed is None or self.enqueued - (processed - self.processed_base) <= self.prefetch:
+                return
+            if processed != last_processed:
+                last_processed, last_progress = processed, time.time()
+            elif time.time() - last_progress > self.stall_timeout:
+                # 소비자를 종료하면 healthy()가 False가 되어 이 워커는 제외되고 단위는 다른 워커에서 다시 처리된다
+                self.abandon()
+                raise RuntimeError(f"원격 소비자 {self.stall_timeout}초 동안 진행 없음: {self.server.ip}")
+            time.sleep(self.poll_interval)
+
+    def finish(self):
+        """스트리밍 종료 표시를 보내고 원격 소비자가 남은 파일을 모두 처리할 때까지 대기"""
+        if self.consumer is None:
+            return
+        self.transport.run(f"echo {END_OF_STREAM} >> {shlex.quote(self.manifest_path)}")
+        last_processed, last_progress = None, time.time()
+        while True:
+            try:
+                self.consumer.wait(timeout=self.poll_interval)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            processed = self.processed_count()
+            if processed != last_processed:
+                last_processed, last_progress = processed, time.time()
+            elif time.time() - last_progress > self.stall_timeout:
+                print(f"⏱️ 원격 소비자 {self.stall_timeout}초 동안 진행 없음, 종료: {self.server.ip}")
+                self.abandon()
+                break
+        self.consumer = None
+
+    def abandon(self):
+        """원격 소비자(SSH 세션)를 종료 (남은 세그먼트는 재조정 라운드에서 다시 처리됨)"""
+        if self.consumer is not None and self.consumer.poll() is None:
+            self.consumer.kill()
+            self.consumer.wait()
+
+    def close(self):
+        self.transport.close()
+
+
+class ExecutionBackend:
+    """작업 단위를 처리할 워커들을 만드는 실행 백엔드 (스케줄링과 결과 병합은 백엔드와 무관하게 공통)"""
+
+    name = "base"
+
+    def create_workers(self):
+        """사용 가능한 워커 리스트 (준비에 실패한 워커는 제외)"""
+        raise NotImplementedError
+
+
+class SSHBackend(ExecutionBackend):
+    """원격 서버마다 SSHServerWorker 하나"""
+
+    name = "ssh"
+
+    def __init__(self, servers, stream=None, prefetch=None, max_parallel_transfers=None, range_mode=None):
+        self.servers = servers
+        self.range_mode = Config.RANGE_MODE if range_mode is None else range_mode
+        self.stream = Config.STREAMING if stream is None else stream
+        self.prefetch = prefetch or Config.STREAM_PREFETCH_SEGMENTS
+        self.max_parallel_transfers = max_parallel_transfers or Config.MAX_PARALLEL_TRANSFERS
+
+    def create_workers(self):
+        os.chmod(Config.SSH_KEY_PATH, 0o600)
+        # 서버마다 SSH 연결 하나를 유지하고, 서버 간 동시 전송 수는 max_parallel_transfers로 제한
+        limiter = make_limiter(self.max_parallel_transfers)
+        workers = []
+        for server in self.servers:
+            worker = SSHServerWorker(server, SSHTransport(server, Config.SSH_KEY_PATH, limiter=limiter),
+                                     stream=self.stream, prefetch=self.prefetch, range_mode=self.range_mode,
+                                     stall_timeout=Config.STREAM_STALL_TIMEOUT)
+            if worker.setup():  # 원격 디렉토리 생성 및 스크립트 전송 (서버당 한 번)
+                workers.append(worker)
+            else:
+                worker.close()
+        return workers
+
+
+class LocalBackend(ExecutionBackend):
+    """한 대의 호스트에서 워커 프로세스 num_workers개로 처리 (CPU 코어/GPU를 워커마다 나눠 고정)
+
+    각 워커 프로세스는 모델을 한 번 로드해 두고, 분할된 세그먼트를 전송 없이 SPLIT_VIDEOS_DIR에서 바로 읽는다.
+    range 모드에서는 원본 비디오를 VIDEOS_DIR에서 바로 샘플링한다.
+    결과는 원격 서버와 같은 형식으로 RESULTS_DIR/video_files_{worker_id}.jsonl에 스트리밍되어 같은 병합기로 합쳐진다.
+    devices를 주면 워커마다 순서대로 하나씩 CUDA_VISIBLE_DEVICES로 배정한다.
+    """
+
+    name = "local"
+
+    def __init__(self, num_workers=None, devices=None, cpus_per_worker=None, work_dir=None):
+        self.num_workers = num_workers or Config.LOCAL_NUM_WORKERS
+        self.devices = Config.LOCAL_DEVICES if devices is None else devices
+        self.cpus_per_worker = cpus_per_worker or Config.LOCAL_CPUS_PER_WORKER
+        self.work_dir = work_dir or Config.LOCAL_WORK_DIR
+
+    def cpu_sets(self):
+        """워커마다 겹치지 않는 CPU 코어 묶음 (cpus_per_worker가 없으면 균등 분할)"""
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = self.cpus_per_worker or max(1, len(cpus) // self.num_workers)
+        return [cpus[i * per_worker:(i + 1) * per_worker] or None for i in range(self.num_workers)]
+
+    def create_workers(self):
+        sub_server_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sub_server")
+        workers = []
+        for index, cpus in enumerate(self.cpu_sets()):
+            worker_id = f"local-{index}"
+            device = self.devices[index % len(self.devices)] if self.devices else None
+            results_path = os.path.join(Config.RESULTS_DIR, f"video_files_{worker_id}.jsonl")
+            progress_path = os.path.join(Config.RESULTS_DIR, f"progress_{worker_id}.jsonl")
+            print(f"🧵 {worker_id}: CPU {cpus[0] if cpus else '-'}~{cpus[-1] if cpus else '-'}, GPU {device}")
+            workers.append(LocalProcessWorker(
+                worker_id, process_local_unit,
+                process_args=(results_path, progress_path),
+                init_fn=init_local_worker,
+                init_args=(worker_id, sub_server_dir, os.path.abspath(Config.SPLIT_VIDEOS_DIR),
+                           os.path.join(os.path.abspath(self.work_dir), worker_id), cpus, device,
+                           os.path.abspath(Config.VIDEOS_DIR)),
+            ))
+        return workers
+
+
+def create_backend(name=None):
+    """Config.BACKEND("ssh" 또는 "local")에 맞는 실행 백엔드"""
+    name = name or Config.BACKEND
+    if name == "local":
+        return LocalBackend()
+    if name == "ssh":
+        from .server_info import SERVERS
+        return SSHBackend(SERVERS)
+    raise ValueError(f"알 수 없는 실행 백엔드: {name}")
@@ -18,6 +18,33 @@ class Config:
     REMOTE_VIDEO_PATH = os.path.join(REMOTE_PATH, "split_process_videos")
     REMOTE_JSON_PATH = os.path.join(REMOTE_PATH, "split_process_json")
     REMOTE_SCRIPT_PATH = os.path.join(REMOTE_PATH, "split_process_script")
+    REMOTE_SOURCE_PATH = os.path.join(REMOTE_PATH, "split_process_sources") #range 모드에서 원본 비디오를 받는 폴더 (sub_server config의 source_dir)
+    RESULTS_DIR = "/data/ephemeral/home/json" #Sub가 결과 JSONL을 스트리밍하는 폴더 (sub_server config의 remote_path)
+    DELTA_INDEX_PATH = os.path.join(RESULTS_DIR, "delta_index.jsonl") #중복 제거 후 합쳐진 새 비디오 결과
+    JOB_MANIFEST_PATH = os.path.join(RESULTS_DIR, "job_manifest.json") #작업 단위별 상태 기록
+    RECONCILE_REPORT_PATH = os.path.join(RESULTS_DIR, "missing_segments.json") #캡션이 생성되지 않은 세그먼트 보고서
+    PERF_SUMMARY_PATH = os.path.join(RESULTS_DIR, "node_performance.json") #노드별 처리량/사용률 요약
     SUB_SCRIPT_FILE = os.path.join(REMOTE_SCRIPT_PATH, "sub_server_run.py")
 
     FILE_LIST = glob.glob(f"{SCRIPT_FOLDER}/*")
+
+    UNITS_PER_WORKER = 4 #서버당 작업 단위 수 (클수록 부하 분산이 고르지만 원격 실행 횟수가 늘어남)
+    MAX_ATTEMPTS = 3 #작업 단위당 최대 시도 횟수
+    HEARTBEAT_INTERVAL = 30 #워커 heartbeat 확인 주기 (초)
+    HEARTBEAT_TIMEOUT = 180 #이 시간 동안 heartbeat가 없으면 워커를 제외하고 작업 재배정 (초)
+    UNIT_TIMEOUT_FACTOR = 4.0 #작업 단위가 예상 처리 시간의 몇 배를 넘기면 멈춘 것으로 보고 재배정할지
+    MIN_UNIT_TIMEOUT = 600 #작업 단위 시간 초과의 최소값 (초)
+    RECONCILE_ROUNDS = 1 #캡션이 없는 세그먼트를 다시 처리할 라운드 수
+    PROGRESS_INTERVAL = 10 #진행 상황 출력 주기 (초)
+    PROGRESS_HTTP_PORT = None #진행 상황을 HTTP로 보여줄 포트 (예: 8765, None이면 콘솔만)
+    MAX_PARALLEL_TRANSFERS = 2 #여러 서버로 동시에 진행할 tar 전송 수
+    RANGE_MODE = False #True면 비디오를 미리 자르지 않고 원본과 구간 리스트를 보내 Sub가 원본에서 바로 샘플링
+    STREAMING = True #원격에서 파일이 도착하는 대로 캡션 생성 (전송과 추론을 겹침)
+    STREAM_PREFETCH_SEGMENTS = 64 #스트리밍 시 서버마다 미리 보내 둘 미처리 세그먼트 수
+    STREAM_STALL_TIMEOUT = 600 #스트리밍 종료 대기 중 원격 진행이 이 시간(초) 동안 없으면 원격 소비자를 종료
+    BACKEND = "ssh" #실행 백엔드: "ssh"(SERVERS의 원격 서버) 또는 "local"(이 호스트의 워커 프로세스)
+    LOCAL_NUM_WORKERS = 2 #local 백엔드 워커 프로세스 수
+    LOCAL_DEVICES = ["0", "1"] #local 백엔드 워커에 순서대로 배정할 GPU (빈 리스트면 고정하지 않음)
+    LOCAL_CPUS_PER_WORKER = None #워커당 고정할 CPU 코어 수 (None이면 균등 분할)
+    LOCAL_WORK_DIR = "/data/ephemeral/home/split_process/local_workers" #local 워커별 체크포인트/캐시 폴더
+    USE_WORKER_DAEMON = True #Sub에 모델을 상주시키는 워커 데몬을 띄워 작업마다 모델을 다시 로드하지 않음
@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+
+from .result_merge import load_delta_index, record_key, segment_key
+
+
+class JobManifest:
+    """작업 단위와 상태를 디스크에 기록하는 manifest (JSON)
+
+    상태가 바뀔 때마다 임시 파일에 쓴 뒤 os.replace로 교체하므로 메인 서버가 중간에 죽어도 마지막 상태가 남는다.
+    units: unit_id -> {"items", "cost", "state"(pending/running/done/failed), "attempts", "workers", "error", "updated_at"}
+    스트리밍 모드에서 done은 원격에 전달 완료를 뜻하므로, 캡션 생성 여부는 reconcile로 delta index와 대조해 확인한다.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.units = {}
+        self.events = []
+
+    def start(self, units):
+        """작업 단위 등록 (재조정 라운드에서 다시 호출하면 unit_id가 겹치지 않게 이어서 추가)"""
+        with self.lock:
+            self.units.update({
+                str(unit.unit_id): {"items": unit.items, "cost": unit.cost, "state": "pending", "attempts": 0,
+                                    "workers": [], "error": None, "updated_at": time.time()}
+                for unit in units
+            })
+            self._save()
+
+    def update(self, unit, state, worker_id=None, error=None):
+        """단위 상태 변경 기록"""
+        with self.lock:
+            entry = self.units.get(str(unit.unit_id))
+            if entry is None:
+                return
+            entry.update(state=state, attempts=unit.attempts, updated_at=time.time())
+            if worker_id is not None and worker_id not in entry["workers"]:
+                entry["workers"].append(worker_id)
+            if error is not None:
+                entry["error"] = str(error)
+            self.events.append({"time": entry["updated_at"], "unit_id": unit.unit_id, "state": state,
+                                "worker": worker_id, "error": None if error is None else str(error)})
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"updated_at": time.time(), "units": self.units,
+                       "events": self.events[-1000:]}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+
+def reconcile(video_files, index_path, report_path=None):
+    """캡션 결과(delta index)가 없는 세그먼트 목록. report_path가 있으면 JSON 보고서로 저장"""
+    captioned = {record_key(result) for result in load_delta_index(index_path)}
+    missing = sorted(video_file for video_file in video_files if segment_key(video_file) not in captioned)
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump({"created_at": time.time(), "total_segments": len(video_files),
+                       "captioned_segments": len(video_files) - len(missing),
+                       "missing_segments": missing}, f, ensure_ascii=False, indent=2)
+    return missing
+
+
+def summarize(manifest):
+    """상태별 작업 단위 수"""
+    with manifest.lock:
+        return dict(Counter(entry["state"] for entry in manifest.units.values()))
@@ -0,0 +1,52 @@
+import os
+import json
+import argparse
+
+from .config import Config
+from .backends import LocalBackend
+from .main_server_run import main as run_pipeline
+from .scheduler import parse_segment_duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local backend throughput by number of worker processes')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='비교할 워커 프로세스 수')
+    parser.add_argument('--devices', nargs='*', default=None, help='워커에 배정할 GPU (기본: Config.LOCAL_DEVICES)')
+    parser.add_argument('--cpus-per-worker', type=int, default=None)
+    parser.add_argument('--report', default=None, help='결과를 저장할 JSON 경로')
+    args = parser.parse_args()
+
+    report = []
+    for num_workers in args.workers:
+        # 워커 수마다 체크포인트/캐시 폴더를 따로 써서 이전 실행 결과를 건너뛰지 않게 한다
+        work_dir = os.path.join(Config.LOCAL_WORK_DIR, f"benchmark_{num_workers}")
+        backend = LocalBackend(num_workers=num_workers, devices=args.devices,
+                               cpus_per_worker=args.cpus_per_worker, work_dir=work_dir)
+        print(f"\n🧪 로컬 워커 {num_workers}개")
+        scheduler = run_pipeline(backend, skip_captioned=False)
+        if scheduler is None:
+            return
+
+        segments = [item for unit_id in scheduler.done for item in scheduler.units[unit_id].items]
+        video_seconds = sum(parse_segment_duration(segment) for segment in segments)
+        report.append({
+            "workers": num_workers,
+            "elapsed": scheduler.elapsed,
+            "segments": len(segments),
+            "segments_per_sec": len(segments) / scheduler.elapsed,
+            "video_sec_per_sec": video_seconds / scheduler.elapsed,
+            "failed_units": len(scheduler.failed),
+        })
+
+    print("\n📊 워커 수별 처리량")
+    for row in report:
+        print(f"  워커 {row['workers']}개: {row['elapsed']:.1f}초, {row['segments_per_sec']:.2f} 세그먼트/초, "
+              f"{row['video_sec_per_sec']:.2f} 비디오초/초, 실패 단위 {row['failed_units']}개")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 결과 저장: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
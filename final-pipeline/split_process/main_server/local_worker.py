@@ -0,0 +1,52 @@
+import os
+import sys
+import shlex
+
+# 로컬 워커 프로세스 전용 (init_local_worker에서 로드한 모델)
+_models = None
+
+
+def init_local_worker(worker_id, sub_server_dir, video_dir, work_dir, cpus=None, device=None, source_dir=None):
+    """로컬 워커 프로세스 초기화: CPU/GPU 고정 후 sub_server 코드와 모델을 한 번 로드
+
+    torch를 import하기 전에 CUDA_VISIBLE_DEVICES를 설정해야 하므로 이 모듈은 최상위에서 torch를 import하지 않는다.
+    sub_server 설정은 환경 변수로 넘기므로 이 프로세스가 띄우는 디코딩 워커에도 그대로 적용된다.
+    """
+    global _models
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+        os.environ["OMP_NUM_THREADS"] = str(len(cpus))
+    if device is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(device)
+    os.environ["SPLIT_PROCESS_NODE_ID"] = worker_id
+    os.environ["SPLIT_PROCESS_HOME"] = work_dir
+    os.environ["SPLIT_PROCESS_VIDEO_DIR"] = video_dir
+    if source_dir is not None:
+        os.environ["SPLIT_PROCESS_SOURCE_DIR"] = source_dir
+
+    # sub_server 코드는 평면 import(from config import Config)를 사용
+    sys.path.insert(0, sub_server_dir)
+    from sub_server_process import load_models
+    _models = load_models()
+
+
+def process_local_unit(video_files, results_path, progress_path=None):
+    """작업 단위를 로드된 모델로 처리하고 결과를 results_path, 진행 상황을 progress_path(JSONL)에 스트리밍"""
+    from config import Config
+    from sub_server_process import process
+    from result_stream import ResultStreamer
+
+    os.makedirs(os.path.dirname(results_path), exist_ok=True)
+    streamer = ResultStreamer(['sh', '-c', f'cat >> {shlex.quote(results_path)}'])
+    progress_streamer = None
+    if progress_path:
+        progress_streamer = ResultStreamer(['sh', '-c', f'cat >> {shlex.quote(progress_path)}'], batch_size=1,
+                                           label="진행 상황")
+    try:
+        process(video_files=video_files, result_sink=streamer.put, models=_models,
+                progress_sink=(lambda event: progress_streamer.put(Config.node_id, event)) if progress_streamer else None)
+    finally:
+        streamer.close()
+        if progress_streamer is not None:
+            progress_streamer.close()
+    return video_files
@@ -1,48 +1,110 @@
-import os
-import threading
 from .config import Config
-from .server_info import SERVERS
-from .main_utils import create_remote_directory, distribute_files_round_robin, scp_transfer, run_scene_splitter,split_process_videos,get_video_files
+from .main_utils import split_process_videos, get_video_files, plan_segment_ranges
+from .scheduler import WorkScheduler, make_work_units, estimate_segment_cost, parse_segment_duration
+from .backends import create_backend
+from .result_merge import DeltaIndexMerger
+from .job_manifest import JobManifest, reconcile, summarize
+from .progress_monitor import ProgressMonitor
 
 
-def process_server(server_idx, server, files_to_transfer):
-    """각 서버에서 파일 전송 후 스크립트 실행"""
-    for file in files_to_transfer:
-        if not scp_transfer(os.path.join(Config.SPLIT_VIDEOS_DIR, file), server):
-            continue
-    run_scene_splitter(server)
+def run_round(backend, video_files, manifest):
+    """세그먼트들을 작업 단위로 나눠 backend의 워커들로 처리하고 스케줄러 반환 (워커가 없으면 None)"""
+    workers = backend.create_workers()
+    if not workers:
+        print("사용 가능한 서버가 없습니다.")
+        return None
 
+    # 예상 비용(프레임 × 토큰) 기준으로 작업 단위를 만들고, 서버가 끝나는 대로 다음 단위를 가져가게 한다
+    # (워커 데몬 없이 실행하면 단위마다 모델을 로드하므로 서버당 UNITS_PER_WORKER개 정도로 묶음)
+    total_cost = sum(estimate_segment_cost(parse_segment_duration(video_file)) for video_file in video_files)
+    units = make_work_units(video_files, target_cost=total_cost / (len(workers) * Config.UNITS_PER_WORKER),
+                            first_id=len(manifest.units))
+    print(f"📦 세그먼트 {len(video_files)}개 -> 작업 단위 {len(units)}개, 워커 {len(workers)}개 ({backend.name})")
 
-def main():
-    """메인 실행 함수"""
-    os.chmod(Config.SSH_KEY_PATH, 0o600)
+    scheduler = WorkScheduler(units, max_attempts=Config.MAX_ATTEMPTS, manifest=manifest,
+                              heartbeat_interval=Config.HEARTBEAT_INTERVAL,
+                              heartbeat_timeout=Config.HEARTBEAT_TIMEOUT,
+                              unit_timeout_factor=Config.UNIT_TIMEOUT_FACTOR,
+                              min_unit_timeout=Config.MIN_UNIT_TIMEOUT)
+    try:
+        scheduler.run(workers)
+        for worker in workers:
+            if worker.worker_id in scheduler.lost:
+                worker.abandon()  # 멈춘 워커는 기다리지 않음
+            else:
+                worker.finish()
+    finally:
+        for worker in workers:
+            worker.close()
+    print(scheduler.summary())
+    return scheduler
 
-    # 원격 서버 디렉토리 생성 (순차 실행)
-    for server in SERVERS:
-        if not create_remote_directory(server):
-            return
 
-    # 비디오 파일 가져오기
-    split_process_videos(videos_dir=Config.VIDEOS_DIR, output_dir=Config.SPLIT_VIDEOS_DIR)
-    video_files = get_video_files(Config.SPLIT_VIDEOS_DIR)
+def main(backend=None, skip_captioned=True):
+    """메인 실행 함수 (backend가 없으면 Config.BACKEND에 따라 SSH 또는 로컬 멀티 프로세스로 실행)
+
+    작업 단위 상태는 JOB_MANIFEST_PATH에 기록되고, 끝난 뒤 delta index와 대조해 캡션이 없는 세그먼트를
+    RECONCILE_ROUNDS번까지 다시 처리한다. 그래도 남은 세그먼트는 RECONCILE_REPORT_PATH에 기록한다.
+    워커들의 진행 상황 이벤트는 PROGRESS_INTERVAL초마다 콘솔(과 PROGRESS_HTTP_PORT)에 보여주고,
+    끝나면 노드별 성능 요약을 PERF_SUMMARY_PATH에 저장한다.
+    """
+    backend = backend or create_backend()
+
+    # 비디오 파일 가져오기 (range 모드면 자르지 않고 구간 이름만 만들어 원본과 함께 보냄)
+    if Config.RANGE_MODE:
+        video_files = plan_segment_ranges(Config.VIDEOS_DIR)
+    else:
+        split_process_videos(videos_dir=Config.VIDEOS_DIR, output_dir=Config.SPLIT_VIDEOS_DIR)
+        video_files = get_video_files(Config.SPLIT_VIDEOS_DIR)
     if not video_files:
         print("처리할 비디오 파일이 없습니다.")
         return
 
-    # 파일 분배
-    distribution = distribute_files_round_robin(video_files, len(SERVERS))
-    print(distribution)
-    # 서버에 파일 전송 및 스크립트 실행 (병렬 처리)
-    threads = []
-    for server_idx, server in enumerate(SERVERS, 0):
-        files_to_transfer = distribution.get(server_idx, [])
-        thread = threading.Thread(target=process_server, args=(server_idx, server, files_to_transfer))
-        threads.append(thread)
-        thread.start()
-
-    # 모든 스레드 완료 대기
-    for thread in threads:
-        thread.join()
+    # 이전 실행에서 이미 캡션이 합쳐진 세그먼트는 건너뜀
+    todo = reconcile(video_files, Config.DELTA_INDEX_PATH) if skip_captioned else video_files
+    if len(todo) < len(video_files):
+        print(f"⏭️ 이미 캡션이 있는 세그먼트 {len(video_files) - len(todo)}개 건너뜀")
+
+    # sub-server가 스트리밍하는 결과를 delta index에 계속 합침 (중간에 멈춰도 합쳐진 결과는 검색 가능)
+    merger = DeltaIndexMerger(Config.RESULTS_DIR, Config.DELTA_INDEX_PATH)
+    merger.start()
+    manifest = JobManifest(Config.JOB_MANIFEST_PATH)
+    monitor = ProgressMonitor(Config.RESULTS_DIR, total_segments=len(todo), interval=Config.PROGRESS_INTERVAL,
+                              http_port=Config.PROGRESS_HTTP_PORT)
+    monitor.start()
+
+    scheduler = None
+    worker_stats = {}
+    try:
+        for round_idx in range(Config.RECONCILE_ROUNDS + 1):
+            if not todo:
+                break
+            if round_idx:
+                print(f"🔁 캡션이 없는 세그먼트 {len(todo)}개 재처리 ({round_idx}/{Config.RECONCILE_ROUNDS})")
+            round_scheduler = run_round(backend, todo, manifest)
+            if round_scheduler is None:
+                break
+            scheduler = round_scheduler
+            for worker_id, stats in scheduler.worker_stats.items():
+                totals = worker_stats.setdefault(str(worker_id), dict.fromkeys(stats, 0))
+                for key, value in stats.items():
+                    totals[key] += value
+            merger.merge_once()
+            merger.merge_final_files()
+            todo = reconcile(todo, Config.DELTA_INDEX_PATH)
+    finally:
+        merger.stop()
+        monitor.stop()
+    monitor.write_summary(Config.PERF_SUMMARY_PATH, worker_stats=worker_stats)
+
+    # 끝까지 캡션이 생성되지 않은 세그먼트 보고
+    missing = reconcile(video_files, Config.DELTA_INDEX_PATH, report_path=Config.RECONCILE_REPORT_PATH)
+    print(f"📋 작업 단위 상태: {summarize(manifest)} ({Config.JOB_MANIFEST_PATH})")
+    if missing:
+        print(f"🚨 캡션이 없는 세그먼트 {len(missing)}/{len(video_files)}개: {Config.RECONCILE_REPORT_PATH}")
+    else:
+        print(f"✅ 모든 세그먼트({len(video_files)}개)의 캡션 생성 확인")
+    return scheduler
 
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
 import os
 import subprocess
 import math
+import time
+import shlex
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Dict
 from .config import Config
 from .server_info import ServerInfo
+from utils.video_metadata import get_metadata_cache
+from utils.segment_muxer import mux_segments
 
 
 def execute_command(cmd: List[str], error_message: str) -> bool:
@@ -31,18 +36,33 @@ def create_remote_directory(server: ServerInfo) -> bool:
         f"원격 디렉토리 생성 실패: {server.ip}") for dir in directories)
 
 
-def run_scene_splitter(server: ServerInfo) -> bool:
-    """서버에서 스크립트 실행"""
+def upload_scripts(server: ServerInfo) -> bool:
+    """서버에 sub_server 스크립트 전송"""
     scp_script_cmd = ['scp', '-i', Config.SSH_KEY_PATH, '-P', str(server.port)] + Config.FILE_LIST + \
                      [f'{server.username}@{server.ip}:{Config.REMOTE_SCRIPT_PATH}']
-    if not execute_command(scp_script_cmd, f"스크립트 전송 실패: {server.ip}"):
-        return False
+    return execute_command(scp_script_cmd, f"스크립트 전송 실패: {server.ip}")
+
+
+def remote_process_command(video_files: List[str] = None) -> str:
+    """sub_server 스크립트 실행 명령 (video_files를 주면 그 파일들만 처리)"""
+    file_args = ' '.join(shlex.quote(video_file) for video_file in video_files or [])
+    return f'/opt/conda/bin/python {Config.SUB_SCRIPT_FILE} {file_args}'
 
+
+def run_remote_process(server: ServerInfo, video_files: List[str] = None) -> bool:
+    """서버에서 sub_server 스크립트 실행 (video_files를 주면 그 파일들만 처리)"""
     run_script_cmd = ['ssh','-o StrictHostKeyChecking=no', '-i', Config.SSH_KEY_PATH, '-p', str(server.port),
-                      f'{server.username}@{server.ip}', f'/opt/conda/bin/python {Config.SUB_SCRIPT_FILE}']
+                      f'{server.username}@{server.ip}', remote_process_command(video_files)]
     return execute_command(run_script_cmd, f"scene_splitter 실행 실패: {server.ip}")
 
 
+def run_scene_splitter(server: ServerInfo) -> bool:
+    """서버에서 스크립트 실행"""
+    if not upload_scripts(server):
+        return False
+    return run_remote_process(server)
+
+
 def get_video_files(videos_dir: str) -> List[str]:
     """비디오 파일 리스트 가져오기"""
     return [f for f in os.listdir(videos_dir) if f.endswith('.mp4')]
@@ -60,56 +80,85 @@ def distribute_files_round_robin(files: List[str], num_servers: int) -> Dict[int
 
 
 ####ffmpeg -st
-def save_segment(video_path, output_path, start_time, end_time):
-    """비디오에서 지정된 구간을 잘라서 저장하는 함수
-    
-    Args:
-        video_path (str): 원본 비디오 파일 경로
-        output_path (str): 저장될 클립 파일 경로
-        start_time (float): 클립 시작 시간
-        end_time (float): 클립 종료 시간
-    """
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # 폴더가 없으면 생성
-    
-    command = [
-        "ffmpeg",
-        "-ss", str(start_time),
-        "-i", video_path,
-        "-t", str(end_time - start_time),
-        "-c", "copy",
-        output_path,
-        "-y"
-    ]
-    
+def split_video(video_path: str, output_dir: str, segment_duration: int = 5, keyframe_tolerance: float = None):
+    """비디오를 segment_duration 초 단위로 분할하여 저장하는 함수
 
-    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    ffmpeg segment muxer로 한 번의 패스에서 모든 세그먼트를 스트림 복사로 저장하고,
+    muxer의 세그먼트 리스트에 기록된 실제 구간으로 파일명({video_name}_{start}_{end}.mp4)을 정한다.
+    keyframe_tolerance를 주면 경계를 (목표 시각 ± tolerance 안의) 키프레임에 맞춘다.
 
-def split_video(video_path: str, output_dir: str, segment_duration: int = 5):
-    """비디오를 segment_duration 초 단위로 분할하여 저장하는 함수"""
+    Returns:
+        list of tuple: (세그먼트 파일 경로, 시작 시간, 종료 시간)
+    """
     os.makedirs(output_dir, exist_ok=True)
     
-    # 비디오 길이 가져오기
-    command = [
-        "ffprobe", "-i", video_path, "-show_entries", "format=duration", "-v", "quiet", "-of", "csv=p=0"
-    ]
-    
-    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    duration = float(result.stdout.strip())
-    
     video_name = os.path.splitext(os.path.basename(video_path))[0]
-    
-    for start in range(0, int(duration), segment_duration):
-        end = min(start + segment_duration, duration)
-        output_path = os.path.join(output_dir, f"{video_name}_{start}_{end}.mp4")
-        save_segment(video_path, output_path, start, end)
 
+    segment_times = None
+    if keyframe_tolerance is not None:
+        from utils.video_split import KeyframeAlignedSegmenter
+        segmenter = KeyframeAlignedSegmenter(segment_duration, tolerance=keyframe_tolerance,
+                                             metadata_cache=get_metadata_cache())
+        segment_times = [start for start, _ in segmenter.get_segments(video_path)[1:]]
 
-def split_process_videos(videos_dir: str, output_dir: str):
-    """디렉토리에 있는 모든 비디오를 분할하여 저장하는 함수"""
-    video_files = get_video_files(videos_dir)
-    for video in video_files:
-        video_path = os.path.join(videos_dir, video)
-        split_video(video_path, output_dir)
+    segments = []
+    for muxed_path, start, end in mux_segments(video_path, output_dir, f".{video_name}_part",
+                                               segment_duration=segment_duration, segment_times=segment_times):
+        output_path = os.path.join(output_dir, f"{video_name}_{start:.3f}_{end:.3f}.mp4")
+        os.replace(muxed_path, output_path)
+        segments.append((output_path, start, end))
+    return segments
+
+
+def split_process_videos(videos_dir: str, output_dir: str, max_workers: int = 4):
+    """디렉토리에 있는 모든 비디오를 병렬로 분할하여 저장하는 함수
+
+    비디오마다 ffmpeg 프로세스 하나가 모든 세그먼트를 만들고, 여러 비디오는 max_workers개씩 동시에 처리한다.
+
+    Returns:
+        dict: 비디오 경로 -> [(세그먼트 파일 경로, 시작 시간, 종료 시간), ...]
+    """
+    video_paths = [os.path.join(videos_dir, video) for video in get_video_files(videos_dir)]
+    start_time = time.time()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(split_video, video_path, output_dir): video_path for video_path in video_paths}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+
+    num_segments = sum(len(segments) for segments in results.values())
+    print(f"✂️ 비디오 {len(results)}개 -> 세그먼트 {num_segments}개 분할 완료 ({time.time() - start_time:.1f}초)")
+    return results
+
+
+def plan_segment_ranges(videos_dir: str, segment_duration: int = 5, min_segment_length: float = 0.5) -> List[str]:
+    """비디오를 자르지 않고 segment_duration 초 구간의 이름({video_name}_{start}_{end}.mp4) 리스트만 만드는 함수 (range 모드)
+
+    길이는 ffprobe 헤더만 읽어(메타데이터 캐시) 구하므로 분할 단계 없이 바로 배분을 시작할 수 있다.
+    sub-server는 같은 이름의 파일이 없으면 원본 비디오에서 해당 구간을 샘플링한다.
+    min_segment_length보다 짧은 마지막 구간은 버린다.
+    """
+    video_paths = [os.path.join(videos_dir, video) for video in get_video_files(videos_dir)]
+    metadata = get_metadata_cache().get_many(video_paths)
+
+    segments = []
+    for video_path, video_metadata in sorted(metadata.items()):
+        video_name = os.path.splitext(os.path.basename(video_path))[0]
+        duration = video_metadata["duration"]
+        start = 0.0
+        while start < duration:
+            end = min(start + segment_duration, duration)
+            if end - start >= min_segment_length or start == 0:
+                segments.append(f"{video_name}_{start:.3f}_{end:.3f}.mp4")
+            start += segment_duration
+    print(f"📐 비디오 {len(metadata)}개 -> 구간 {len(segments)}개 (분할 없이 원본에서 샘플링)")
+    return segments
+
+
+def source_video_file(video_file: str) -> str:
+    """구간 이름({video_name}_{start}_{end}.mp4)의 원본 비디오 파일명"""
+    return '_'.join(os.path.splitext(video_file)[0].split('_')[:-2]) + '.mp4'
 ####ffmpeg -ed
 
 
@@ -0,0 +1,200 @@
+import os
+import glob
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ProgressMonitor:
+    """워커들이 스트리밍하는 progress_*.jsonl 이벤트를 모아 전체 진행 상황과 ETA를 보여주는 모니터
+
+    이벤트는 process() 호출(session)마다 누적 값을 담으므로, 세션별 마지막 이벤트를 노드 단위로 합친다.
+    interval초마다 콘솔에 한 줄씩 출력하고, http_port를 주면 같은 내용을 HTTP(/, /status.json)로도 보여준다.
+    시작 전에 이미 있던 이벤트(이전 실행)는 읽지 않는다.
+    """
+
+    def __init__(self, results_dir, total_segments, interval=10.0, http_port=None):
+        self.results_dir = results_dir
+        self.total_segments = total_segments
+        self.interval = interval
+        self.http_port = http_port
+        os.makedirs(results_dir, exist_ok=True)
+
+        self.offsets = {path: os.path.getsize(path) for path in self._progress_files()}
+        self.sessions = {}  # session -> 마지막 이벤트
+        self.samples = {}  # node -> [(gpu_util 평균, cpu_util, queue_depth), ...]
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.http_server = None
+
+    def _progress_files(self):
+        return sorted(glob.glob(os.path.join(self.results_dir, "progress_*.jsonl")))
+
+    def poll(self):
+        """새로 도착한 이벤트 반영"""
+        for path in self._progress_files():
+            offset = self.offsets.get(path, 0)
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+            end = data.rfind(b'\n')
+            if end < 0:
+                continue
+            self.offsets[path] = offset + end + 1
+            for line in data[:end].decode('utf-8').splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self._add(record.get('data', record))
+
+    def _add(self, event):
+        with self.lock:
+            self.sessions[event["session"]] = event
+            gpu_util = event.get("gpu_util") or []
+            self.samples.setdefault(event["node"], []).append((
+                sum(gpu_util) / len(gpu_util) if gpu_util else None,
+                event.get("cpu_util"),
+                event.get("queue_depth", 0),
+            ))
+
+    def nodes(self):
+        """노드별 누적 값과 현재 처리량"""
+        with self.lock:
+            sessions = list(self.sessions.values())
+        nodes = {}
+        for event in sessions:
+            node = nodes.setdefault(event["node"], {
+                "segments": 0, "video_seconds": 0.0, "tokens": 0, "active_seconds": 0.0, "sessions": 0,
+                "segments_per_sec": 0.0, "video_sec_per_sec": 0.0, "tokens_per_sec": 0.0, "queue_depth": 0,
+                "gpu_util": [], "cpu_util": None, "last_event": 0.0,
+            })
+            node["segments"] += event["segments_done"]
+            node["video_seconds"] += event["video_seconds"]
+            node["tokens"] += event["tokens"]
+            node["active_seconds"] += event["elapsed"]
+            node["sessions"] += 1
+            if not event.get("final"):
+                # 처리 중인 세션의 최근 처리량만 현재 처리량에 더함
+                node["segments_per_sec"] += event["segments_per_sec"]
+                node["video_sec_per_sec"] += event["video_sec_per_sec"]
+                node["tokens_per_sec"] += event["tokens_per_sec"]
+                node["queue_depth"] += event["queue_depth"]
+            if event["time"] >= node["last_event"]:
+                node.update(gpu_util=event.get("gpu_util") or [], cpu_util=event.get("cpu_util"),
+                            last_event=event["time"])
+        return nodes
+
+    def status(self):
+        nodes = self.nodes()
+        done = sum(node["segments"] for node in nodes.values())
+        segments_per_sec = sum(node["segments_per_sec"] for node in nodes.values())
+        elapsed = time.time() - self.started_at
+        if not segments_per_sec and done:
+            segments_per_sec = done / elapsed
+        remaining = max(self.total_segments - done, 0)
+        return {
+            "elapsed": elapsed,
+            "total_segments": self.total_segments,
+            "segments_done": done,
+            "segments_per_sec": segments_per_sec,
+            "video_sec_per_sec": sum(node["video_sec_per_sec"] for node in nodes.values()),
+            "tokens_per_sec": sum(node["tokens_per_sec"] for node in nodes.values()),
+            "queue_depth": sum(node["queue_depth"] for node in nodes.values()),
+            "eta_seconds": remaining / segments_per_sec if segments_per_sec else None,
+            "nodes": nodes,
+        }
+
+    @staticmethod
+    def format_status(status):
+        eta = status["eta_seconds"]
+        eta_text = f"{int(eta // 60)}분 {int(eta % 60)}초" if eta is not None else "-"
+        lines = [f"📈 {status['segments_done']}/{status['total_segments']} 세그먼트, "
+                 f"{status['segments_per_sec']:.2f} 세그먼트/초, {status['video_sec_per_sec']:.1f} 비디오초/초, "
+                 f"{status['tokens_per_sec']:.0f} 토큰/초, 대기 {status['queue_depth']}개, ETA {eta_text}"]
+        for name, node in sorted(status["nodes"].items()):
+            gpu = "/".join(f"{util:.0f}" for util in node["gpu_util"]) or "-"
+            cpu = f"{node['cpu_util']:.0f}" if node["cpu_util"] is not None else "-"
+            lines.append(f"   • {name}: {node['segments']}개, {node['segments_per_sec']:.2f}/초, "
+                         f"{node['tokens_per_sec']:.0f} 토큰/초, GPU {gpu}%, CPU {cpu}%, 대기 {node['queue_depth']}개")
+        return "\n".join(lines)
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.poll()
+            status = self.status()
+            if status["nodes"]:
+                print(self.format_status(status))
+
+    def _serve_http(self):
+        monitor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status = monitor.status()
+                if self.path.startswith("/status.json"):
+                    body, content_type = json.dumps(status, ensure_ascii=False).encode('utf-8'), "application/json"
+                else:
+                    body, content_type = monitor.format_status(status).encode('utf-8'), "text/plain; charset=utf-8"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.http_server = ThreadingHTTPServer(("", self.http_port), Handler)
+        threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+        print(f"🌐 진행 상황: http://localhost:{self.http_port}/ (JSON: /status.json)")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self.thread.start()
+        if self.http_port:
+            self._serve_http()
+
+    def stop(self):
+        """모니터를 멈추고 남은 이벤트까지 반영"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if self.http_server is not None:
+            self.http_server.shutdown()
+        self.poll()
+
+    def write_summary(self, path, worker_stats=None):
+        """노드별 성능 요약 저장 (클러스터 크기 산정용). worker_stats는 스케줄러의 워커별 통계"""
+        summary = {"created_at": time.time(), "elapsed": time.time() - self.started_at,
+                   "total_segments": self.total_segments, "nodes": {}}
+        for name, node in self.nodes().items():
+            with self.lock:
+                samples = list(self.samples.get(name, []))
+            gpu_samples = [gpu for gpu, _, _ in samples if gpu is not None]
+            cpu_samples = [cpu for _, cpu, _ in samples if cpu is not None]
+            active = max(node["active_seconds"], 1e-6)
+            summary["nodes"][name] = {
+                "segments": node["segments"],
+                "video_seconds": node["video_seconds"],
+                "tokens": node["tokens"],
+                "active_seconds": node["active_seconds"],
+                "sessions": node["sessions"],
+                "segments_per_sec": node["segments"] / active,
+                "video_sec_per_sec": node["video_seconds"] / active,
+                "tokens_per_sec": node["tokens"] / active,
+                "gpu_util_avg": sum(gpu_samples) / len(gpu_samples) if gpu_samples else None,
+                "cpu_util_avg": sum(cpu_samples) / len(cpu_samples) if cpu_samples else None,
+                "max_queue_depth": max((depth for _, _, depth in samples), default=0),
+            }
+        summary["segments_done"] = sum(node["segments"] for node in summary["nodes"].values())
+        if worker_stats:
+            summary["scheduler"] = worker_stats
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        print(f"📝 노드별 성능 요약 저장: {path}")
+        return summary
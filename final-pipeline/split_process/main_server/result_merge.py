@@ -0,0 +1,126 @@
+import os
+import glob
+import json
+import threading
+
+
+def record_key(result):
+    """결과 레코드의 세그먼트 키 (원본 비디오 + 구간)"""
+    return f"{result.get('video_path')}:{float(result.get('start_time', 0)):.2f}:{float(result.get('end_time', 0)):.2f}"
+
+
+def segment_key(video_file):
+    """세그먼트 파일명({video_name}_{start}_{end}.mp4)의 결과 레코드 키 (record_key와 같은 형식)"""
+    name_parts = os.path.splitext(os.path.basename(video_file))[0].split('_')
+    video_name = '_'.join(name_parts[:-2])
+    return f"{video_name}.mp4:{float(name_parts[-2]):.2f}:{float(name_parts[-1]):.2f}"
+
+
+def load_delta_index(index_path):
+    """delta index(JSONL)의 모든 결과 레코드 (쓰다 만 마지막 줄은 무시)"""
+    results = []
+    if not os.path.exists(index_path):
+        return results
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return results
+
+
+class DeltaIndexMerger:
+    """sub-server들이 스트리밍하는 video_files_*.jsonl을 계속 읽어 delta index에 합치는 병합기
+
+    파일마다 읽은 위치를 기억해 새로 추가된 완전한 줄만 읽고, 세그먼트 키로 중복(재전송, 재시도)을 제거해
+    index_path(JSONL)에 이어 쓴다. 실행 도중 멈춰도 그때까지 합쳐진 결과로 바로 검색할 수 있다.
+    """
+
+    def __init__(self, results_dir, index_path, poll_interval=5.0):
+        self.results_dir = results_dir
+        self.index_path = index_path
+        self.poll_interval = poll_interval
+        os.makedirs(results_dir, exist_ok=True)
+
+        self.keys = {record_key(result) for result in load_delta_index(index_path)}
+        self.offsets = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def merge_once(self):
+        """새로 도착한 레코드를 합치고 추가된 개수 반환"""
+        with self.lock:
+            added = []
+            for path in sorted(glob.glob(os.path.join(self.results_dir, "video_files_*.jsonl"))):
+                for line in self._read_new_lines(path):
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        print(f"⚠️ 손상된 결과 줄 건너뜀: {path}")
+                        continue
+                    added.extend(self._add(record.get('data', record)))
+            self._append(added)
+            return len(added)
+
+    def merge_final_files(self):
+        """sub-server가 마지막에 보낸 video_files_*.json에서 스트리밍 중 빠진 레코드 보완"""
+        with self.lock:
+            added = []
+            for path in sorted(glob.glob(os.path.join(self.results_dir, "video_files_*.json"))):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        results = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    print(f"⚠️ 결과 파일 읽기 실패: {path} - {str(e)}")
+                    continue
+                for result in results:
+                    added.extend(self._add(result))
+            self._append(added)
+            return len(added)
+
+    def _read_new_lines(self, path):
+        offset = self.offsets.get(path, 0)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        self.offsets[path] = offset + end + 1
+        return data[:end].decode('utf-8').splitlines()
+
+    def _add(self, result):
+        key = record_key(result)
+        if key in self.keys:
+            return []
+        self.keys.add(key)
+        return [result]
+
+    def _append(self, results):
+        if not results:
+            return
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _poll_loop(self):
+        while not self.stop_event.wait(self.poll_interval):
+            added = self.merge_once()
+            if added:
+                print(f"🗂️ delta index에 {added}개 결과 추가 (총 {len(self.keys)}개)")
+
+    def start(self):
+        self.thread = threading.Thread(target=self._poll_loop, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """병합 스레드를 멈추고 남은 레코드와 마지막 결과 파일까지 합침"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        added = self.merge_once() + self.merge_final_files()
+        print(f"🗂️ delta index 병합 완료: 총 {len(self.keys)}개 ({self.index_path}, 마지막 병합 {added}개)")
@@ -0,0 +1,383 @@
+import os
+import time
+import statistics
+import threading
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+# 1초 분량 디코딩 비용 (토큰 환산치)
+DECODE_COST_PER_SECOND = 100
+
+
+def parse_segment_duration(video_file, default=5.0):
+    """{video_name}_{start}_{end}.mp4 파일명에서 구간 길이 추출 (형식이 다르면 default)"""
+    name_parts = os.path.splitext(os.path.basename(video_file))[0].split('_')
+    try:
+        return max(float(name_parts[-1]) - float(name_parts[-2]), 0.0)
+    except (IndexError, ValueError):
+        return default
+
+
+def estimate_segment_cost(duration, n_frames=4, tokens_per_frame=576, new_tokens=512):
+    """세그먼트 하나의 처리 비용 추정 (토큰 환산)
+
+    prefill(프레임 수 × 프레임당 이미지 토큰) + 생성 토큰 + 구간 길이에 비례하는 디코딩 비용.
+    """
+    return n_frames * tokens_per_frame + new_tokens + duration * DECODE_COST_PER_SECOND
+
+
+class WorkUnit:
+    """워커가 한 번에 가져가는 작업 묶음 (같은 원본의 연속 세그먼트들)"""
+
+    def __init__(self, unit_id, items, cost):
+        self.unit_id = unit_id
+        self.items = items
+        self.cost = cost
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"WorkUnit({self.unit_id}, {len(self.items)} items, cost={self.cost:.0f})"
+
+
+def make_work_units(video_files, target_cost, cost_fn=None, first_id=0):
+    """세그먼트 파일들을 비용이 target_cost 정도인 작업 단위로 묶음
+
+    원본 비디오/시작 시각 순으로 정렬한 뒤 연속 구간을 묶으므로 같은 원본의 세그먼트가
+    한 워커에서 이어서 처리된다 (정적 세그먼트 재사용, 디코더 재사용에 유리).
+    """
+    cost_fn = cost_fn or (lambda video_file: estimate_segment_cost(parse_segment_duration(video_file)))
+
+    def sort_key(video_file):
+        name_parts = os.path.splitext(video_file)[0].split('_')
+        try:
+            return '_'.join(name_parts[:-2]), float(name_parts[-2])
+        except (IndexError, ValueError):
+            return video_file, 0.0
+
+    units = []
+    items, cost = [], 0.0
+    for video_file in sorted(video_files, key=sort_key):
+        items.append(video_file)
+        cost += cost_fn(video_file)
+        if cost >= target_cost:
+            units.append(WorkUnit(first_id + len(units), items, cost))
+            items, cost = [], 0.0
+    if items:
+        units.append(WorkUnit(first_id + len(units), items, cost))
+    return units
+
+
+class Worker:
+    """작업 단위를 처리하는 워커 (원격 서버 또는 로컬 프로세스)"""
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+
+    def process(self, unit):
+        """unit을 처리하고 결과를 반환 (실패 시 예외)"""
+        raise NotImplementedError
+
+    def healthy(self):
+        """False면 더 이상 작업을 가져가지 않음 (남은 작업은 다른 워커가 처리)"""
+        return True
+
+    def heartbeat(self):
+        """워커가 살아 있는지 확인 (주기적으로 별도 스레드에서 호출, 오래 응답이 없으면 워커를 잃은 것으로 처리)"""
+        return self.healthy()
+
+    def abandon(self):
+        """응답이 없거나 멈춰 제외된 워커 정리 (처리 중인 작업을 기다리지 않음)"""
+        pass
+
+    def finish(self):
+        """더 받을 작업이 없을 때 호출 (비동기로 처리 중인 작업이 있으면 끝날 때까지 대기)"""
+        pass
+
+    def close(self):
+        pass
+
+
+class LocalProcessWorker(Worker):
+    """원격 서버 대신 로컬 프로세스 하나에서 process_fn(items, *args)를 실행하는 워커
+
+    프로세스는 spawn으로 한 번 띄워 재사용하므로 init_fn에서 무거운 초기화(모델 로드 등)를 할 수 있다.
+    process_fn, init_fn은 모듈 최상위 함수여야 한다.
+    """
+
+    def __init__(self, worker_id, process_fn, process_args=(), init_fn=None, init_args=()):
+        super().__init__(worker_id)
+        self.process_fn = process_fn
+        self.process_args = process_args
+        self.executor = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp.get_context("spawn"),
+            initializer=init_fn,
+            initargs=init_args,
+        )
+        self.broken = False
+        self.abandoned = False
+
+    def process(self, unit):
+        try:
+            return self.executor.submit(self.process_fn, unit.items, *self.process_args).result()
+        except BrokenProcessPool:
+            # 프로세스가 죽으면(초기화 실패, OOM 등) 이 워커는 더 이상 작업을 받지 않음
+            self.broken = True
+            raise
+
+    def healthy(self):
+        return not self.broken
+
+    def abandon(self):
+        """멈춘 워커 프로세스를 종료 (process()에서 기다리던 스레드는 BrokenProcessPool로 풀려남)"""
+        self.abandoned = True
+        for process in list((getattr(self.executor, "_processes", None) or {}).values()):
+            process.kill()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def close(self):
+        self.executor.shutdown(wait=not self.abandoned)
+
+
+class WorkScheduler:
+    """워커가 작업을 요청해 가져가는(pull) 방식의 스케줄러
+
+    - 비용이 큰 작업 단위부터 나눠 주므로 마지막에 큰 작업 하나가 남는 일을 줄인다.
+    - 실패한 단위는 max_attempts까지 다시 대기열 앞에 넣는다.
+    - 대기열이 비었는데 쉬는 워커가 있으면, 다른 워커가 가장 오래 처리 중인 단위를 함께 처리한다(work stealing).
+      먼저 끝난 쪽의 결과만 채택하고 늦게 끝난 쪽의 결과는 버린다.
+    - 워커마다 heartbeat_interval초마다 heartbeat를 확인해 heartbeat_timeout초 넘게 응답이 없으면 워커를 제외하고,
+      처리 중이던 단위를 다른 워커에 다시 배정한다. 완료된 단위의 처리 속도로 예상 시간을 잡아
+      그 unit_timeout_factor배(최소 min_unit_timeout초)를 넘긴 단위도 멈춘 것으로 보고 다시 배정하며,
+      heartbeat에는 응답해도 작업이 멈춘 그 워커도 제외한다 (lost).
+    - 대기열과 처리 중인 단위가 모두 비면 끝난다. 제외된 워커의 스레드는 기다리지 않는다.
+    - manifest(JobManifest)를 주면 단위 상태가 바뀔 때마다 디스크에 기록한다.
+    """
+
+    def __init__(self, units, max_attempts=3, steal=True, min_steal_time=0.0, manifest=None,
+                 heartbeat_interval=30.0, heartbeat_timeout=180.0, unit_timeout_factor=4.0, min_unit_timeout=600.0):
+        self.units = {unit.unit_id: unit for unit in units}
+        self.pending = deque(sorted(units, key=lambda unit: unit.cost, reverse=True))
+        self.max_attempts = max_attempts
+        self.steal = steal
+        self.min_steal_time = min_steal_time  # 이보다 짧게 처리 중인 단위는 훔치지 않음
+
+        self.condition = threading.Condition()
+        self.in_flight = {}  # unit_id -> {"workers": set, "started": float}
+        self.done = {}  # unit_id -> 완료한 worker_id
+        self.failed = {}  # unit_id -> 마지막 오류 메시지
+        self.stolen = 0
+        self.worker_stats = {}
+
+        self.manifest = manifest
+        if manifest is not None:
+            manifest.start(units)
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.unit_timeout_factor = unit_timeout_factor
+        self.min_unit_timeout = min_unit_timeout
+        self.last_seen = {}  # worker_id -> 마지막 heartbeat 시각
+        self.lost = set()  # heartbeat가 끊기거나 작업이 멈춰 제외된 워커
+        self.cost_rates = []  # 완료된 단위의 처리 시간 / 비용
+
+    def request_work(self, worker_id):
+        """처리할 작업 단위 반환 (모든 작업이 끝났으면 None, 재시도 대기 중이면 기다림)"""
+        with self.condition:
+            while True:
+                if worker_id in self.lost:
+                    return None
+                if self.pending:
+                    unit = self.pending.popleft()
+                    unit.attempts += 1
+                    self.in_flight[unit.unit_id] = {"workers": {worker_id}, "started": time.time()}
+                    self._record(unit, "running", worker_id)
+                    return unit
+
+                unit = self._steal_candidate(worker_id) if self.steal else None
+                if unit is not None:
+                    self.in_flight[unit.unit_id]["workers"].add(worker_id)
+                    self.stolen += 1
+                    self._record(unit, "running", worker_id)
+                    return unit
+
+                if not self.in_flight:
+                    return None
+                # 처리 중인 단위가 실패하면 다시 대기열에 들어오므로 상태 변화를 기다린다
+                self.condition.wait(timeout=1.0)
+
+    def _steal_candidate(self, worker_id):
+        """다른 워커 한 곳에서만 처리 중인 단위 중 가장 오래된 것"""
+        now = time.time()
+        candidates = [
+            (state["started"], unit_id) for unit_id, state in self.in_flight.items()
+            if len(state["workers"]) == 1 and worker_id not in state["workers"]
+            and now - state["started"] >= self.min_steal_time
+        ]
+        if not candidates:
+            return None
+        return self.units[min(candidates)[1]]
+
+    def complete(self, worker_id, unit, elapsed=0.0):
+        """완료 보고. 먼저 끝난 보고만 채택(True)"""
+        with self.condition:
+            stats = self._stats(worker_id)
+            stats["busy"] += elapsed
+            state = self.in_flight.pop(unit.unit_id, None)
+            if unit.unit_id in self.done:
+                return False
+            if state is None:
+                # 시간 초과로 다시 배정했던 단위가 늦게라도 끝난 경우 그 결과를 채택
+                if unit in self.pending:
+                    self.pending.remove(unit)
+                elif self.failed.pop(unit.unit_id, None) is None:
+                    return False
+            self.done[unit.unit_id] = worker_id
+            stats["units"] += 1
+            stats["cost"] += unit.cost
+            if elapsed > 0 and unit.cost > 0:
+                self.cost_rates.append(elapsed / unit.cost)
+            self._record(unit, "done", worker_id)
+            self.condition.notify_all()
+            return True
+
+    def fail(self, worker_id, unit, error, elapsed=0.0):
+        """실패 보고. 다른 워커가 처리 중이 아니면 재시도 대기열에 다시 넣는다"""
+        with self.condition:
+            stats = self._stats(worker_id)
+            stats["busy"] += elapsed
+            stats["failed"] += 1
+            self._release(worker_id, unit, error)
+
+    def _release(self, worker_id, unit, error):
+        """worker_id의 처리를 취소. 다른 워커가 처리 중이 아니면 재시도 대기열에 다시 넣는다 (condition 잠금 안에서 호출)"""
+        state = self.in_flight.get(unit.unit_id)
+        if state is None or worker_id not in state["workers"]:
+            return
+        state["workers"].discard(worker_id)
+        if state["workers"]:
+            return  # 훔쳐 간 워커가 아직 처리 중
+
+        del self.in_flight[unit.unit_id]
+        if unit.attempts < self.max_attempts:
+            print(f"🔁 작업 {unit.unit_id} 재시도 ({unit.attempts}/{self.max_attempts}): {error}")
+            self.pending.appendleft(unit)
+            self._record(unit, "pending", worker_id, error)
+        else:
+            print(f"🚨 작업 {unit.unit_id} 최종 실패: {error}")
+            self.failed[unit.unit_id] = str(error)
+            self._record(unit, "failed", worker_id, error)
+        self.condition.notify_all()
+
+    def _record(self, unit, state, worker_id=None, error=None):
+        if self.manifest is not None:
+            self.manifest.update(unit, state, worker_id, error)
+
+    def _unit_timeout(self, unit):
+        """이 단위가 멈춘 것으로 볼 처리 시간 (완료된 단위가 아직 없으면 None)"""
+        if not self.cost_rates:
+            return None
+        return max(self.min_unit_timeout, statistics.median(self.cost_rates) * unit.cost * self.unit_timeout_factor)
+
+    def _heartbeat_loop(self, worker, stop_event):
+        while not stop_event.wait(self.heartbeat_interval):
+            try:
+                alive = worker.heartbeat()
+            except Exception:
+                alive = False
+            if alive:
+                with self.condition:
+                    self.last_seen[worker.worker_id] = time.time()
+
+    def _watchdog(self, stop_event):
+        """heartbeat가 끊긴 워커와 너무 오래 걸리는 단위를 찾아 다른 워커에 다시 배정"""
+        while not stop_event.wait(self.heartbeat_interval):
+            now = time.time()
+            with self.condition:
+                for worker_id, last_seen in self.last_seen.items():
+                    if worker_id not in self.lost and now - last_seen > self.heartbeat_timeout:
+                        print(f"💔 워커 {worker_id} heartbeat 없음 ({now - last_seen:.0f}초): 처리 중인 작업 재배정")
+                        self.lost.add(worker_id)
+
+                for unit_id, state in list(self.in_flight.items()):
+                    unit = self.units[unit_id]
+                    timeout = self._unit_timeout(unit)
+                    for worker_id in list(state["workers"]):
+                        if worker_id in self.lost:
+                            self._release(worker_id, unit, f"워커 {worker_id} 응답 없음")
+                        elif timeout is not None and now - state["started"] > timeout:
+                            # heartbeat에 응답하더라도 작업이 멈춘 워커는 더 이상 기다리지 않는다
+                            print(f"⏱️ 워커 {worker_id} 작업 {unit_id} 시간 초과: 워커 제외 후 재배정")
+                            self._stats(worker_id)["timeouts"] += 1
+                            self.lost.add(worker_id)
+                            self._release(worker_id, unit, f"{now - state['started']:.0f}초 초과 (기준 {timeout:.0f}초)")
+
+    def _stats(self, worker_id):
+        return self.worker_stats.setdefault(worker_id,
+                                            {"units": 0, "cost": 0.0, "busy": 0.0, "failed": 0, "timeouts": 0})
+
+    def _worker_loop(self, worker, results):
+        while True:
+            unit = self.request_work(worker.worker_id)
+            if unit is None:
+                return
+            start = time.time()
+            try:
+                output = worker.process(unit)
+            except Exception as e:
+                self.fail(worker.worker_id, unit, e, elapsed=time.time() - start)
+                if not worker.healthy():
+                    print(f"🚨 워커 {worker.worker_id} 제외: 남은 작업은 다른 워커가 처리")
+                    return
+                continue
+            if self.complete(worker.worker_id, unit, elapsed=time.time() - start):
+                results[unit.unit_id] = output
+
+    def run(self, workers):
+        """워커마다 스레드 하나로 작업을 당겨 처리. unit_id -> 결과 딕셔너리 반환
+
+        모든 워커를 잃으면 남은 단위를 처리하지 못한 채 반환한다 (pending 단위로 확인).
+        """
+        results = {}
+        start = time.time()
+        stop_event = threading.Event()
+        self.last_seen.update({worker.worker_id: start for worker in workers})
+        # heartbeat 확인이 멈춘 워커 때문에 막히지 않도록 워커마다 별도 데몬 스레드에서 확인
+        monitors = [threading.Thread(target=self._heartbeat_loop, args=(worker, stop_event), daemon=True)
+                    for worker in workers]
+        monitors.append(threading.Thread(target=self._watchdog, args=(stop_event,), daemon=True))
+        threads = [threading.Thread(target=self._worker_loop, args=(worker, results), daemon=True)
+                   for worker in workers]
+        for thread in monitors + threads:
+            thread.start()
+        # 모든 단위가 끝나면(대기열과 처리 중인 단위가 모두 비면) 바로 반환하고,
+        # 제외된 워커는 process()에서 돌아오지 않을 수 있으므로 기다리지 않는다
+        while True:
+            with self.condition:
+                if not self.pending and not self.in_flight:
+                    break
+            if not any(thread.is_alive() and worker.worker_id not in self.lost
+                       for thread, worker in zip(threads, workers)):
+                break
+            time.sleep(0.5)
+        stop_event.set()
+        self.elapsed = time.time() - start
+        # 다른 워커가 이미 끝낸(훔쳐 간) 단위를 아직 붙잡고 있는 워커도 기다리지 않고 제외한다
+        deadline = time.time() + 5.0
+        for thread, worker in zip(threads, workers):
+            thread.join(timeout=max(deadline - time.time(), 0))
+            if thread.is_alive() and worker.worker_id not in self.lost:
+                print(f"⏱️ 워커 {worker.worker_id} 작업이 모두 끝났는데 응답 없음: 워커 제외")
+                self.lost.add(worker.worker_id)
+        return results
+
+    def summary(self):
+        lines = [f"📊 작업 {len(self.done)}/{len(self.units)}개 완료, 실패 {len(self.failed)}개, "
+                 f"work stealing {self.stolen}회, 총 {getattr(self, 'elapsed', 0.0):.1f}초"]
+        for worker_id, stats in sorted(self.worker_stats.items(), key=lambda item: str(item[0])):
+            lines.append(f"• {worker_id}: {stats['units']}개 (비용 {stats['cost']:.0f}), "
+                         f"작업 {stats['busy']:.1f}초, 실패 {stats['failed']}회, 시간 초과 {stats['timeouts']}회"
+                 + (" (제외됨)" if worker_id in self.lost else ""))
+        return "\n".join(lines)
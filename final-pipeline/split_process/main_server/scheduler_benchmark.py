@@ -0,0 +1,82 @@
+import time
+import random
+import argparse
+
+from .scheduler import LocalProcessWorker, WorkScheduler, make_work_units, estimate_segment_cost, \
+    parse_segment_duration
+
+
+def simulate_unit(items, seconds_per_cost, fail_rate, seed):
+    """원격 서버 대신 비용에 비례해 sleep하는 작업 (fail_rate 확률로 실패)"""
+    rng = random.Random(hash((tuple(items), seed, time.time())))
+    if rng.random() < fail_rate:
+        raise RuntimeError("simulated failure")
+    cost = sum(estimate_segment_cost(parse_segment_duration(item)) for item in items)
+    time.sleep(cost * seconds_per_cost)
+    return items
+
+
+def make_segments(num_videos, seed):
+    """길이가 제각각인 비디오들의 5초 세그먼트 파일명"""
+    rng = random.Random(seed)
+    video_files = []
+    for video_idx in range(num_videos):
+        duration = rng.uniform(10, 300)
+        start = 0
+        while start < duration:
+            end = min(start + 5, duration)
+            video_files.append(f"video{video_idx}_{start}_{end:.3f}.mp4")
+            start += 5
+    return video_files
+
+
+def run_round_robin(video_files, speeds, args):
+    """기존 방식: 인덱스 순환 배정, 가장 느린 서버가 끝나야 전체가 끝남"""
+    finish_times = []
+    for server_idx, speed in enumerate(speeds):
+        files = video_files[server_idx::len(speeds)]
+        cost = sum(estimate_segment_cost(parse_segment_duration(f)) for f in files)
+        finish_times.append(cost * args.seconds_per_cost * speed)
+    return max(finish_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pull scheduler vs round-robin with local worker processes')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--videos', type=int, default=20)
+    parser.add_argument('--units-per-worker', type=int, default=8)
+    parser.add_argument('--seconds-per-cost', type=float, default=2e-6, help='비용 1당 sleep 시간')
+    parser.add_argument('--slow-factor', type=float, default=3.0, help='마지막 워커의 상대 처리 시간')
+    parser.add_argument('--fail-rate', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    video_files = make_segments(args.videos, args.seed)
+    speeds = [1.0] * (args.workers - 1) + [args.slow_factor]
+    total_cost = sum(estimate_segment_cost(parse_segment_duration(f)) for f in video_files)
+    units = make_work_units(video_files, target_cost=total_cost / (args.workers * args.units_per_worker))
+    print(f"🧪 세그먼트 {len(video_files)}개, 작업 단위 {len(units)}개, 워커 속도 {speeds}")
+
+    workers = [
+        LocalProcessWorker(f"local-{idx}", simulate_unit,
+                           process_args=(args.seconds_per_cost * speed, args.fail_rate, args.seed))
+        for idx, speed in enumerate(speeds)
+    ]
+    try:
+        scheduler = WorkScheduler(units, max_attempts=5)
+        results = scheduler.run(workers)
+    finally:
+        for worker in workers:
+            worker.close()
+
+    processed = sorted(item for items in results.values() for item in items)
+    print(scheduler.summary())
+    print(f"\n📊 round-robin 예상 완료 시간: {run_round_robin(video_files, speeds, args):.2f}초")
+    print(f"📊 pull 스케줄러 실제 완료 시간: {scheduler.elapsed:.2f}초 (프로세스 시작 포함)")
+    if processed != sorted(video_files):
+        raise SystemExit(f"🚨 누락/중복 세그먼트: {len(processed)}/{len(video_files)}")
+    print("✅ 모든 세그먼트가 정확히 한 번 처리됨")
+
+
+if __name__ == "__main__":
+    main()
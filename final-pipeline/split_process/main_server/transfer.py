@@ -0,0 +1,187 @@
+import os
+import time
+import shlex
+import shutil
+import threading
+import subprocess
+
+
+class Transport:
+    """작업 파일을 워커 쪽 디렉토리로 보내는 전송 계층"""
+
+    def send(self, files, source_dir, remote_dir):
+        """source_dir의 files를 remote_dir로 전송 (이미 같은 크기로 있는 파일은 건너뜀)"""
+        raise NotImplementedError
+
+    def run(self, command):
+        """워커 쪽에서 셸 명령 실행, 성공 여부 반환"""
+        raise NotImplementedError
+
+    def output(self, command):
+        """워커 쪽에서 셸 명령 실행 후 표준 출력 반환 (실패 시 None)"""
+        raise NotImplementedError
+
+    def spawn(self, command):
+        """워커 쪽에서 오래 실행되는 명령 시작 (subprocess.Popen 반환)"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SSHTransport(Transport):
+    """하나의 SSH 연결(ControlMaster 멀티플렉싱)로 파일 묶음을 tar 스트림으로 보내는 전송 계층
+
+    파일마다 scp를 실행하면 파일 수만큼 SSH 핸드셰이크가 생기므로, 서버 하나에 마스터 연결을 하나 열어 두고
+    모든 명령과 tar 스트림을 그 위로 보낸다. 실패하면 원격 파일 크기를 비교해 아직 받지 못한 파일만 다시 보낸다.
+    limiter(threading.Semaphore)를 공유하면 여러 서버로의 동시 전송 수를 제한할 수 있다.
+    """
+
+    def __init__(self, server, key_path, control_dir="/tmp/split_process_ssh", max_retries=3, retry_delay=2.0,
+                 limiter=None):
+        self.server = server
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.limiter = limiter
+        os.makedirs(control_dir, exist_ok=True)
+        self.ssh_base = [
+            'ssh',
+            '-o', 'StrictHostKeyChecking=no',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={os.path.join(control_dir, "%r@%h:%p")}',
+            '-o', 'ControlPersist=10m',
+            '-o', 'ConnectTimeout=20',
+            '-o', 'ServerAliveInterval=15',  # 응답 없는 연결은 1분 안에 끊어 명령이 실패하게 함
+            '-o', 'ServerAliveCountMax=4',
+            '-i', key_path,
+            '-p', str(server.port),
+            f'{server.username}@{server.ip}',
+        ]
+
+    def run(self, command):
+        result = subprocess.run(self.ssh_base + [command], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            print(f"🚨 원격 명령 실패 ({self.server.ip}): {command[:100]} - {result.stderr.decode('utf-8', errors='ignore').strip()}")
+            return False
+        return True
+
+    def output(self, command):
+        result = subprocess.run(self.ssh_base + [command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return result.stdout.decode('utf-8', errors='ignore') if result.returncode == 0 else None
+
+    def spawn(self, command):
+        return subprocess.Popen(self.ssh_base + [command])
+
+    def remote_sizes(self, files, remote_dir, chunk_size=500):
+        """원격에 이미 있는 파일의 크기 {파일명: 크기}"""
+        sizes = {}
+        for start in range(0, len(files), chunk_size):
+            names = ' '.join(shlex.quote(name) for name in files[start:start + chunk_size])
+            command = f"cd {shlex.quote(remote_dir)} 2>/dev/null && stat -c '%s %n' -- {names} 2>/dev/null; true"
+            result = subprocess.run(self.ssh_base + [command], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            for line in result.stdout.decode('utf-8', errors='ignore').splitlines():
+                size, _, name = line.partition(' ')
+                if size.isdigit():
+                    sizes[name] = int(size)
+        return sizes
+
+    def send(self, files, source_dir, remote_dir):
+        files = list(files)
+        for attempt in range(1, self.max_retries + 1):
+            # 이어받기: 원격에 같은 크기로 있는 파일은 다시 보내지 않음 (중간에 끊긴 파일은 크기가 달라 재전송)
+            remote = self.remote_sizes(files, remote_dir)
+            missing = [name for name in files if remote.get(name) != os.path.getsize(os.path.join(source_dir, name))]
+            if not missing:
+                return True
+            if attempt > 1:
+                print(f"🔁 {self.server.ip}: {len(missing)}/{len(files)}개 파일 재전송 ({attempt}/{self.max_retries})")
+
+            if self._send_tar(missing, source_dir, remote_dir):
+                continue  # 다음 반복에서 크기를 확인
+            time.sleep(self.retry_delay * attempt)
+
+        remote = self.remote_sizes(files, remote_dir)
+        return all(remote.get(name) == os.path.getsize(os.path.join(source_dir, name)) for name in files)
+
+    def _send_tar(self, files, source_dir, remote_dir):
+        """tar c | ssh 'tar x' 한 번으로 파일 묶음 전송"""
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            tar = subprocess.Popen(['tar', 'cf', '-', '-C', source_dir, '-T', '-'],
+                                   stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+            remote_command = f"mkdir -p {shlex.quote(remote_dir)} && tar xf - -C {shlex.quote(remote_dir)}"
+            ssh = subprocess.Popen(self.ssh_base + [remote_command],
+                                   stdin=tar.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+            tar.stdout.close()  # ssh가 종료되면 tar가 SIGPIPE를 받도록
+            try:
+                tar.stdin.write(''.join(f"{name}\n" for name in files).encode('utf-8'))
+                tar.stdin.close()
+            except OSError as e:
+                # tar가 파일 목록을 다 읽기 전에 끝나면(BrokenPipeError) 이번 시도만 실패로 보고 send에서 재시도
+                print(f"🚨 전송 실패 ({self.server.ip}): tar 입력 쓰기 실패 - {str(e)}")
+                ssh.kill()
+                tar.kill()
+                ssh.communicate()
+                tar.communicate()  # 남은 stdin 버퍼를 닫을 때의 BrokenPipeError는 communicate가 무시
+                return False
+            _, ssh_error = ssh.communicate()
+            tar.wait()
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+
+        if tar.returncode != 0 or ssh.returncode != 0:
+            print(f"🚨 전송 실패 ({self.server.ip}): {ssh_error.decode('utf-8', errors='ignore').strip()}")
+            return False
+        return True
+
+    def close(self):
+        """마스터 연결 종료"""
+        subprocess.run(self.ssh_base[:-1] + ['-O', 'exit', self.ssh_base[-1]],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+class LocalTransport(Transport):
+    """로컬 디렉토리로 복사하는 전송 계층 (원격 서버 없이 테스트/단일 호스트용)
+
+    임시 파일에 복사한 뒤 이름을 바꾸므로 받는 쪽에서 반쯤 복사된 파일을 보지 않는다.
+    """
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+
+    def send(self, files, source_dir, remote_dir):
+        os.makedirs(remote_dir, exist_ok=True)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        try:
+            for name in files:
+                source = os.path.join(source_dir, name)
+                target = os.path.join(remote_dir, name)
+                if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(source):
+                    continue
+                shutil.copyfile(source, target + ".part")
+                os.replace(target + ".part", target)
+        except OSError as e:
+            print(f"🚨 로컬 전송 실패: {str(e)}")
+            return False
+        finally:
+            if self.limiter is not None:
+                self.limiter.release()
+        return True
+
+    def run(self, command):
+        return subprocess.run(command, shell=True).returncode == 0
+
+    def output(self, command):
+        result = subprocess.run(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        return result.stdout.decode('utf-8', errors='ignore') if result.returncode == 0 else None
+
+    def spawn(self, command):
+        return subprocess.Popen(command, shell=True)
+
+
+def make_limiter(max_parallel):
+    """서버 간 동시 전송 수 제한용 세마포어 (None이면 제한 없음)"""
+    return threading.Semaphore(max_parallel) if max_parallel else None
@@ -0,0 +1,97 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from .transfer import LocalTransport, make_limiter
+
+
+def make_files(source_dir, num_files, size_kb):
+    """전송할 더미 세그먼트 파일 생성"""
+    files = []
+    for idx in range(num_files):
+        name = f"video{idx}_0_5.000.mp4"
+        with open(os.path.join(source_dir, name), 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+        files.append(name)
+    return files
+
+
+def same_files(files, source_dir, target_dir):
+    for name in files:
+        target = os.path.join(target_dir, name)
+        if not os.path.exists(target):
+            return False
+        with open(os.path.join(source_dir, name), 'rb') as a, open(target, 'rb') as b:
+            if a.read() != b.read():
+                return False
+    return True
+
+
+def timed_send(transport, files, source_dir, target_dir):
+    start = time.perf_counter()
+    ok = transport.send(files, source_dir, target_dir)
+    return ok, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LocalTransport send/resume check (SSHTransport와 같은 Transport 인터페이스)')
+    parser.add_argument('--files', type=int, default=200)
+    parser.add_argument('--size-kb', type=int, default=256)
+    parser.add_argument('--workers', type=int, default=4, help='동시에 전송하는 워커 수')
+    parser.add_argument('--max-parallel', type=int, default=2, help='동시 전송 제한 (make_limiter)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="transfer_benchmark_")
+    try:
+        source_dir = os.path.join(root, "source")
+        os.makedirs(source_dir)
+        files = make_files(source_dir, args.files, args.size_kb)
+        limiter = make_limiter(args.max_parallel)
+        transports = [LocalTransport(limiter=limiter) for _ in range(args.workers)]
+        target_dirs = [os.path.join(root, f"worker{idx}", "videos") for idx in range(args.workers)]
+
+        # 1) 워커마다 전체 파일 전송 (limiter로 동시 전송 수 제한)
+        results = [None] * args.workers
+
+        def send(idx):
+            results[idx] = timed_send(transports[idx], files, source_dir, target_dirs[idx])
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=send, args=(idx,)) for idx in range(args.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        assert all(ok for ok, _ in results), "전송 실패"
+        assert all(same_files(files, source_dir, target_dir) for target_dir in target_dirs), "전송된 파일 내용이 다름"
+        total_mb = args.files * args.size_kb * args.workers / 1024
+        print(f"📦 워커 {args.workers}개로 {args.files}개 파일 전송: {elapsed:.2f}초 ({total_mb / elapsed:.1f} MB/s)")
+
+        # 2) 이어받기: 이미 같은 크기로 있는 파일은 건너뛰고, 중간에 끊긴(크기가 다른) 파일만 다시 복사
+        target_dir = target_dirs[0]
+        truncated = files[::10]
+        for name in truncated:
+            with open(os.path.join(target_dir, name), 'r+b') as f:
+                f.truncate(1024)
+        ok, resend_time = timed_send(transports[0], files, source_dir, target_dir)
+        assert ok and same_files(files, source_dir, target_dir), "이어받기 후 파일 내용이 다름"
+        print(f"🔁 끊긴 파일 {len(truncated)}개 이어받기: {resend_time:.2f}초 (첫 전송 {results[0][1]:.2f}초)")
+
+        # 3) 원격 명령 인터페이스 (run/output/spawn)
+        transport = transports[0]
+        assert transport.run(f"test -d {target_dir}"), "run 실패"
+        assert transport.output(f"ls {target_dir} | wc -l").strip() == str(len(files)), "output 결과가 다름"
+        assert transport.output("exit 1") is None, "실패한 명령의 output은 None이어야 함"
+        process = transport.spawn("exit 0")
+        assert process.wait() == 0, "spawn 실패"
+        print("✅ LocalTransport run/output/spawn 확인")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
+import os
 import socket
 
-server_ip = socket.gethostbyname(socket.gethostname())
+# 로컬 멀티 프로세스 실행 시 워커마다 환경 변수로 노드 ID와 작업 폴더를 따로 지정
+server_ip = os.environ.get("SPLIT_PROCESS_NODE_ID") or socket.gethostbyname(socket.gethostname())
+work_dir = os.environ.get("SPLIT_PROCESS_HOME", "/data/ephemeral/home/split_process") #Sub 작업 폴더
 
 class Config:
     ssh_key_path='/data/ephemeral/home/CH_1.pem' 
-    video_dir = "/data/ephemeral/home/split_process/split_process_videos" #비디오가 저장될 폴더(메인 서버에서 만들어준 폴더 이름)
+    video_dir = os.environ.get("SPLIT_PROCESS_VIDEO_DIR", f"{work_dir}/split_process_videos") #비디오가 저장될 폴더(메인 서버에서 만들어준 폴더 이름)
     remote_path= "/data/ephemeral/home/json" #메인서버에 생성할 josn 폴더
-    output_file = f"/data/ephemeral/home/split_process/split_process_json/video_files_{server_ip}.json" #메인서버에 생성할 json 파일이름
+    output_file = f"{work_dir}/split_process_json/video_files_{server_ip}.json" #메인서버에 생성할 json 파일이름
+    checkpoint_file = f"{work_dir}/split_process_json/video_files_{server_ip}.jsonl" #세그먼트별 결과 체크포인트 (재실행 시 이어서 처리)
+    consumed_file = f"{work_dir}/split_process_json/consumed_{server_ip}.txt" #스트리밍 모드에서 처리를 끝낸 세그먼트(실패, 건너뜀 포함) 기록 (메인 서버 backlog 확인용)
+    source_dir = os.environ.get("SPLIT_PROCESS_SOURCE_DIR", f"{work_dir}/split_process_sources") #range 모드에서 메인 서버가 보낸 원본 비디오 폴더
+    manifest_file = os.path.join(video_dir, "manifest.txt") #스트리밍 모드에서 메인 서버가 전송 완료한 파일명을 한 줄씩 추가하는 파일
+    daemon_address = ("127.0.0.1", 6100) #상주 워커 데몬 RPC 주소 (로컬 전용)
+    daemon_authkey = b"split_process" #워커 데몬 RPC 인증 키
+    daemon_pid_file = f"{work_dir}/worker_daemon.pid" #워커 데몬 실행 여부 확인용
+    daemon_ready_timeout = 900 #데몬이 모델을 로드하는 동안 기다릴 최대 시간 (초)
+    stream_idle_timeout = 1800 #스트리밍 모드에서 새 파일도 종료 표시도 없이 이만큼 지나면 수신 종료 (초)
+    node_id = server_ip #진행 상황 이벤트에 쓰는 노드 이름
+    progress_file = f"progress_{server_ip}.jsonl" #메인 서버 remote_path에 이어 쓸 진행 상황 이벤트 파일
+    progress_interval = 10 #진행 상황 이벤트 주기 (초)
+    cache_path = f"{work_dir}/cache/caption_cache.db" #캡션 캐시 (재실행 시 이미 만든 캡션 재사용)
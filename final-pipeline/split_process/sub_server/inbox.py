@@ -0,0 +1,80 @@
+import os
+import time
+
+# 메인 서버가 더 보낼 파일이 없음을 알리는 표시 (manifest의 한 줄 또는 같은 이름의 파일)
+END_OF_STREAM = "__END_OF_STREAM__"
+
+
+class InboxWatcher:
+    """도착하는 세그먼트 파일을 도착 순서대로 내놓는 이터레이터
+
+    manifest 파일이 있으면 메인 서버가 전송을 마친 뒤 한 줄씩 추가하는 파일명을 읽고,
+    없으면 video_dir에 새로 생긴 .mp4 파일을 감시한다 (.part 등 전송 중인 파일은 무시).
+    END_OF_STREAM 표시를 받고 남은 파일을 모두 내놓으면 끝난다.
+    종료 표시가 오지 않아도 cancel_event가 설정되거나, manifest가 새로 만들어지거나(다음 실행이 시작됨),
+    idle_timeout초 동안 새 파일이 없으면 멈추고 stop_reason에 이유를 남긴다.
+    """
+
+    def __init__(self, video_dir, manifest_path=None, poll_interval=1.0, idle_timeout=None, cancel_event=None):
+        self.video_dir = video_dir
+        self.manifest_path = manifest_path or os.path.join(video_dir, "manifest.txt")
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.cancel_event = cancel_event
+        self.seen = set()
+        self.manifest_offset = 0
+        self.stop_reason = None
+
+    def __iter__(self):
+        last_arrival = time.time()
+        while True:
+            if self.cancel_event is not None and self.cancel_event.is_set():
+                self.stop_reason = "cancelled"
+                print("⏹️ 수신 취소됨")
+                return
+            if os.path.exists(self.manifest_path):
+                if os.path.getsize(self.manifest_path) < self.manifest_offset:
+                    # 다음 실행이 manifest를 비우고 새로 시작함: 이전 위치에서 계속 읽으면 새 항목을 잘못 읽으므로 종료
+                    self.stop_reason = "replaced"
+                    print("⏹️ manifest가 새로 만들어져 이전 수신을 종료합니다.")
+                    return
+                new_files = self._read_manifest()
+            else:
+                new_files = self._scan_directory()
+            finished = END_OF_STREAM in new_files or os.path.exists(os.path.join(self.video_dir, END_OF_STREAM))
+
+            for video_file in new_files:
+                if video_file == END_OF_STREAM or video_file in self.seen:
+                    continue
+                self.seen.add(video_file)
+                last_arrival = time.time()
+                yield video_file
+
+            if finished:
+                # 디렉토리 감시 모드에서는 종료 표시 직전에 도착한 파일이 남았는지 한 번 더 확인
+                if not os.path.exists(self.manifest_path) and self._scan_directory():
+                    continue
+                return
+            if self.idle_timeout is not None and time.time() - last_arrival > self.idle_timeout:
+                self.stop_reason = "idle_timeout"
+                print(f"⏰ {self.idle_timeout:.0f}초 동안 새 파일도 종료 표시도 없어 수신을 종료합니다.")
+                return
+            time.sleep(self.poll_interval)
+
+    def _read_manifest(self):
+        """manifest에서 새로 추가된 완전한 줄들 (아직 줄바꿈이 안 쓰인 마지막 줄은 다음에 읽음)"""
+        with open(self.manifest_path, 'rb') as f:
+            f.seek(self.manifest_offset)
+            data = f.read()
+        end = data.rfind(b'\n')
+        if end < 0:
+            return []
+        self.manifest_offset += end + 1
+        return [line.strip() for line in data[:end].decode('utf-8').split('\n') if line.strip()]
+
+    def _scan_directory(self):
+        names = sorted(
+            name for name in os.listdir(self.video_dir)
+            if name.endswith('.mp4') and not name.startswith('.')
+        )
+        return [name for name in names if name not in self.seen]
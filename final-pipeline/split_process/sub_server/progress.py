@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+import subprocess
+
+
+def gpu_stats():
+    """GPU 사용률(%)과 사용 중인 메모리(MB) 리스트 (nvidia-smi가 없으면 빈 리스트)"""
+    try:
+        output = subprocess.run(
+            ['nvidia-smi', '--query-gpu=utilization.gpu,memory.used', '--format=csv,noheader,nounits'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, timeout=5
+        ).stdout
+    except (OSError, subprocess.SubprocessError):
+        return []
+    stats = []
+    for line in output.strip().splitlines():
+        try:
+            utilization, memory = (float(value) for value in line.split(','))
+        except ValueError:
+            continue
+        stats.append({"utilization": utilization, "memory_mb": memory})
+    return stats
+
+
+def _proc_stat(pid):
+    """/proc/<pid>/stat에서 (부모 pid, utime+stime+cutime+cstime 초), 읽을 수 없으면 None"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # comm(2번째 필드)에 공백이 있을 수 있으므로 마지막 ')' 뒤(3번째 필드 state)부터 나눈다
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[1]), sum(int(value) for value in fields[11:15]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def process_tree_cpu_seconds():
+    """이 프로세스와 살아 있는 모든 자손 프로세스(디코딩 워커 등)의 누적 CPU 시간 (초)
+
+    os.times()의 children 값은 wait()로 회수된 자식만 포함해 실행 중인 디코딩 워커가 빠지므로,
+    /proc을 훑어 살아 있는 자손의 CPU 시간을 더한다. 이미 회수된 자식은 os.times()의 children 값에 남는다.
+    /proc이 없으면 os.times() 값만 사용한다.
+    """
+    cpu_seconds = sum(os.times()[:4])
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return cpu_seconds
+
+    children, process_cpu = {}, {}
+    for pid in pids:
+        stat = _proc_stat(pid)
+        if stat is not None:
+            children.setdefault(stat[0], []).append(pid)
+            process_cpu[pid] = stat[1]
+
+    pending = list(children.get(os.getpid(), []))
+    while pending:
+        pid = pending.pop()
+        cpu_seconds += process_cpu[pid]
+        pending.extend(children.get(pid, []))
+    return cpu_seconds
+
+
+class ProgressReporter:
+    """세그먼트 처리 진행 상황을 interval초마다 구조화된 이벤트로 내보내는 리포터
+
+    이벤트는 누적 값(처리한 세그먼트 수, 비디오 길이, 생성 토큰 수)과 직전 이벤트 이후의 처리량,
+    GPU/CPU 사용률, 대기 중인 세그먼트 수를 담는다. emit(event)는 예: 메인 서버로 보내는 ResultStreamer.
+    session은 process() 호출마다 달라서 메인 서버가 같은 노드의 여러 작업을 누적해 합칠 수 있다.
+    """
+
+    def __init__(self, node_id, emit, interval=10.0, tokens_fn=None, queue_depth_fn=None):
+        self.node_id = node_id
+        self.emit = emit
+        self.interval = interval
+        self.tokens_fn = tokens_fn or (lambda: 0)
+        self.queue_depth_fn = queue_depth_fn or (lambda: 0)
+
+        self.session = f"{node_id}-{os.getpid()}-{time.time():.0f}"
+        self.started_at = time.time()
+        self.lock = threading.Lock()
+        self.segments = 0
+        self.video_seconds = 0.0
+        self.last = (self.started_at, 0, 0.0, 0, process_tree_cpu_seconds())  # (시각, 세그먼트, 비디오 길이, 토큰, CPU 시간)
+
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._report_loop, daemon=True)
+        self.thread.start()
+
+    def segment_done(self, video_seconds):
+        with self.lock:
+            self.segments += 1
+            self.video_seconds += video_seconds
+
+    def snapshot(self, final=False):
+        """현재 진행 상황 이벤트 (직전 이벤트와의 차이로 처리량 계산)"""
+        now, cpu_total = time.time(), process_tree_cpu_seconds()
+        with self.lock:
+            segments, video_seconds = self.segments, self.video_seconds
+        tokens = self.tokens_fn()
+        last_time, last_segments, last_video_seconds, last_tokens, last_cpu_total = self.last
+        self.last = (now, segments, video_seconds, tokens, cpu_total)
+
+        elapsed = max(now - last_time, 1e-6)
+        # 이 프로세스와 자손 프로세스(디코딩 워커)의 CPU 시간 / 경과 시간 / 코어 수
+        # (회수되지 않은 채 종료된 자손이 있으면 줄어들 수 있으므로 0 아래로는 내리지 않음)
+        cpu_seconds = max(cpu_total - last_cpu_total, 0.0)
+        gpus = gpu_stats()
+        return {
+            "node": self.node_id,
+            "session": self.session,
+            "time": now,
+            "elapsed": now - self.started_at,
+            "segments_done": segments,
+            "video_seconds": video_seconds,
+            "tokens": tokens,
+            "segments_per_sec": (segments - last_segments) / elapsed,
+            "video_sec_per_sec": (video_seconds - last_video_seconds) / elapsed,
+            "tokens_per_sec": (tokens - last_tokens) / elapsed,
+            "queue_depth": self.queue_depth_fn(),
+            "cpu_util": 100.0 * cpu_seconds / elapsed / (os.cpu_count() or 1),
+            "load_avg": os.getloadavg()[0],
+            "gpu_util": [gpu["utilization"] for gpu in gpus],
+            "gpu_memory_mb": [gpu["memory_mb"] for gpu in gpus],
+            "final": final,
+        }
+
+    def _report_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.emit(self.snapshot())
+
+    def close(self):
+        """마지막 이벤트를 보내고 종료"""
+        self.stop_event.set()
+        self.thread.join()
+        self.emit(self.snapshot(final=True))
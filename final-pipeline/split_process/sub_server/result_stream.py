@@ -0,0 +1,81 @@
+import json
+import time
+import queue
+import threading
+import subprocess
+
+
+class ResultStreamer:
+    """결과 레코드를 모아 JSONL 배치로 메인 서버에 바로 보내는 스트리머
+
+    command는 표준 입력을 받아 메인 서버 쪽 파일에 이어 쓰는 프로세스
+    (예: ssh main 'cat >> video_files_{ip}.jsonl')이며, 한 번 띄워 계속 재사용한다.
+    batch_size개가 모이거나 flush_interval초가 지나면 전송하고, 연결이 끊기면 다시 띄워 그 배치를 재전송한다.
+    (재전송으로 생기는 중복은 메인 서버가 세그먼트 키로 제거한다)
+    """
+
+    def __init__(self, command, batch_size=32, flush_interval=2.0, max_retries=5, retry_delay=2.0, label="결과"):
+        self.command = command
+        self.label = label
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+        self.process = None
+        self.sent = 0
+        self.dropped = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._send_loop, daemon=True)
+        self.thread.start()
+
+    def put(self, key, data):
+        """결과 레코드 추가 (체크포인트와 같은 {"key", "data"} 형식으로 전송)"""
+        self.queue.put(json.dumps({"key": key, "data": data}, ensure_ascii=False) + "\n")
+
+    def _send_loop(self):
+        closed = False
+        while not closed:
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    line = self.queue.get(timeout=max(deadline - time.time(), 0.01))
+                except queue.Empty:
+                    break
+                if line is None:
+                    closed = True
+                    break
+                batch.append(line)
+            if batch:
+                self._send(batch)
+
+    def _send(self, batch):
+        data = "".join(batch).encode('utf-8')
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                if self.process is None or self.process.poll() is not None:
+                    self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE,
+                                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                self.process.stdin.write(data)
+                self.process.stdin.flush()
+                self.sent += len(batch)
+                return
+            except OSError as e:
+                print(f"⚠️ 결과 전송 실패 ({attempt}/{self.max_retries}): {str(e)}")
+                self.process = None
+                time.sleep(self.retry_delay * attempt)
+        # 끝내 보내지 못한 레코드는 마지막 결과 파일 전송으로 메인 서버에 전달된다
+        self.dropped += len(batch)
+
+    def close(self):
+        """남은 레코드를 보내고 연결 종료"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.process is not None:
+            try:
+                self.process.stdin.close()
+            except OSError:
+                pass
+            self.process.wait()
+        print(f"📤 {self.label} 스트리밍: {self.sent}개 전송" + (f", {self.dropped}개 실패" if self.dropped else ""))
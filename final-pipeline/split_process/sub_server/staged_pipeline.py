@@ -0,0 +1,264 @@
+import time
+import queue
+import threading
+import multiprocessing as mp
+
+# 디코딩 워커가 모든 작업을 마쳤음을 알리는 표시
+_WORKER_DONE = "__worker_done__"
+# 디코딩 워커가 작업 하나를 마쳤음을 알리는 표시 (결과가 0개여도 보냄)
+_JOB_DONE = "__job_done__"
+
+
+class StageStats:
+    """파이프라인 단계별 처리량 통계"""
+
+    def __init__(self, name):
+        self.name = name
+        self.count = 0
+        self.failed = 0
+        self.busy_time = 0.0  # 실제 작업 시간
+        self.wait_time = 0.0  # 입력을 기다린 시간 (앞 단계가 느리면 증가)
+
+    def add(self, busy_time, count=1):
+        self.count += count
+        self.busy_time += busy_time
+
+    def summary(self, elapsed):
+        throughput = self.count / elapsed if elapsed > 0 else 0.0
+        return (f"• {self.name}: {self.count}개 (실패 {self.failed}), "
+                f"작업 {self.busy_time:.1f}초, 대기 {self.wait_time:.1f}초, {throughput:.2f}개/초")
+
+
+def _decode_worker(index, prepare_fn, init_fn, init_args, job_queue, ready_queue, current_jobs):
+    """디코딩/전처리 워커 프로세스
+
+    job_queue에서 (번호, 작업)을 꺼내 prepare_fn(job)이 내놓는 (item, payload)를 ready_queue에 넣고,
+    작업이 끝나면 (_JOB_DONE, 번호)를 넣는다.
+    ready_queue가 가득 차면 put에서 대기하므로 생성 단계보다 앞서 나가지 않는다.
+    처리 중인 작업 번호는 공유 배열 current_jobs[index]에 적어 두어(없으면 -1) 워커가 죽어도 메인 프로세스가 알 수 있다.
+    """
+    if init_fn is not None:
+        init_fn(*init_args)
+
+    while True:
+        message = job_queue.get()
+        if message is None:
+            break
+
+        seq, job = message
+        current_jobs[index] = seq
+        start = time.time()
+        try:
+            for item, payload in prepare_fn(job):
+                ready_queue.put((item, payload, None, time.time() - start))
+                start = time.time()
+        except Exception as e:
+            ready_queue.put((job, None, str(e), time.time() - start))
+        ready_queue.put((_JOB_DONE, seq))
+        current_jobs[index] = -1
+
+    ready_queue.put((_WORKER_DONE, index))
+
+
+class StagedCaptioningPipeline:
+    """CPU 디코딩과 모델 생성을 겹쳐 실행하는 생산자-소비자 파이프라인
+
+    1. 디코딩 단계: 워커 프로세스들이 prepare_fn(job)으로 프레임 디코딩과 전처리를 수행
+    2. 생성 단계: 메인 프로세스에서 generate_fn(batch)로 모델 생성 (batch는 (item, payload) 리스트)
+    3. 후처리 단계: 별도 스레드에서 postprocess_fn(item, output)으로 디코딩/번역/저장
+
+    prepare_fn, worker_init_fn은 spawn된 프로세스에서 실행되므로 모듈 최상위 함수여야 한다.
+    단계 사이의 큐는 queue_size로 제한되어 느린 단계가 있으면 앞 단계가 기다린다.
+    디코딩 워커가 종료 표시 없이 죽으면(세그폴트, OOM 등) 끝난 워커로 세고 남은 워커로 계속 처리하며,
+    그 워커가 처리 중이던 작업은 바로, 결과가 전달되지 못한 나머지 작업은 마지막에 실패로 기록한다.
+    failure_fn(item, error)를 주면 어느 단계에서든 실패한 항목마다 호출한다 (처리 끝난 항목 수 집계용).
+    """
+
+    def __init__(self, prepare_fn, generate_fn, postprocess_fn, num_workers=2, queue_size=8,
+                 batch_size=1, worker_init_fn=None, worker_init_args=(), failure_fn=None):
+        self.prepare_fn = prepare_fn
+        self.generate_fn = generate_fn
+        self.postprocess_fn = postprocess_fn
+        self.num_workers = max(1, num_workers)
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.worker_init_fn = worker_init_fn
+        self.worker_init_args = worker_init_args
+        self.failure_fn = failure_fn
+
+        self.stats = {
+            'decode': StageStats("디코딩/전처리"),
+            'generate': StageStats("캡션 생성"),
+            'postprocess': StageStats("후처리"),
+        }
+
+    def run(self, jobs):
+        """jobs를 처리하고 후처리 결과 리스트를 반환 (None 결과는 제외)
+
+        jobs는 리스트뿐 아니라 작업이 도착하는 대로 내놓는 이터레이터(예: 받은 파일 감시)여도 되며,
+        별도 스레드가 꺼내 넣으므로 첫 작업부터 바로 처리가 시작된다.
+        """
+        ctx = mp.get_context("spawn")
+        job_queue = ctx.Queue()
+        ready_queue = ctx.Queue(maxsize=self.queue_size)
+        post_queue = queue.Queue(maxsize=self.queue_size)
+
+        # 끝났다는 표시를 아직 받지 못한 작업 (번호 -> 작업), 워커별 처리 중인 작업 번호 (워커가 죽으면 실패로 기록)
+        self.pending_jobs = {}
+        current_jobs = ctx.Array('q', [-1] * self.num_workers, lock=False)
+
+        feed_thread = threading.Thread(target=self._feed_jobs, args=(jobs, job_queue), daemon=True)
+        feed_thread.start()
+
+        workers = [
+            ctx.Process(
+                target=_decode_worker,
+                args=(index, self.prepare_fn, self.worker_init_fn, self.worker_init_args, job_queue, ready_queue,
+                      current_jobs),
+                daemon=True,
+            )
+            for index in range(self.num_workers)
+        ]
+        for worker in workers:
+            worker.start()
+
+        results = []
+        post_thread = threading.Thread(target=self._postprocess_loop, args=(post_queue, results))
+        post_thread.start()
+
+        run_start = time.time()
+        try:
+            self._generate_loop(ready_queue, post_queue, workers, current_jobs)
+        finally:
+            post_queue.put(None)
+            post_thread.join()
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+
+        self.elapsed = time.time() - run_start
+        self.print_stats()
+        return results
+
+    def _feed_jobs(self, jobs, job_queue):
+        """작업을 디코딩 워커 큐에 넣고, 끝나면 워커 수만큼 종료 표시를 넣는다"""
+        try:
+            for seq, job in enumerate(jobs):
+                self.pending_jobs[seq] = job
+                job_queue.put((seq, job))
+        except Exception as e:
+            print(f"🚨 작업 목록 읽기 실패: {str(e)}")
+        finally:
+            for _ in range(self.num_workers):
+                job_queue.put(None)
+
+    def _generate_loop(self, ready_queue, post_queue, workers, current_jobs):
+        decode_stats = self.stats['decode']
+        generate_stats = self.stats['generate']
+        active_workers = self.num_workers
+        finished_workers = set()  # 종료 표시를 보냈거나 죽은 워커 (워커마다 한 번만 센다)
+
+        while active_workers > 0:
+            # 첫 항목은 기다려서 받고, 배치의 나머지는 이미 준비된 것만 모은다
+            batch = []
+            wait_start = time.time()
+            while active_workers > 0 and len(batch) < self.batch_size:
+                try:
+                    message = ready_queue.get(block=not batch, timeout=1.0 if not batch else None)
+                except queue.Empty:
+                    if batch:
+                        break
+                    # 종료 표시 없이 죽은 워커(정상 종료는 종료 코드 0)는 끝난 것으로 센다
+                    for index, worker in enumerate(workers):
+                        if index not in finished_workers and worker.exitcode not in (None, 0):
+                            finished_workers.add(index)
+                            active_workers -= 1
+                            print(f"🚨 디코딩 워커 {index} 비정상 종료 (exitcode {worker.exitcode}), "
+                                  f"남은 워커 {active_workers}개")
+                            if current_jobs[index] >= 0:
+                                self._report_lost_job(current_jobs[index], f"decode worker exited with {worker.exitcode}")
+                    continue
+                if message[0] == _JOB_DONE:
+                    self.pending_jobs.pop(message[1], None)
+                    continue
+                if message[0] == _WORKER_DONE:
+                    # 종료 표시를 보낸 뒤 비정상 종료 코드로 끝나 이미 죽은 워커로 센 경우는 다시 세지 않는다
+                    if message[1] not in finished_workers:
+                        finished_workers.add(message[1])
+                        active_workers -= 1
+                    continue
+
+                item, payload, error, decode_time = message
+                decode_stats.add(decode_time)
+                if error is not None:
+                    decode_stats.failed += 1
+                    print(f"🚨 전처리 실패: {item} - {error}")
+                    self._report_failure(item, error)
+                    continue
+                batch.append((item, payload))
+            generate_stats.wait_time += time.time() - wait_start
+
+            if not batch:
+                continue
+
+            generate_start = time.time()
+            try:
+                outputs = self.generate_fn(batch)
+            except Exception as e:
+                print(f"🚨 캡션 생성 실패: {str(e)}")
+                generate_stats.failed += len(batch)
+                for item, _ in batch:
+                    self._report_failure(item, e)
+                continue
+            generate_stats.add(time.time() - generate_start, count=len(batch))
+
+            for (item, _), output in zip(batch, outputs):
+                post_queue.put((item, output))
+
+        # 죽은 워커가 꺼냈지만 끝났다는 표시가 전달되지 못한 작업(보내기 전 버퍼에 남은 경우 포함)과 처리되지 못한 작업
+        for seq in list(self.pending_jobs):
+            self._report_lost_job(seq, "decode worker exited before finishing the job")
+
+    def _report_lost_job(self, seq, reason):
+        job = self.pending_jobs.pop(seq, None)
+        if job is None:
+            return
+        self.stats['decode'].failed += 1
+        print(f"🚨 전처리 실패: {job} - 디코딩 워커 비정상 종료")
+        self._report_failure(job, RuntimeError(reason))
+
+    def _postprocess_loop(self, post_queue, results):
+        post_stats = self.stats['postprocess']
+        while True:
+            wait_start = time.time()
+            message = post_queue.get()
+            post_stats.wait_time += time.time() - wait_start
+            if message is None:
+                break
+
+            item, output = message
+            post_start = time.time()
+            try:
+                result = self.postprocess_fn(item, output)
+            except Exception as e:
+                print(f"🚨 후처리 실패: {item} - {str(e)}")
+                post_stats.failed += 1
+                self._report_failure(item, e)
+                continue
+            post_stats.add(time.time() - post_start)
+            if result is not None:
+                results.append(result)
+
+    def _report_failure(self, item, error):
+        if self.failure_fn is None:
+            return
+        try:
+            self.failure_fn(item, error)
+        except Exception as e:
+            print(f"⚠️ 실패 기록 실패: {item} - {str(e)}")
+
+    def print_stats(self):
+        print("\n📊 단계별 처리량:")
+        for stage in self.stats.values():
+            print(stage.summary(self.elapsed))
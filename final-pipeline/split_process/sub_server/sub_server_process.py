@@ -1,103 +1,332 @@
 import os
-import json
-import torch
+import time
+import threading
+import decord
 from config import Config
 from sentence_transformers import SentenceTransformer
-from tarsier_utils import load_model_and_processor
+from tarsier_utils import load_model_and_processor, Processor, AdaptiveBatchGenerator, sample_video_range
+from staged_pipeline import StagedCaptioningPipeline
+from caption_cache import CaptionCache
+from checkpoint import JsonlCheckpoint, compact_checkpoint
+from static_segments import StaticSegmentDetector, frame_signature
+from inbox import InboxWatcher
+from progress import ProgressReporter
 
-def process():
+MODEL_PATH = "/data/ephemeral/home/Tarsier-7b"
+MAX_N_FRAMES = 4
+INSTRUCTION = "<video>\nDescribe the video in detail."
+EMBEDDING_MODEL = 'sentence-transformers/all-mpnet-base-v2'
+
+# 디코딩 워커 프로세스 전용 전처리기 (init_decode_worker에서 생성)
+_worker_processor = None
+# 디코딩 워커가 마지막으로 연 원본 비디오 (range 모드에서 같은 원본의 연속 구간에 재사용)
+_worker_reader = (None, None)
+
+def init_decode_worker(model_path, max_n_frames):
+    """디코딩 워커 초기화: 모델 없이 전처리기만 로드"""
+    global _worker_processor
+    _worker_processor = Processor(model_path, max_n_frames=max_n_frames)
+
+def resolve_segment(video_file):
+    """세그먼트의 (파일 경로, 시작, 종료)
+
+    잘린 세그먼트 파일이 있으면 그 파일 전체(0, -1)를, 없으면 range 모드로 보고
+    Config.source_dir의 원본 비디오와 파일명의 구간을 반환한다.
+    """
+    segment_path = os.path.join(Config.video_dir, video_file)
+    if os.path.exists(segment_path):
+        return segment_path, 0, -1
+    video_name, start_time, end_time = parse_segment_name(video_file)
+    return os.path.join(Config.source_dir, f"{video_name}.mp4"), start_time, end_time
+
+def load_range_images(video_path, start_time, end_time):
+    """원본 비디오에서 구간 프레임을 바로 샘플링 (워커 프로세스에서 실행)"""
+    global _worker_reader
+    if _worker_reader[0] != video_path:
+        _worker_reader = (video_path, decord.VideoReader(video_path, num_threads=1, ctx=decord.cpu(0)))
+    return sample_video_range(_worker_reader[1], _worker_processor.max_n_frames, start_time, end_time,
+                              as_array=_worker_processor.vectorized_preprocess)
+
+def prepare_inputs(video_file):
+    """비디오 파일을 모델 입력으로 변환 (워커 프로세스에서 실행)"""
+    video_path, start_time, end_time = resolve_segment(video_file)
+    if end_time > 0:
+        images = load_range_images(video_path, start_time, end_time)
+    else:
+        images = _worker_processor.load_images(video_path)
+    inputs = _worker_processor(INSTRUCTION, images=images, edit_prompt=True)
+    inputs['signature'] = frame_signature(images)  # 정적 세그먼트 검출용
+    yield video_file, inputs
+
+def parse_segment_name(video_file):
+    """{video_name}_{start}_{end}.mp4 형식의 파일명에서 정보 추출"""
+    name_parts = os.path.splitext(video_file)[0].split('_')
+    video_name = '_'.join(name_parts[:-2])
+    start_time = float(name_parts[-2])
+    end_time = float(name_parts[-1])
+    return video_name, start_time, end_time
+
+def segment_sort_key(video_file):
+    """같은 원본 비디오의 세그먼트가 시간 순서로 이어지도록 정렬"""
+    video_name, start_time, _ = parse_segment_name(video_file)
+    return video_name, start_time
+
+def load_models():
+    """Tarsier와 임베딩 모델 로드 (상주 워커 데몬은 한 번 로드해 작업마다 재사용)"""
     print("🤖 Tarsier 모델 로딩 중...")
-    model_path = "/data/ephemeral/home/Tarsier-7b"
-    model, processor = load_model_and_processor(model_path, max_n_frames=4)
+    model, processor = load_model_and_processor(MODEL_PATH, max_n_frames=MAX_N_FRAMES)
     
     print("🔤 임베딩 모델 로딩 중...")
-    embedding_model = SentenceTransformer('sentence-transformers/all-mpnet-base-v2')
-    
-    video_files = os.listdir(Config.video_dir)
-    results = []
-    
-    # 배치 크기 설정
-    batch_size = 4
-    print(f"총 {len(video_files)}개의 비디오 처리 시작... (배치 크기: {batch_size})")
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL)
+    return model, processor, embedding_model
+
+def model_versions():
+    """로드되는 모델과 생성 설정 (워커 데몬 상태 보고용)"""
+    config_path = os.path.join(MODEL_PATH, "config.json")
+    return {
+        "tarsier": MODEL_PATH,
+        "tarsier_mtime": os.path.getmtime(config_path) if os.path.exists(config_path) else None,
+        "embedding": EMBEDDING_MODEL,
+        "n_frames": MAX_N_FRAMES,
+        "instruction": INSTRUCTION,
+    }
+
+def process(num_decode_workers=2, batch_size=4, static_threshold=0.03, video_files=None, stream=False,
+            result_sink=None, models=None, progress_sink=None, cancel_event=None):
+    """세그먼트 파일들의 캡션과 임베딩을 생성해 체크포인트와 결과 JSON에 기록
+
+    video_files에 잘린 파일 대신 {원본}_{start}_{end}.mp4 이름만 주면 Config.source_dir의 원본에서 구간을 바로 샘플링한다.
+    stream=True면 Config.video_dir로 도착하는 파일(manifest 또는 디렉토리 감시)을 받는 즉시 처리하고,
+    메인 서버가 END_OF_STREAM을 보내면 종료한다. 파일 전송과 캡션 생성이 겹쳐 실행된다.
+    result_sink(key, result)를 주면 결과가 나올 때마다 호출한다 (예: ResultStreamer.put).
+    models에 load_models()의 결과를 넘기면 모델을 다시 로드하지 않는다.
+    progress_sink(event)를 주면 진행 상황(처리량, 토큰/초, GPU/CPU 사용률, 대기 세그먼트 수)을 주기적으로 보낸다.
+    cancel_event(threading.Event)가 설정되면 스트리밍 수신을 멈추고 이미 받은 세그먼트까지만 처리한다.
+    """
+    model, processor, embedding_model = models or load_models()
     
-    for i in range(0, len(video_files), batch_size):
-        batch_video_files = video_files[i:i + batch_size]
-        batch_video_paths = [
-            os.path.join(Config.video_dir, video_file)
-            for video_file in batch_video_files
-            if os.path.exists(os.path.join(Config.video_dir, video_file))
+    # 체크포인트에 기록된 세그먼트는 건너뛴다
+    checkpoint = JsonlCheckpoint(Config.checkpoint_file)
+    if stream:
+        video_files = InboxWatcher(Config.video_dir, Config.manifest_file, idle_timeout=Config.stream_idle_timeout,
+                                   cancel_event=cancel_event)
+        pending_files = video_files
+        print(f"📥 {Config.video_dir} 수신 대기 중... (최대 배치 크기: {batch_size}, 디코딩 워커: {num_decode_workers})")
+    else:
+        video_files = [
+            video_file for video_file in (video_files or os.listdir(Config.video_dir))
+            if os.path.exists(resolve_segment(video_file)[0])
         ]
+        pending_files = sorted(
+            (video_file for video_file in video_files if not checkpoint.is_done(video_file)),
+            key=segment_sort_key
+        )
+        if len(pending_files) < len(video_files):
+            print(f"♻️ 체크포인트에서 {len(video_files) - len(pending_files)}개 세그먼트 복구 (건너뜀)")
         
-        try:
-            # 캡션 생성을 위한 배치 입력 준비
-            instruction = "<video>\nDescribe the video in detail."
-            inputs_list = []
-            
-            for video_path in batch_video_paths:
-                inputs = processor(instruction, video_path, edit_prompt=True, return_prompt=True)
-                inputs.pop('prompt', None)
-                inputs = {k: v.to(model.device) for k, v in inputs.items() if v is not None}
-                inputs_list.append(inputs)
-            
-            # 배치 입력 생성
-            batch_inputs = {k: torch.cat([inputs[k] for inputs in inputs_list], dim=0) for k in inputs_list[0]}
-            
-            # 배치 추론
-            outputs = model.generate(
-                **batch_inputs,
-                do_sample=True,
-                max_new_tokens=512,
-                top_p=0.9,
-                temperature=0.8,
-                use_cache=True
-            )
-            
-            # 각 비디오 결과 처리
-            for idx, video_file in enumerate(batch_video_files):
-                try:
-                    caption = processor.tokenizer.decode(
-                        outputs[idx][inputs_list[idx]['input_ids'][0].shape[0]:],
-                        skip_special_tokens=True
-                    )
-                    
-                    if not caption:
-                        continue
-                    
-                    # 파일명에서 정보 추출
-                    name_parts = os.path.splitext(video_file)[0].split('_')
-                    video_name = '_'.join(name_parts[:-2])
-                    start_time = float(name_parts[-2])
-                    end_time = float(name_parts[-1])
-                    
-                    # 임베딩 생성
-                    embedding = embedding_model.encode([caption])[0]
-                    
-                    # 결과 저장
-                    result = {
-                        "video_path": f"{video_name}.mp4",  # 원본 비디오 이름
-                        "video_id": "",  # 외부 비디오는 빈 문자열
-                        "title": video_name,
-                        "url": "",
-                        "start_time": str(start_time),  # 문자열로 변환
-                        "end_time": str(end_time),  # 문자열로 변환
-                        "caption": caption,
-                        "embedding": embedding.tolist()
-                    }
-                    results.append(result)
-                    print(f"✓ {video_file} 처리 완료")
-                    
-                except Exception as e:
-                    print(f"✗ {video_file} 개별 처리 실패: {str(e)}")
-                    continue
-                    
-        except Exception as e:
-            print(f"✗ 배치 처리 실패: {str(e)}")
-            continue
-
-    # JSON 파일로 저장
-    with open(Config.output_file, "w", encoding="utf-8") as f:
-        json.dump(results, f, indent=4, ensure_ascii=False)
-
-    print(f"\n총 {len(results)}/{len(video_files)}개의 비디오 처리 완료")
-    print(f"결과가 {Config.output_file}에 저장되었습니다.")
+        print(f"총 {len(video_files)}개의 비디오 처리 시작... (최대 배치 크기: {batch_size}, 디코딩 워커: {num_decode_workers})")
+
+    # 왼쪽 패딩 배치 생성 (메모리 예산에 맞춰 배치 크기 조절, OOM 시 배치 분할)
+    batch_generator = AdaptiveBatchGenerator(
+        model, processor,
+        max_batch_size=batch_size,
+        do_sample=True,
+        max_new_tokens=512,
+        top_p=0.9,
+        temperature=0.8,
+        use_cache=True
+    )
+
+    # 캡션 캐시: 같은 세그먼트 파일 + 같은 생성 설정이면 모델을 다시 돌리지 않는다
+    caption_cache = CaptionCache(Config.cache_path)
+    generation_config = {
+        "model": MODEL_PATH,
+        "instruction": INSTRUCTION,
+        "n_frames": MAX_N_FRAMES,
+        **{k: v for k, v in batch_generator.generate_kwargs.items() if k != 'use_cache'},
+    }
 
+    # 정적 세그먼트 검출: 같은 원본의 바로 앞 세그먼트와 거의 같으면 캡션과 임베딩을 재사용
+    static_detector = StaticSegmentDetector(threshold=static_threshold) if static_threshold else None
+    linked_anchors = {}  # 정적 세그먼트 파일 -> 재사용할 anchor 항목
+    anchor_items = {}  # 새 anchor가 된 파일 -> anchor 항목
+    # 원본별로 아직 생성 단계를 지나지 않은 세그먼트 (모두 지나가면 anchor 정리, 스트리밍은 검출기가 최근 비디오만 기억)
+    remaining_segments = {}
+
+    def forget_finished_video(video_file):
+        video_name, _, _ = parse_segment_name(video_file)
+        remaining = remaining_segments.get(video_name)
+        if remaining is None:
+            return
+        remaining.discard(video_file)  # 후처리 실패로 다시 불려도 한 번만 빠진다
+        if not remaining:
+            remaining_segments.pop(video_name, None)
+            if static_detector is not None:
+                static_detector.forget(video_name)
+
+    def generate(batch):
+        generate_indices = []
+        for index, (video_file, inputs) in enumerate(batch):
+            signature = inputs.pop('signature', None)
+            if static_detector is None or signature is None:
+                generate_indices.append(index)
+                continue
+            video_name, start_time, end_time = parse_segment_name(video_file)
+            anchor = static_detector.match(video_name, (start_time, end_time), signature)
+            if anchor is not None:
+                linked_anchors[video_file] = anchor
+            else:
+                anchor_items[video_file] = static_detector.set_anchor(video_name, (start_time, end_time), signature)
+                generate_indices.append(index)
+
+        captions = [""] * len(batch)
+        if generate_indices:
+            generate_start = time.time()
+            generated = batch_generator.generate([batch[i][1] for i in generate_indices])
+            if static_detector is not None:
+                static_detector.record_generation(time.time() - generate_start, count=len(generate_indices))
+            for index, caption in zip(generate_indices, generated):
+                captions[index] = caption
+                if batch[index][0] in anchor_items:
+                    anchor_items[batch[index][0]]['caption'] = caption
+        for index, (video_file, _) in enumerate(batch):
+            if video_file in linked_anchors:
+                captions[index] = linked_anchors[video_file]['caption'] or ""
+                if captions[index]:
+                    static_detector.record_reuse()
+            forget_finished_video(video_file)
+        return captions
+
+    # 스트리밍이면 처리를 끝낸 세그먼트를 실패나 건너뜀까지 포함해 한 줄씩 기록한다
+    # (결과 체크포인트에는 캡션이 생긴 세그먼트만 남으므로 메인 서버는 이 파일로 원격 backlog를 확인)
+    consumed_log = None
+    consumed_lock = threading.Lock()
+    if stream:
+        os.makedirs(os.path.dirname(Config.consumed_file), exist_ok=True)
+        consumed_log = open(Config.consumed_file, 'a', encoding='utf-8')
+
+    def mark_consumed(video_file):
+        if consumed_log is None:
+            return
+        with consumed_lock:
+            consumed_log.write(f"{video_file}\n")
+            consumed_log.flush()
+
+    def record(video_file, result):
+        checkpoint.append(video_file, result)
+        mark_consumed(video_file)
+        if reporter is not None:
+            _, start_time, end_time = parse_segment_name(video_file)
+            reporter.segment_done(end_time - start_time)
+        if result_sink is not None:
+            result_sink(video_file, result)
+
+    def postprocess(video_file, caption):
+        finished_files.add(video_file)
+        linked_anchor = linked_anchors.pop(video_file, None)
+        new_anchor = anchor_items.pop(video_file, None)
+        if not caption:
+            mark_consumed(video_file)
+            return None
+        if linked_anchor is None:
+            # 정적 세그먼트가 재사용한 캡션은 이 구간에서 생성한 것이 아니므로 캐시에 넣지 않는다
+            caption_cache.put(*resolve_segment(video_file), generation_config, caption)
+        if linked_anchor is not None and linked_anchor['result'] is not None:
+            result = build_result(video_file, caption, linked_result=linked_anchor['result'])
+        else:
+            result = build_result(video_file, caption)
+        if new_anchor is not None:
+            new_anchor['result'] = result
+        record(video_file, result)
+        return result
+
+    def fail(video_file, error):
+        # 디코딩/생성/후처리 중 실패한 세그먼트도 끝난 것으로 집계 (대기 세그먼트 수, backlog)
+        finished_files.add(video_file)
+        mark_consumed(video_file)
+        forget_finished_video(video_file)
+
+    def build_result(video_file, caption, linked_result=None):
+        # 파일명에서 정보 추출
+        video_name, start_time, end_time = parse_segment_name(video_file)
+        
+        # 임베딩 생성 (정적 세그먼트는 같은 캡션이므로 원래 세그먼트의 임베딩 재사용)
+        if linked_result is not None:
+            embedding = linked_result["embedding"]
+        else:
+            embedding = embedding_model.encode([caption])[0].tolist()
+        
+        print(f"✓ {video_file} 처리 완료")
+        result = {
+            "video_path": f"{video_name}.mp4",  # 원본 비디오 이름
+            "video_id": "",  # 외부 비디오는 빈 문자열
+            "title": video_name,
+            "url": "",
+            "start_time": str(start_time),  # 문자열로 변환
+            "end_time": str(end_time),  # 문자열로 변환
+            "caption": caption,
+            "embedding": embedding
+        }
+        if linked_result is not None:
+            result["static_of"] = [linked_result["start_time"], linked_result["end_time"]]
+        return result
+
+    # 디코딩(워커 프로세스) -> 캡션 생성(메인) -> 임베딩/결과 생성(스레드) 단계를 겹쳐 실행
+    pipeline = StagedCaptioningPipeline(
+        prepare_fn=prepare_inputs,
+        generate_fn=generate,
+        postprocess_fn=postprocess,
+        num_workers=num_decode_workers,
+        batch_size=batch_size,
+        worker_init_fn=init_decode_worker,
+        worker_init_args=(MODEL_PATH, MAX_N_FRAMES),
+        failure_fn=fail,
+    )
+    # 캐시된 세그먼트는 생성 없이 바로 결과 생성
+    received_files = []
+    pipeline_counts = {"queued": 0}  # 파이프라인에 넣은 세그먼트 수 (대기 세그먼트 수 계산용)
+    finished_files = set()  # 파이프라인에서 끝난(성공/실패) 세그먼트, 후처리 중 실패해도 한 번만 집계
+    reporter = None
+    if progress_sink is not None:
+        reporter = ProgressReporter(
+            Config.node_id, progress_sink, interval=Config.progress_interval,
+            tokens_fn=lambda: batch_generator.generated_tokens,
+            queue_depth_fn=lambda: pipeline_counts["queued"] - len(finished_files),
+        )
+    def uncached_files(video_files):
+        for video_file in video_files:
+            received_files.append(video_file)
+            if checkpoint.is_done(video_file):
+                mark_consumed(video_file)
+                continue
+            caption = caption_cache.get(*resolve_segment(video_file), generation_config)
+            if caption is None:
+                pipeline_counts["queued"] += 1
+                yield video_file
+            else:
+                record(video_file, build_result(video_file, caption))
+
+    # 스트리밍이면 도착하는 대로 파이프라인에 넣고, 아니면 캐시 확인을 먼저 끝낸다
+    jobs = uncached_files(pending_files) if stream else list(uncached_files(pending_files))
+    if not stream:
+        for video_file in jobs:
+            remaining_segments.setdefault(parse_segment_name(video_file)[0], set()).add(video_file)
+    try:
+        pipeline.run(jobs)
+    finally:
+        checkpoint.close()
+        if consumed_log is not None:
+            consumed_log.close()
+        if reporter is not None:
+            reporter.close()
+    print(caption_cache.summary())
+    if static_detector is not None:
+        print(static_detector.summary())
+
+    # JSONL 체크포인트를 JSON 파일로 변환
+    results = compact_checkpoint(Config.checkpoint_file, Config.output_file)
+
+    print(f"\n총 {len(results)}/{len(received_files) if stream else len(video_files)}개의 비디오 처리 완료")
+    print(f"결과가 {Config.output_file}에 저장되었습니다.")
+    if stream and video_files.stop_reason == "idle_timeout":
+        raise RuntimeError(f"{Config.stream_idle_timeout}초 동안 END_OF_STREAM을 받지 못함")
@@ -1,12 +1,12 @@
 
 import os
+import sys
 import math
 import subprocess
 from typing import List, Dict
-from sub_server_process import process
+import worker_client
+from result_stream import ResultStreamer
 from config import Config
-# 고유한 파일명 생성
-process() #sub_server_process 실행
 
 class ServerInfo:
     def __init__(self, ip: str, port: int, username: str):
@@ -19,29 +19,81 @@ server=ServerInfo(
             username="your_username_here",
         )
 
-try:
-    os.chmod(Config.ssh_key_path, 0o600)
-except Exception as e:
-    print(f"키 파일 권한 수정 실패: {str(e)}")
-
-#output 폴더 생성
-cmd = [
-    'ssh','-o', 'StrictHostKeyChecking=no',
-    '-i', Config.ssh_key_path,
-    '-p', str(server.port),
-    f'{server.username}@{server.ip}',
-    f'mkdir -p {Config.remote_path}'
-]
-subprocess.run(cmd, check=True)
-
-
-#output 파일 전송
-cmd = [
-    'scp',
-    '-i', Config.ssh_key_path,  # SSH 키 파일 경로
-    '-P', str(server.port),
-    Config.output_file,
-    f'{server.username}@{server.ip}:{Config.remote_path}'
-]
-subprocess.run(cmd, check=True)
+
+def result_stream_command(file_name=None):
+    """메인 서버의 결과 폴더에 JSONL을 이어 쓰는 지속 SSH 연결 명령 (기본: 결과 체크포인트 파일)"""
+    remote_file = os.path.join(Config.remote_path, file_name or os.path.basename(Config.checkpoint_file))
+    return [
+        'ssh', '-o', 'StrictHostKeyChecking=no',
+        '-o', 'ServerAliveInterval=30',
+        '-i', Config.ssh_key_path,
+        '-p', str(server.port),
+        f'{server.username}@{server.ip}',
+        f'mkdir -p {Config.remote_path} && cat >> {remote_file}'
+    ]
+
+
+def run_job(video_files=None, stream=False, models=None, cancel_event=None):
+    """세그먼트 처리 후 결과 JSON을 메인 서버로 전송 (models를 넘기면 로드된 모델 재사용, cancel_event로 스트림 중단)"""
+    from sub_server_process import process  # 데몬에 제출만 할 때는 torch를 import하지 않도록
+
+    try:
+        os.chmod(Config.ssh_key_path, 0o600)
+    except Exception as e:
+        print(f"키 파일 권한 수정 실패: {str(e)}")
+
+    # 결과는 나오는 즉시 메인 서버로 스트리밍 (마지막 JSON 전송은 누락분 보완용)
+    # 진행 상황 이벤트도 별도 파일로 스트리밍 (메인 서버가 모아 대시보드와 노드별 성능 요약 생성)
+    streamer = ResultStreamer(result_stream_command())
+    progress_streamer = ResultStreamer(result_stream_command(Config.progress_file), batch_size=1,
+                                       label="진행 상황")
+    try:
+        # stream: 도착하는 파일을 바로 처리 (END_OF_STREAM까지)
+        # 그 외에는 메인 서버가 넘긴 작업 단위의 파일들만 처리 (없으면 폴더 전체)
+        process(video_files=video_files, stream=stream, result_sink=streamer.put, models=models, cancel_event=cancel_event,
+                progress_sink=lambda event: progress_streamer.put(Config.node_id, event)) #sub_server_process 실행
+    finally:
+        streamer.close()
+        progress_streamer.close()
+
+    #output 폴더 생성
+    cmd = [
+        'ssh','-o', 'StrictHostKeyChecking=no',
+        '-i', Config.ssh_key_path,
+        '-p', str(server.port),
+        f'{server.username}@{server.ip}',
+        f'mkdir -p {Config.remote_path}'
+    ]
+    subprocess.run(cmd, check=True)
+
+
+    #output 파일 전송
+    cmd = [
+        'scp',
+        '-i', Config.ssh_key_path,  # SSH 키 파일 경로
+        '-P', str(server.port),
+        Config.output_file,
+        f'{server.username}@{server.ip}:{Config.remote_path}'
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def main():
+    # 디코딩 워커가 spawn으로 이 스크립트를 다시 import하므로 실행 코드는 main 가드 안에 둔다
+    stream = sys.argv[1:] == ['--stream']
+    video_files = None if stream else (sys.argv[1:] or None)
+
+    # 상주 워커 데몬이 있으면 모델을 다시 로드하지 않고 데몬에 작업 제출
+    if worker_client.daemon_running() and worker_client.wait_until_ready(Config.daemon_ready_timeout):
+        status = worker_client.submit(video_files, stream=stream)
+        print(f"🛰️ 워커 데몬 작업 {status['job_id']}: {status['state']}")
+        if status['state'] != 'done':
+            sys.exit(1)
+        return
+
+    run_job(video_files, stream=stream)
+
+
+if __name__ == "__main__":
+    main()
 
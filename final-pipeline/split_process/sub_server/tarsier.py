@@ -506,6 +506,45 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
 
         return final_embedding, final_attention_mask, final_labels, position_ids
     
+    def get_image_features(self, pixel_values, vision_feature_layer=None, vision_feature_select_strategy=None):
+        """프레임별 이미지 특징 계산 (vision tower + projector, split token 추가 전)
+
+        반환값 [num_images, num_image_patches, hidden_size]는 forward의 image_features로 그대로 넘길 수 있다.
+        """
+        vision_feature_layer = (
+            vision_feature_layer if vision_feature_layer is not None else self.config.vision_feature_layer
+        )
+        vision_feature_select_strategy = (
+            vision_feature_select_strategy
+            if vision_feature_select_strategy is not None
+            else self.config.vision_feature_select_strategy
+        )
+        pixel_values = pixel_values.to(dtype=self.vision_tower.dtype)
+        image_outputs = self.vision_tower(pixel_values, output_hidden_states=True)
+        # this is not memory efficient at all (output_hidden_states=True) will save all the hidden stated.
+        selected_image_feature = image_outputs.hidden_states[vision_feature_layer]
+
+        if vision_feature_select_strategy == "default":
+            selected_image_feature = selected_image_feature[:, 1:]
+        elif vision_feature_select_strategy == "full":
+            selected_image_feature = selected_image_feature
+        else:
+            raise ValueError(
+                f"Unexpected select feature strategy: {self.config.vision_feature_select_strategy}"
+            )
+
+        return self.multi_modal_projector(selected_image_feature)
+
+    @torch.no_grad()
+    def compute_prefix_cache(self, prefix_ids):
+        """텍스트 프리픽스(첫 <image> 앞의 고정 토큰)의 KV cache 계산
+
+        반환된 cache를 배치 크기로 확장해 past_key_values로 넘기면, 프리픽스 뒤 토큰만 prefill 된다.
+        (input_ids는 [프리픽스, 패딩, 나머지] 순서여야 한다: collate_inputs의 prefix_len 참고)
+        """
+        outputs = self.language_model(input_ids=prefix_ids, use_cache=True, return_dict=True)
+        return outputs.past_key_values
+
     def add_split_tokens(self, image_features):
         num_images, num_image_patches, embed_dim = image_features.shape
         num_height_patches, num_width_patches = int(math.sqrt(num_image_patches)), int(math.sqrt(num_image_patches))
@@ -539,6 +578,7 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
         position_ids: Optional[torch.LongTensor] = None,
         past_key_values: Optional[List[torch.FloatTensor]] = None,
         inputs_embeds: Optional[torch.FloatTensor] = None,
+        image_features: Optional[torch.FloatTensor] = None,
         vision_feature_layer: Optional[int] = None,
         vision_feature_select_strategy: Optional[str] = None,
         labels: Optional[torch.LongTensor] = None,
@@ -554,6 +594,9 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
                 Labels for computing the masked language modeling loss. Indices should either be in `[0, ...,
                 config.vocab_size]` or -100 (see `input_ids` docstring). Tokens with indices set to `-100` are ignored
                 (masked), the loss is only computed for the tokens with labels in `[0, ..., config.vocab_size]`.
+            image_features (`torch.FloatTensor` of shape `(num_images, num_image_patches, hidden_size)`, *optional*):
+                Precomputed output of `get_image_features`. When given, `pixel_values` is ignored and the vision
+                tower is skipped (e.g. for frames whose features were cached).
 
         Returns:
 
@@ -592,35 +635,40 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
             else self.config.vision_feature_select_strategy
         )
 
-        image_features = None
+        has_images = pixel_values is not None or image_features is not None
+        # 공유 프리픽스 KV cache가 주어진 prefill (past_key_values가 있고 input_ids가 여러 토큰)
+        prefix_length = 0
+        if past_key_values is not None and input_ids is not None and input_ids.shape[1] != 1:
+            if isinstance(past_key_values, Cache):
+                prefix_length = past_key_values.get_seq_length()
+            else:
+                prefix_length = past_key_values[0][0].shape[2]
         if inputs_embeds is None:
             # 1. Extra the input embeddings
             inputs_embeds = self.get_input_embeddings()(input_ids)
             
             # 2. Merge text and images
-            if pixel_values is not None and input_ids.shape[1] != 1:
-                pixel_values = pixel_values.to(dtype=self.vision_tower.dtype)
-                image_outputs = self.vision_tower(pixel_values, output_hidden_states=True)
-                # this is not memory efficient at all (output_hidden_states=True) will save all the hidden stated.
-                selected_image_feature = image_outputs.hidden_states[vision_feature_layer]
-
-                if vision_feature_select_strategy == "default":
-                    selected_image_feature = selected_image_feature[:, 1:]
-                elif vision_feature_select_strategy == "full":
-                    selected_image_feature = selected_image_feature
-                else:
-                    raise ValueError(
-                        f"Unexpected select feature strategy: {self.config.vision_feature_select_strategy}"
+            if has_images and input_ids.shape[1] != 1:
+                if image_features is None:
+                    image_features = self.get_image_features(
+                        pixel_values, vision_feature_layer, vision_feature_select_strategy
                     )
-
-                image_features = self.multi_modal_projector(selected_image_feature)
+                image_features = image_features.to(device=inputs_embeds.device, dtype=inputs_embeds.dtype)
 
                 special_image_token_mask = input_ids == self.config.image_token_index
                 num_special_image_tokens = torch.sum(special_image_token_mask, dim = -1)
 
                 image_features = self.add_split_tokens(image_features)
 
-                if sum(num_special_image_tokens) > 0:
+                if sum(num_special_image_tokens) > 0 and prefix_length > 0:
+                    # attention_mask는 [프리픽스 + 현재 입력] 길이이므로 현재 입력 부분만 병합하고 위치를 프리픽스만큼 민다
+                    prefix_mask, input_mask = attention_mask[:, :prefix_length], attention_mask[:, prefix_length:]
+                    inputs_embeds, input_mask, labels, position_ids = self._merge_input_ids_with_image_features(
+                        image_features, inputs_embeds, input_ids, input_mask, labels
+                    )
+                    position_ids = position_ids + prefix_mask.sum(dim=-1, keepdim=True)
+                    attention_mask = torch.cat([prefix_mask.to(input_mask.device), input_mask], dim=-1)
+                elif sum(num_special_image_tokens) > 0:
                     # print(f'num_special_image_tokens: {num_special_image_tokens}')
                     inputs_embeds, attention_mask, labels, position_ids = self._merge_input_ids_with_image_features(
                         image_features, inputs_embeds, input_ids, attention_mask, labels
@@ -628,12 +676,13 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
                 else:
                     inputs_embeds = image_features.sum(dim=(0,1))[None, None, :] * 0. + inputs_embeds
 
-                if labels is None:
+                # 프리픽스 cache 사용 시 logits는 현재 입력 길이뿐이라 attention_mask와 길이가 달라 loss를 계산하지 않는다
+                if labels is None and prefix_length == 0:
                     labels = torch.full_like(attention_mask, self.config.ignore_index).to(torch.long)
             else:
                 # In case input_ids.shape[1] == 1 & pixel_values==None & past_key_values != None, we are in the case of
                 # generation with cache
-                if past_key_values is not None and pixel_values is not None and input_ids.shape[1] == 1:
+                if past_key_values is not None and has_images and input_ids.shape[1] == 1:
                     # Retrieve the first layer to inspect the logits and mask out the hidden states
                     # that are set to 0
                     first_layer_past_key_value = past_key_values[0][0][:, :, :, 0]
@@ -701,7 +750,8 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
         )
 
     def prepare_inputs_for_generation(
-        self, input_ids, past_key_values=None, inputs_embeds=None, pixel_values=None, attention_mask=None, **kwargs
+        self, input_ids, past_key_values=None, inputs_embeds=None, pixel_values=None, attention_mask=None,
+        image_features=None, **kwargs
     ):
         if past_key_values is not None:
             if isinstance(past_key_values, Cache):
@@ -749,6 +799,7 @@ class TarsierForConditionalGeneration(TarsierPreTrainedModel):
                 "use_cache": kwargs.get("use_cache"),
                 "attention_mask": attention_mask,
                 "pixel_values": pixel_values,
+                "image_features": image_features,
             }
         )
         return model_inputs
@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import fcntl
+import json
+import argparse
+import subprocess
+from multiprocessing.connection import Client
+from config import Config
+
+
+def request(message):
+    """워커 데몬에 요청 하나를 보내고 응답을 받음"""
+    with Client(Config.daemon_address, authkey=Config.daemon_authkey) as conn:
+        conn.send(message)
+        return conn.recv()
+
+
+def is_daemon_process(pid):
+    """pid가 살아 있는 워커 데몬 프로세스인지 (pid가 재사용된 다른 프로세스면 False)"""
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    try:
+        with open(f"/proc/{pid}/cmdline", 'rb') as f:
+            return b"worker_daemon.py" in f.read()
+    except OSError:
+        return True  # /proc가 없으면 살아 있는지만 확인
+
+
+def daemon_running():
+    """pid 파일의 데몬 프로세스가 살아 있는지 (모델 로드 중이어도 True)"""
+    try:
+        with open(Config.daemon_pid_file, 'r') as f:
+            pid = int(f.read().strip())
+    except (OSError, ValueError):
+        return False
+    return is_daemon_process(pid)
+
+
+def start_daemon(log_path="worker_daemon.log"):
+    """데몬이 없으면 백그라운드로 시작 (모델 로드는 데몬 안에서 진행)
+
+    확인과 시작은 잠금 파일로 직렬화하고 pid 파일은 시작 직후 여기서 기록하므로,
+    동시에 호출되어도 데몬(과 모델 로드)은 하나만 뜬다.
+    """
+    os.makedirs(os.path.dirname(Config.daemon_pid_file), exist_ok=True)
+    with open(f"{Config.daemon_pid_file}.lock", 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if daemon_running():
+            return False
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "worker_daemon.py")
+        with open(log_path, 'a') as log:
+            process = subprocess.Popen([sys.executable, script], stdout=log, stderr=subprocess.STDOUT,
+                                       stdin=subprocess.DEVNULL, start_new_session=True,
+                                       cwd=os.path.dirname(script))
+        tmp_path = f"{Config.daemon_pid_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(process.pid))
+        os.replace(tmp_path, Config.daemon_pid_file)
+    return True
+
+
+def wait_until_ready(timeout, poll_interval=2.0):
+    """데몬이 모델 로드를 마치고 요청을 받을 때까지 대기"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if request({"cmd": "health"}).get("status") == "ok":
+                return True
+        except (OSError, EOFError):
+            if not daemon_running():
+                return False
+        time.sleep(poll_interval)
+    return False
+
+
+def submit(video_files=None, stream=False, wait=True, poll_interval=2.0):
+    """작업 제출. wait=True면 끝날 때까지 기다려 최종 상태 반환
+
+    기다리는 동안 데몬과의 연결을 유지하므로 이 프로세스가 죽으면 데몬이 작업을 취소한다.
+    SSH 세션이 끊겨 부모 프로세스가 사라진 경우에도 연결을 닫아 작업을 취소시킨다.
+    """
+    message = {"cmd": "submit", "video_files": video_files, "stream": stream}
+    if not wait:
+        return request(message)
+    with Client(Config.daemon_address, authkey=Config.daemon_authkey) as conn:
+        conn.send(dict(message, attach=True))
+        status = conn.recv()
+        parent = os.getppid()
+        while status["state"] in ("queued", "running"):
+            if conn.poll(poll_interval):
+                status = conn.recv()
+            elif os.getppid() != parent:
+                print(f"🔌 SSH 세션이 끊겨 작업 {status['job_id']}을 취소합니다.")
+                break
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split-process worker daemon client')
+    parser.add_argument('command', choices=['start', 'health', 'submit', 'status', 'cancel', 'shutdown'])
+    parser.add_argument('args', nargs='*', help='submit: 처리할 파일 (없으면 폴더 전체), status/cancel: job_id')
+    parser.add_argument('--stream', action='store_true', help='도착하는 파일을 END_OF_STREAM까지 처리')
+    parser.add_argument('--no-wait', action='store_true')
+    args = parser.parse_args()
+
+    if args.command == 'start':
+        print("🚀 워커 데몬 시작" if start_daemon() else "워커 데몬이 이미 실행 중입니다.")
+        return
+
+    try:
+        if args.command == 'submit':
+            response = submit(args.args or None, stream=args.stream, wait=not args.no_wait)
+        elif args.command in ('status', 'cancel'):
+            response = request({"cmd": args.command, "job_id": int(args.args[0])})
+        else:
+            response = request({"cmd": args.command})
+    except (OSError, EOFError) as e:
+        print(f"🚨 워커 데몬 연결 실패: {str(e)}")
+        sys.exit(2)
+
+    print(json.dumps(response, ensure_ascii=False, indent=2))
+    if response.get("state") == "failed":
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
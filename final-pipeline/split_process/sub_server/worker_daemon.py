@@ -0,0 +1,206 @@
+import os
+import time
+import queue
+import threading
+import itertools
+from multiprocessing.connection import Listener
+from config import Config
+
+
+class WorkerDaemon:
+    """모델을 메모리에 올려 둔 채 작업을 받아 처리하는 상주 워커
+
+    sub_server_run.py를 실행할 때마다 Tarsier와 임베딩 모델을 다시 로드하지 않도록,
+    한 번 로드한 모델로 로컬 RPC(multiprocessing.connection)로 제출된 작업을 순서대로 처리한다.
+    요청: health(상태, 모델 버전, 대기 작업 수), submit(작업 제출), status(작업 상태), cancel(작업 취소), shutdown
+    submit에 attach=True를 주면 연결을 유지한 채 끝난 상태를 돌려주고, 그 전에 연결이 끊기면
+    (클라이언트나 SSH 세션이 죽음) 작업을 취소한다. 스트림 작업은 수신 폴더가 하나뿐이므로
+    새 스트림 작업이 들어오면 대기 중이거나 실행 중인 이전 스트림 작업을 취소한다.
+    """
+
+    def __init__(self, address=None, authkey=None):
+        self.address = address or Config.daemon_address
+        self.authkey = authkey or Config.daemon_authkey
+        self.jobs = {}
+        self.cancel_events = {}  # job_id -> threading.Event (실행 중인 스트림 수신 중단용)
+        self.job_queue = queue.Queue()
+        self.job_ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.running = True
+        self.current_job = None
+        self.models = None
+        self.versions = {}
+        self.started_at = time.time()
+
+    def load(self):
+        from sub_server_process import load_models, model_versions
+        load_start = time.time()
+        self.models = load_models()
+        self.versions = model_versions()
+        print(f"✅ 모델 로드 완료 ({time.time() - load_start:.1f}초), 작업 대기 중: {self.address}")
+
+    def health(self):
+        with self.lock:
+            queued = [job for job in self.jobs.values() if job["state"] == "queued"]
+            return {
+                "status": "ok",
+                "pid": os.getpid(),
+                "uptime": time.time() - self.started_at,
+                "models": self.versions,
+                "queue_depth": len(queued),
+                "queued_segments": sum(job["num_files"] or 0 for job in queued),
+                "current_job": self.current_job,
+                "jobs_done": sum(job["state"] == "done" for job in self.jobs.values()),
+                "jobs_failed": sum(job["state"] == "failed" for job in self.jobs.values()),
+                "jobs_cancelled": sum(job["state"] == "cancelled" for job in self.jobs.values()),
+            }
+
+    def submit(self, video_files=None, stream=False):
+        if stream:
+            # 이전 실행의 스트림 작업은 다시 올 수 없는 END_OF_STREAM을 기다리므로 새 작업으로 교체
+            with self.lock:
+                previous = [job_id for job_id, job in self.jobs.items()
+                            if job["stream"] and job["state"] in ("queued", "running")]
+            for job_id in previous:
+                print(f"🔁 새 스트림 작업이 들어와 이전 스트림 작업 {job_id}을 취소합니다.")
+                self.cancel(job_id)
+        with self.lock:
+            job_id = next(self.job_ids)
+            self.cancel_events[job_id] = threading.Event()
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "state": "queued",
+                "stream": stream,
+                "num_files": len(video_files) if video_files else None,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+            }
+            status = dict(self.jobs[job_id])
+        self.job_queue.put((job_id, video_files, stream))
+        return status
+
+    def status(self, job_id):
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else {"job_id": job_id, "state": "unknown"}
+
+    def cancel(self, job_id):
+        """대기 중인 작업은 바로 취소, 실행 중인 작업은 수신을 멈추고 이미 받은 세그먼트까지만 처리"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return {"job_id": job_id, "state": "unknown"}
+            if job["state"] == "queued":
+                job.update(state="cancelled", finished_at=time.time())
+                self.cancel_events.pop(job_id, None)
+            elif job["state"] == "running":
+                self.cancel_events[job_id].set()
+            return dict(job)
+
+    def _run_jobs(self):
+        from sub_server_run import run_job
+        while self.running:
+            try:
+                job_id, video_files, stream = self.job_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            with self.lock:
+                if self.jobs[job_id]["state"] == "cancelled":
+                    continue
+                cancel_event = self.cancel_events[job_id]
+                self.current_job = job_id
+                self.jobs[job_id].update(state="running", started_at=time.time())
+            try:
+                run_job(video_files, stream=stream, models=self.models, cancel_event=cancel_event)
+                state, error = ("cancelled" if cancel_event.is_set() else "done"), None
+            except Exception as e:
+                print(f"🚨 작업 {job_id} 실패: {str(e)}")
+                state, error = "failed", str(e)
+            with self.lock:
+                self.current_job = None
+                self.cancel_events.pop(job_id, None)
+                self.jobs[job_id].update(state=state, error=error, finished_at=time.time())
+
+    def _follow(self, conn, job_id, poll_interval=1.0):
+        """attach된 submit: 작업이 끝나면 최종 상태를 보내고, 그 전에 연결이 끊기면 작업 취소"""
+        try:
+            while True:
+                status = self.status(job_id)
+                if status["state"] not in ("queued", "running"):
+                    conn.send(status)
+                    return
+                if conn.poll(poll_interval):
+                    conn.recv()  # 클라이언트는 attach 중에 요청을 보내지 않으므로 연결 종료(EOFError)만 확인
+        except (EOFError, OSError):
+            print(f"🔌 작업 {job_id}의 클라이언트 연결이 끊겨 작업을 취소합니다.")
+            self.cancel(job_id)
+        finally:
+            conn.close()
+
+    def _handle(self, conn):
+        follow_job = None
+        try:
+            message = conn.recv()
+            command = message.get("cmd")
+            if command == "health":
+                response = self.health()
+            elif command == "submit":
+                response = self.submit(message.get("video_files"), message.get("stream", False))
+                if message.get("attach"):
+                    follow_job = response["job_id"]
+            elif command == "status":
+                response = self.status(message.get("job_id"))
+            elif command == "cancel":
+                response = self.cancel(message.get("job_id"))
+            elif command == "shutdown":
+                self.running = False
+                response = {"status": "shutting_down"}
+            else:
+                response = {"error": f"unknown command: {command}"}
+            conn.send(response)
+        except (EOFError, OSError):
+            pass
+        finally:
+            if follow_job is None:
+                conn.close()
+        if follow_job is not None:
+            # 연결을 유지하는 attach 요청만 별도 스레드에서 지켜봄 (나머지 요청은 짧으므로 순서대로 바로 응답)
+            threading.Thread(target=self._follow, args=(conn, follow_job), daemon=True).start()
+
+    def serve(self):
+        self.load()
+        runner = threading.Thread(target=self._run_jobs, daemon=True)
+        runner.start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            while self.running:
+                try:
+                    conn = listener.accept()
+                except (OSError, EOFError):
+                    continue
+                self._handle(conn)
+        # 진행 중인 작업은 끝까지 처리
+        runner.join()
+
+
+def main():
+    # 디코딩 워커가 spawn으로 이 스크립트를 다시 import하므로 실행 코드는 main 가드 안에 둔다
+    # worker_client.start_daemon이 이미 같은 pid를 기록하지만, 직접 실행한 경우를 위해 다시 기록
+    os.makedirs(os.path.dirname(Config.daemon_pid_file), exist_ok=True)
+    with open(Config.daemon_pid_file, 'w') as f:
+        f.write(str(os.getpid()))
+    try:
+        WorkerDaemon().serve()
+    finally:
+        # 그 사이 다른 데몬이 pid 파일을 덮어썼으면 지우지 않는다
+        try:
+            with open(Config.daemon_pid_file, 'r') as f:
+                if f.read().strip() == str(os.getpid()):
+                    os.remove(Config.daemon_pid_file)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import os
+import json
+import sqlite3
+import threading
+
+
+class AnnotationIndex:
+    """비디오 annotation(JSON 리스트)을 video_name / video_id로 찾는 조회 서비스
+
+    annotation 파일은 한 번만 읽어 딕셔너리로 들고, 같은 내용을 디스크 인덱스(sqlite, 키 -> 항목 JSON)로도 저장한다.
+    다음 실행부터는 annotation 파일의 (크기, 수정 시각)이 그대로면 JSON을 다시 파싱하지 않고 인덱스에서 필요한 항목만 읽는다.
+    키는 video_name, 확장자를 뺀 video_name, video_id이며 get(video_name, default)로 조회한다
+    (TarsierVideoCaptioningPipeline의 video_metadata로 그대로 넘길 수 있다).
+    """
+
+    def __init__(self, annotation_path, index_path=None):
+        self.annotation_path = annotation_path
+        self.index_path = index_path or os.path.splitext(annotation_path)[0] + ".index.db"
+        self.lock = threading.Lock()
+        self.entries = {}  # 키 -> 항목 (파싱했거나 인덱스에서 읽은 항목)
+        self.conn = None
+
+        source_stat = self._source_stat()
+        if not self._open_index(source_stat):
+            self._build(source_stat)
+
+    def _source_stat(self):
+        try:
+            stat = os.stat(self.annotation_path)
+            return [stat.st_size, stat.st_mtime]
+        except OSError:
+            return None
+
+    def _open_index(self, source_stat):
+        """annotation 파일과 같은 버전의 인덱스가 있으면 연결 (annotation 파일이 없으면 있는 인덱스를 그대로 사용)"""
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            conn = sqlite3.connect(self.index_path, check_same_thread=False)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source_stat'").fetchone()
+        except sqlite3.Error:
+            return False
+        if source_stat is not None and (row is None or json.loads(row[0]) != source_stat):
+            conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    @staticmethod
+    def keys_for(item):
+        keys = []
+        if item.get('video_name'):
+            keys.append(item['video_name'])
+            keys.append(os.path.splitext(item['video_name'])[0])
+        if item.get('video_id'):
+            keys.append(item['video_id'])
+        return keys
+
+    def _build(self, source_stat):
+        """annotation 파일을 한 번 파싱해 딕셔너리를 만들고 디스크 인덱스 저장 (저장 실패 시 딕셔너리만 사용)"""
+        if source_stat is None:
+            print(f"⚠️ annotation 파일 없음: {self.annotation_path}")
+            return
+        try:
+            with open(self.annotation_path, 'r', encoding='utf-8') as f:
+                items = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ annotation 파일 읽기 실패: {self.annotation_path} - {str(e)}")
+            return
+        for item in items:
+            for key in self.keys_for(item):
+                self.entries.setdefault(key, item)  # 같은 키가 여러 번 나오면 처음 항목 (기존 next() 검색과 동일)
+
+        tmp_path = f"{self.index_path}.tmp"
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            conn = sqlite3.connect(tmp_path)
+            conn.execute("CREATE TABLE annotations (key TEXT PRIMARY KEY, data TEXT)")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+            conn.executemany("INSERT INTO annotations VALUES (?, ?)",
+                             ((key, json.dumps(item, ensure_ascii=False)) for key, item in self.entries.items()))
+            conn.execute("INSERT INTO meta VALUES ('source_stat', ?)", (json.dumps(source_stat),))
+            conn.commit()
+            conn.close()
+            os.replace(tmp_path, self.index_path)
+            print(f"🗂️ annotation 인덱스 생성: {len(items)}개 항목 -> {self.index_path}")
+        except (sqlite3.Error, OSError) as e:
+            print(f"⚠️ annotation 인덱스 저장 실패 (메모리에서만 조회): {str(e)}")
+
+    def get(self, video_name, default=None):
+        """video_name(경로, 확장자 유무 무관) 또는 video_id에 해당하는 항목"""
+        name = os.path.basename(video_name)
+        for key in (name, os.path.splitext(name)[0]):
+            with self.lock:
+                if key in self.entries:
+                    return self.entries[key]
+                if self.conn is None:
+                    continue
+                row = self.conn.execute("SELECT data FROM annotations WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.entries[key] = json.loads(row[0])
+                    return self.entries[key]
+        return default
+
+    def __contains__(self, video_name):
+        return self.get(video_name) is not None
+
+    def title(self, video_name, default=None):
+        item = self.get(video_name)
+        return item.get('title', default) if item else default
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_annotation_index(annotation_path, index_path=None):
+    """프로세스 전체에서 annotation 파일마다 하나씩 공유하는 조회 서비스"""
+    key = os.path.abspath(annotation_path)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = AnnotationIndex(annotation_path, index_path=index_path)
+        return _indexes[key]
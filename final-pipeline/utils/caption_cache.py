@@ -0,0 +1,156 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+
+def file_content_hash(path, chunk_size=8 * 1024 * 1024):
+    """파일 전체 내용의 해시 (경로/이름이 바뀌어도 같은 영상이면 같은 값)"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CaptionCache:
+    """(원본 파일 내용 해시, 구간, 생성 설정) 단위로 생성된 캡션을 저장하는 영구 캐시
+
+    생성 설정(config)에는 모델 경로, 프롬프트, 프레임 수, 샘플링 파라미터 등
+    캡션 결과에 영향을 주는 값을 모두 넣는다. 설정이 하나라도 바뀌면 다른 키가 된다.
+    파일 해시는 (경로, 크기, 수정 시각)이 같으면 다시 계산하지 않는다.
+    """
+
+    def __init__(self, db_path="cache/caption_cache.db"):
+        self.db_path = db_path
+        if os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL, content_hash TEXT
+            )""")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS captions (
+                key TEXT PRIMARY KEY, content_hash TEXT, start_time REAL, end_time REAL,
+                config_hash TEXT, config TEXT, caption TEXT, created_at REAL
+            )""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_captions_content ON captions(content_hash)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_captions_config ON captions(config_hash)")
+        self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def content_hash(self, path):
+        """파일 내용 해시 (크기/수정 시각이 그대로면 저장된 값 재사용)"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT size, mtime, content_hash FROM file_hashes WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+            return row[2]
+
+        content_hash = file_content_hash(path)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime, content_hash)
+            )
+            self.conn.commit()
+        return content_hash
+
+    @staticmethod
+    def config_hash(config):
+        return hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def make_key(self, video_path, start_time, end_time, config):
+        content_hash = self.content_hash(video_path)
+        key = f"{content_hash}:{float(start_time):.3f}:{float(end_time):.3f}:{self.config_hash(config)}"
+        return key, content_hash
+
+    def get(self, video_path, start_time, end_time, config):
+        """캐시된 캡션 반환 (없으면 None)"""
+        key, _ = self.make_key(video_path, start_time, end_time, config)
+        with self.lock:
+            row = self.conn.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def put(self, video_path, start_time, end_time, config, caption):
+        """생성된 캡션 저장"""
+        if not caption:
+            return
+        key, content_hash = self.make_key(video_path, start_time, end_time, config)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, content_hash, float(start_time), float(end_time), self.config_hash(config),
+                 json.dumps(config, sort_keys=True), caption, time.time())
+            )
+            self.conn.commit()
+
+    def invalidate(self, video_path=None, config=None):
+        """캐시 무효화
+
+        video_path만 주면 그 영상의 모든 캡션, config만 주면 그 설정으로 만든 모든 캡션,
+        둘 다 주면 교집합, 둘 다 없으면 전체를 삭제한다. 삭제된 항목 수를 반환한다.
+        """
+        conditions, params = [], []
+        if video_path is not None:
+            conditions.append("content_hash = ?")
+            params.append(self.content_hash(video_path))
+        if config is not None:
+            conditions.append("config_hash = ?")
+            params.append(self.config_hash(config))
+        query = "DELETE FROM captions"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self.lock:
+            deleted = self.conn.execute(query, params).rowcount
+            self.conn.commit()
+        return deleted
+
+    def summary(self):
+        total = self.hits + self.misses
+        hit_rate = self.hits / total * 100 if total else 0.0
+        return f"• 캡션 캐시: 적중 {self.hits}/{total}개 ({hit_rate:.1f}%)"
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Caption cache maintenance')
+    parser.add_argument('--db', default="cache/caption_cache.db", help='캐시 DB 경로')
+    parser.add_argument('--invalidate', nargs='*', metavar='VIDEO',
+                        help='지정한 비디오들의 캡션 삭제 (비디오를 주지 않으면 전체 삭제)')
+    args = parser.parse_args()
+
+    cache = CaptionCache(args.db)
+    if args.invalidate is not None:
+        if args.invalidate:
+            deleted = sum(cache.invalidate(video_path=video) for video in args.invalidate)
+        else:
+            deleted = cache.invalidate()
+        print(f"🗑️ 캐시 항목 {deleted}개 삭제")
+    count = cache.conn.execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+    print(f"📦 캐시된 캡션: {count}개 ({args.db})")
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
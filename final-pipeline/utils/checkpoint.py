@@ -0,0 +1,104 @@
+import os
+import json
+import time
+import threading
+
+
+def segment_key(video_path, start_time, end_time):
+    """세그먼트 고유 키 (비디오 파일명 + 구간)"""
+    return f"{os.path.basename(video_path)}:{float(start_time):.2f}:{float(end_time):.2f}"
+
+
+class JsonlCheckpoint:
+    """완료된 세그먼트를 한 줄씩 JSONL로 기록하는 체크포인트
+
+    파일은 한 번만 열어 두고 레코드마다 flush하며(프로세스가 죽어도 보존),
+    fsync_every 레코드 또는 fsync_interval 초마다 fsync한다(서버가 죽어도 보존).
+    다시 열면 기록된 키를 읽어 completed_keys로 제공하므로 완료된 세그먼트를 건너뛸 수 있다.
+    append는 여러 스레드에서 호출해도 된다.
+    """
+
+    def __init__(self, path, fsync_every=20, fsync_interval=10.0):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.records = self._load()
+        self.completed_keys = set(self.records)
+
+        self.file = open(path, 'a', encoding='utf-8')
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.last_fsync = time.time()
+
+    def _load(self):
+        """기존 기록을 읽고, 중간에 끊긴 마지막 줄은 잘라낸다"""
+        records = {}
+        if not os.path.exists(self.path):
+            return records
+
+        valid_size = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                records[record['key']] = record['data']
+                valid_size += len(line)
+
+        if valid_size < os.path.getsize(self.path):
+            print(f"⚠️ 체크포인트 마지막 레코드가 손상되어 잘라냄: {self.path}")
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_size)
+        return records
+
+    def is_done(self, key):
+        return key in self.completed_keys
+
+    def append(self, key, data):
+        """완료된 세그먼트 결과 기록"""
+        line = json.dumps({"key": key, "data": data}, ensure_ascii=False) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.records[key] = data
+            self.completed_keys.add(key)
+
+            self.pending += 1
+            if self.pending >= self.fsync_every or time.time() - self.last_fsync >= self.fsync_interval:
+                self.sync()
+
+    def sync(self):
+        os.fsync(self.file.fileno())
+        self.pending = 0
+        self.last_fsync = time.time()
+
+    def results(self):
+        """기록된 모든 결과 (키 기준 중복 제거, 나중 기록 우선)"""
+        return list(self.records.values())
+
+    def close(self):
+        if not self.file.closed:
+            self.file.flush()
+            self.sync()
+            self.file.close()
+
+
+def compact_checkpoint(jsonl_path, output_path):
+    """JSONL 체크포인트를 DB용 JSON 배열 파일로 변환 (임시 파일에 쓴 뒤 교체)"""
+    checkpoint = JsonlCheckpoint(jsonl_path)
+    results = checkpoint.results()
+    checkpoint.close()
+
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, output_path)
+    return results
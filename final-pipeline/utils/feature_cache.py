@@ -0,0 +1,175 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+import torch
+
+from .caption_cache import file_content_hash
+
+
+class FrameFeatureCache:
+    """프레임 단위 vision tower 특징 캐시 (RAM LRU + 디스크 spill)
+
+    키는 (원본 비디오 내용 해시, 프레임 인덱스, 전처리/모델 설정)이다.
+    같은 프레임이 다른 instruction, 재실행, 겹치는 구간에서 다시 쓰이면 vision tower를 건너뛴다.
+    RAM 사용량이 max_memory_gb를 넘으면 가장 오래 쓰지 않은 특징부터 disk_dir에 저장하고 RAM에서 내린다.
+    디스크 사용량이 max_disk_gb를 넘으면 가장 오래 쓰지 않은 파일부터 지운다 (이전 실행의 파일 포함).
+    spill은 put을 호출한 스레드(캡션 생성 경로)에서 동기로 저장하므로, 프레임이 다시 쓰이는 실행에서만 켠다.
+    """
+
+    def __init__(self, config, max_memory_gb=2.0, disk_dir="cache/frame_features", hash_fn=None, max_disk_gb=20.0):
+        self.config_hash = hashlib.sha1(json.dumps(config, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        self.max_memory = max_memory_gb * 1024 ** 3
+        self.max_disk = max_disk_gb * 1024 ** 3
+        self.disk_dir = disk_dir
+        # 비디오 해시 함수 (CaptionCache.content_hash를 넘기면 해시 계산 결과를 공유)
+        self.hash_fn = hash_fn or self._content_hash
+
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.video_hashes = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.disk_files = OrderedDict()  # 디스크 파일 경로 -> 크기 (오래 쓰지 않은 순)
+        self.disk_bytes = 0
+        self.disk_evictions = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def _load_disk_index(self):
+        """이전 실행이 남긴 파일을 수정 시각 순으로 읽어 디스크 LRU를 만든다 (중단된 .tmp 파일은 삭제)"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            try:
+                if name.endswith(".tmp"):
+                    os.remove(path)
+                elif name.endswith(".pt"):
+                    stat = os.stat(path)
+                    files.append((stat.st_mtime, path, stat.st_size))
+            except OSError:
+                continue
+        for _, path, size in sorted(files):
+            self.disk_files[path] = size
+            self.disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """디스크 사용량이 max_disk 이하가 될 때까지 가장 오래 쓰지 않은 파일 삭제"""
+        with self.lock:
+            evicted = []
+            while self.disk_bytes > self.max_disk and self.disk_files:
+                path, size = self.disk_files.popitem(last=False)
+                self.disk_bytes -= size
+                self.disk_evictions += 1
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _touch_disk(self, path):
+        """디스크 적중 시 LRU 순서와 수정 시각 갱신 (다음 실행에서도 최근 사용으로 본다)"""
+        with self.lock:
+            if path in self.disk_files:
+                self.disk_files.move_to_end(path)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _content_hash(self, video_path):
+        stat = os.stat(video_path)
+        memo_key = (os.path.abspath(video_path), stat.st_size, stat.st_mtime)
+        if memo_key not in self.video_hashes:
+            self.video_hashes[memo_key] = file_content_hash(video_path)
+        return self.video_hashes[memo_key]
+
+    def frame_keys(self, video_path, frame_indices):
+        """비디오의 프레임 인덱스들에 대한 캐시 키"""
+        video_hash = self.hash_fn(video_path)
+        return [f"{video_hash}:{int(idx)}:{self.config_hash}" for idx in frame_indices]
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".pt")
+
+    def get(self, key):
+        """캐시된 특징 (CPU 텐서) 반환, 없으면 None"""
+        with self.lock:
+            feature = self.memory.get(key)
+            if feature is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return feature
+
+        if self.disk_dir and os.path.exists(self._disk_path(key)):
+            try:
+                feature = torch.load(self._disk_path(key), map_location='cpu')
+            except Exception as e:
+                print(f"⚠️ 특징 캐시 파일 손상, 무시: {str(e)}")
+            else:
+                with self.lock:
+                    self.disk_hits += 1
+                self._touch_disk(self._disk_path(key))
+                self._put_memory(key, feature)
+                return feature
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, feature):
+        """계산한 특징 저장 (RAM에 두고, 넘치면 오래된 항목을 디스크로 내린다)"""
+        self._put_memory(key, feature.detach().to('cpu'))
+
+    def _put_memory(self, key, feature):
+        evicted = []
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                return
+            self.memory[key] = feature
+            self.memory_bytes += feature.numel() * feature.element_size()
+            while self.memory_bytes > self.max_memory and len(self.memory) > 1:
+                old_key, old_feature = self.memory.popitem(last=False)
+                self.memory_bytes -= old_feature.numel() * old_feature.element_size()
+                evicted.append((old_key, old_feature))
+
+        for old_key, old_feature in evicted:
+            self._spill(old_key, old_feature)
+
+    def _spill(self, key, feature):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        if os.path.exists(path):
+            return
+        tmp_path = path + ".tmp"
+        torch.save(feature.clone(), tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            size = os.path.getsize(path)
+            self.disk_bytes += size - self.disk_files.pop(path, 0)
+            self.disk_files[path] = size
+        self._evict_disk()
+
+    def flush(self):
+        """RAM에 있는 특징을 디스크에 기록 (다음 실행에서 재사용, max_disk를 넘으면 오래된 파일부터 삭제)"""
+        with self.lock:
+            items = list(self.memory.items())
+        for key, feature in items:
+            self._spill(key, feature)
+
+    def summary(self):
+        total = self.hits + self.disk_hits + self.misses
+        hit_rate = (self.hits + self.disk_hits) / total * 100 if total else 0.0
+        return (f"• 프레임 특징 캐시: 적중 {self.hits + self.disk_hits}/{total}개 ({hit_rate:.1f}%, "
+                f"디스크 {self.disk_hits}개), RAM {self.memory_bytes / 1024 ** 3:.2f}GB, "
+                f"디스크 {self.disk_bytes / 1024 ** 3:.2f}GB (삭제 {self.disk_evictions}개)")
@@ -0,0 +1,123 @@
+import time
+import argparse
+import torch
+
+from .tarsier import TarsierForConditionalGeneration, LlavaConfig
+from .tarsier_utils import AdaptiveBatchGenerator
+
+IMAGE_TOKEN_INDEX = 32000
+# 실제 Tarsier 프롬프트("USER: <video>\nDescribe the video in detail. ASSISTANT:")의 <image> 앞/뒤 토큰 수
+REAL_PREFIX_TOKENS = 3
+REAL_SUFFIX_TOKENS = 16
+
+
+class _IdTokenizer:
+    """토큰 id를 그대로 문자열로 돌려주는 토크나이저 (출력 비교용)"""
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [" ".join(str(token) for token in sequence.tolist()) for sequence in sequences]
+
+
+class _BenchmarkProcessor:
+    pad_id = 0
+    eos_id = 2
+    tokenizer = _IdTokenizer()
+
+
+def build_small_model(args):
+    """CPU에서 측정 가능한 작은 LLaMA + CLIP 구성의 Tarsier (가중치는 랜덤)"""
+    config = LlavaConfig(
+        vision_config={
+            "model_type": "clip_vision_model", "hidden_size": 64, "intermediate_size": 128,
+            "num_hidden_layers": 2, "num_attention_heads": 4, "image_size": args.image_size, "patch_size": 14,
+        },
+        text_config={
+            "model_type": "llama", "hidden_size": args.hidden_size, "intermediate_size": args.hidden_size * 2,
+            "num_hidden_layers": args.num_layers, "num_attention_heads": 4, "num_key_value_heads": 4,
+            "vocab_size": 32100, "max_position_embeddings": 4096,
+        },
+        image_token_index=IMAGE_TOKEN_INDEX,
+        vocab_size=32100,
+        pad_token_id=0,
+    )
+    torch.manual_seed(0)
+    model = TarsierForConditionalGeneration(config)
+    model.eval()
+    return model
+
+
+def build_inputs(args, batch_size):
+    """[BOS, 고정 프리픽스, <image> * n_frames, 샘플별 꼬리 텍스트] 형태의 입력"""
+    generator = torch.Generator().manual_seed(1)
+    prefix = torch.randint(3, 31000, (args.prefix_tokens,), generator=generator).tolist()
+    inputs_list = []
+    for _ in range(batch_size):
+        suffix = torch.randint(3, 31000, (args.suffix_tokens,), generator=generator).tolist()
+        ids = [1] + prefix + [IMAGE_TOKEN_INDEX] * args.n_frames + suffix
+        inputs_list.append({
+            "input_ids": torch.tensor(ids, dtype=torch.long).unsqueeze(0),
+            "pixel_values": torch.randn(args.n_frames, 3, args.image_size, args.image_size, generator=generator),
+        })
+    return inputs_list
+
+
+def time_first_token(batch_generator, inputs_list, repeat):
+    batch_generator.generate_kwargs['max_new_tokens'] = 1
+    batch_generator.generate(inputs_list)  # warm-up (프리픽스 KV 계산 포함)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        batch_generator.generate(inputs_list)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Shared-prefix KV cache time-to-first-token benchmark (CPU)')
+    parser.add_argument('--prefix-tokens', type=int, default=256, help='모든 요청이 공유하는 첫 <image> 앞 토큰 수')
+    parser.add_argument('--suffix-tokens', type=int, default=16)
+    parser.add_argument('--n-frames', type=int, default=4)
+    parser.add_argument('--image-size', type=int, default=56)
+    parser.add_argument('--hidden-size', type=int, default=256)
+    parser.add_argument('--num-layers', type=int, default=4)
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--new-tokens', type=int, default=8, help='출력 일치 확인용 greedy 생성 길이')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--real-layout', action='store_true',
+                        help='실제 Tarsier 프롬프트 배치(프리픽스 3토큰)로 출력 일치와 속도 확인')
+    args = parser.parse_args()
+    if args.real_layout:
+        args.prefix_tokens, args.suffix_tokens = REAL_PREFIX_TOKENS, REAL_SUFFIX_TOKENS
+
+    model = build_small_model(args)
+    processor = _BenchmarkProcessor()
+    inputs_list = build_inputs(args, args.batch_size)
+    print(f"🧪 프리픽스 {args.prefix_tokens} 토큰, 프레임 {args.n_frames}개, 배치 {args.batch_size}, "
+          f"LLaMA {args.num_layers}층/{args.hidden_size}차원, torch threads={torch.get_num_threads()}")
+
+    baseline = AdaptiveBatchGenerator(model, processor, max_batch_size=args.batch_size,
+                                      use_prefix_cache=False, do_sample=False, use_cache=True)
+    cached = AdaptiveBatchGenerator(model, processor, max_batch_size=args.batch_size,
+                                    use_prefix_cache=True, do_sample=False, use_cache=True)
+    print(f"• 공유 프리픽스 길이: {cached.shared_prefix_length(inputs_list)} 토큰")
+
+    # greedy 출력이 같은지 확인
+    baseline.generate_kwargs['max_new_tokens'] = cached.generate_kwargs['max_new_tokens'] = args.new_tokens
+    baseline_outputs = baseline.generate(inputs_list)
+    cached_outputs = cached.generate(inputs_list)
+    matched = sum(a == b for a, b in zip(baseline_outputs, cached_outputs))
+
+    base_best, base_mean = time_first_token(baseline, inputs_list, args.repeat)
+    cache_best, cache_mean = time_first_token(cached, inputs_list, args.repeat)
+
+    print("\n📊 첫 토큰 시간 (prefill + 1토큰):")
+    print(f"• 프리픽스 캐시 없음: 최소 {base_best * 1000:.1f}ms, 평균 {base_mean * 1000:.1f}ms")
+    print(f"• 프리픽스 캐시 사용: 최소 {cache_best * 1000:.1f}ms, 평균 {cache_mean * 1000:.1f}ms")
+    print(f"• 속도 향상: {base_mean / cache_mean:.2f}배")
+    print(f"• greedy 출력 일치: {matched}/{len(inputs_list)}")
+    if matched != len(inputs_list):
+        raise SystemExit("🚨 프리픽스 캐시 사용 시 출력이 달라짐")
+
+
+if __name__ == "__main__":
+    main()
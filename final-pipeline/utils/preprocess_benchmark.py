@@ -0,0 +1,97 @@
+import time
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from transformers import CLIPImageProcessor
+
+from .tarsier_utils import CustomImageProcessor, sample_video
+
+
+class _ImageOnlyProcessor:
+    """모델 파일 없이 벤치마크할 때 쓰는 LlavaProcessor 대용 (이미지 경로만 제공)"""
+
+    def __init__(self, image_processor):
+        self.image_processor = image_processor
+
+    def __call__(self, text="", images=None, return_tensors="pt"):
+        return self.image_processor(images, return_tensors=return_tensors)
+
+
+def load_image_processor(model_path=None):
+    if model_path:
+        from transformers.models.llava import LlavaProcessor
+        return CustomImageProcessor(LlavaProcessor.from_pretrained(model_path, trust_remote_code=True))
+    # Tarsier(CLIP ViT-L/14-336)와 같은 설정
+    return CustomImageProcessor(_ImageOnlyProcessor(CLIPImageProcessor(size={"shortest_edge": 336}, crop_size=336)))
+
+
+def load_frames(video_path, n_frames, height, width, seed=0):
+    if video_path:
+        return sample_video(video_path, n_frames=n_frames, as_array=True)
+    # 완전한 노이즈는 리사이즈 오차를 과장하므로 부드러운 그라디언트 + 약한 노이즈로 만든다
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x / width, y / height, (x + y) / (width + height)], axis=-1) * 200
+    frames = [base + rng.normal(0, 12, size=base.shape) + i * 5 for i in range(n_frames)]
+    return np.clip(frames, 0, 255).astype(np.uint8)
+
+
+def run_pil_path(image_processor, frames, do_padding):
+    images = [Image.fromarray(f).convert('RGB') for f in frames]
+    return image_processor(images, do_padding=do_padding)
+
+
+def run_vectorized_path(image_processor, frames, do_padding):
+    return image_processor(frames, do_padding=do_padding)
+
+
+def benchmark(fn, repeat):
+    fn()  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='PIL vs vectorized frame preprocessing microbenchmark')
+    parser.add_argument('--model-path', default=None, help='Tarsier 모델 경로 (없으면 CLIP 기본 설정 사용)')
+    parser.add_argument('--video', default=None, help='프레임을 샘플링할 비디오 (없으면 합성 프레임)')
+    parser.add_argument('--n-frames', type=int, default=8)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--padding', action='store_true', help='do_image_padding 경로 측정')
+    parser.add_argument('--atol', type=float, default=0.1, help='정규화된 값 기준 허용 최대 오차')
+    args = parser.parse_args()
+
+    image_processor = load_image_processor(args.model_path)
+    frames = load_frames(args.video, args.n_frames, args.height, args.width)
+    print(f"🎞️ 프레임: {frames.shape}, padding={args.padding}, torch threads={torch.get_num_threads()}")
+
+    reference = run_pil_path(image_processor, frames, args.padding)
+    vectorized = run_vectorized_path(image_processor, frames, args.padding)
+    diff = (reference - vectorized).abs()
+    # 정규화 값 차이를 0~255 화소 단위로 환산 (채널 std 최댓값 기준 상한)
+    pixel_diff = diff.max().item() * max(image_processor.processor.image_processor.image_std) * 255
+
+    pil_best, pil_mean = benchmark(lambda: run_pil_path(image_processor, frames, args.padding), args.repeat)
+    vec_best, vec_mean = benchmark(lambda: run_vectorized_path(image_processor, frames, args.padding), args.repeat)
+
+    print("\n📊 전처리 벤치마크:")
+    print(f"• 출력 shape: {tuple(vectorized.shape)} (PIL 경로: {tuple(reference.shape)})")
+    print(f"• 최대 오차: {diff.max().item():.4f}, 평균 오차: {diff.mean().item():.5f} (약 {pixel_diff:.1f}/255 화소)")
+    print(f"• PIL 경로: 최소 {pil_best * 1000:.1f}ms, 평균 {pil_mean * 1000:.1f}ms")
+    print(f"• 벡터화 경로: 최소 {vec_best * 1000:.1f}ms, 평균 {vec_mean * 1000:.1f}ms")
+    print(f"• 속도 향상: {pil_mean / vec_mean:.2f}배")
+
+    if diff.max().item() > args.atol:
+        raise SystemExit(f"🚨 허용 오차 초과: {diff.max().item():.4f} > {args.atol}")
+    print("✅ 허용 오차 내에서 동일")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import os
+import csv
+import subprocess
+
+
+def mux_segments(video_path, output_dir, name_prefix, segment_duration=5, segment_times=None):
+    """ffmpeg segment muxer로 비디오 하나의 모든 세그먼트를 한 프로세스에서 스트림 복사로 저장
+
+    세그먼트마다 ffmpeg를 새로 띄워 입력을 다시 열고 seek하는 대신, 입력을 한 번만 읽으며 잘라낸다.
+    -c copy는 키프레임에서만 자를 수 있으므로 실제 경계는 요청한 시각 이후 첫 키프레임이 되며,
+    반환하는 구간은 muxer가 기록한 세그먼트 리스트(CSV)의 실제 시작/종료 시각이다.
+
+    Args:
+        video_path (str): 원본 비디오 파일 경로
+        output_dir (str): 세그먼트 저장 폴더
+        name_prefix (str): 세그먼트 파일명 앞부분 ({name_prefix}%05d.mp4)
+        segment_duration (float): 세그먼트 길이 (초, segment_times가 없을 때)
+        segment_times (list): 분할 시각 리스트 (초, 예: 키프레임 정렬 경계)
+
+    Returns:
+        list of tuple: (세그먼트 파일 경로, 시작 시간, 종료 시간), 실패 시 빈 리스트
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    list_path = os.path.join(output_dir, f".{name_prefix}segments.csv")
+
+    if segment_times is not None:
+        split_args = ["-segment_times", ",".join(f"{t:.6f}" for t in segment_times)]
+    else:
+        split_args = ["-segment_time", str(segment_duration)]
+
+    command = [
+        "ffmpeg",
+        "-i", video_path,
+        "-c", "copy",
+        "-f", "segment",
+        *split_args,
+        "-reset_timestamps", "1",
+        "-segment_list", list_path,
+        "-segment_list_type", "csv",
+        os.path.join(output_dir, f"{name_prefix}%05d.mp4"),
+        "-y"
+    ]
+    result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        print(f"🚨 세그먼트 분할 오류: {video_path}\n{result.stderr.decode('utf-8', errors='ignore')[-500:]}")
+        return []
+
+    segments = []
+    with open(list_path, "r", encoding="utf-8", newline="") as f:
+        for filename, start_time, end_time in csv.reader(f):
+            segments.append((os.path.join(output_dir, filename), float(start_time), float(end_time)))
+    os.remove(list_path)
+    return segments
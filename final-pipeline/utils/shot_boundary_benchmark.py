@@ -0,0 +1,84 @@
+import os
+import time
+import argparse
+import tempfile
+
+import cv2
+import numpy as np
+
+from .video_split import ShotBoundarySegmenter
+
+
+def match_boundaries(reference, candidate, tolerance):
+    """reference 경계 중 candidate에 tolerance(프레임) 이내로 대응되는 경계 수"""
+    return sum(any(abs(r - c) <= tolerance for c in candidate) for r in reference)
+
+
+def write_synthetic_video(path, cut_frames=(37, 90, 151), num_frames=200, width=640, height=360, fps=25):
+    """cut_frames에서 장면이 바뀌는 합성 비디오 (장면 안에서는 그라디언트가 천천히 움직임)"""
+    levels = [20, 230, 60, 200]  # 장면마다 밝기가 크게 달라 경계 차이가 threshold를 충분히 넘는다
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    y, x = np.mgrid[0:height, 0:width]
+    bounds = [0, *cut_frames, num_frames]
+    for shot in range(len(bounds) - 1):
+        level = levels[shot % len(levels)]
+        for i in range(bounds[shot], bounds[shot + 1]):
+            shade = ((x + y + i * 2) % 256)[..., None] * 0.1
+            writer.write(np.clip(np.full(3, level * 0.9) + shade, 0, 255).astype(np.uint8))
+    writer.release()
+    return list(cut_frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ShotBoundarySegmenter fast vs full-resolution benchmark')
+    parser.add_argument('videos', nargs='*', help='비교할 비디오 파일 (없으면 경계를 아는 합성 비디오)')
+    parser.add_argument('--threshold', type=float, default=30)
+    parser.add_argument('--downscale-width', type=int, default=160)
+    parser.add_argument('--frame-skip', type=int, default=4)
+    parser.add_argument('--candidate-ratio', type=float, default=0.5)
+    parser.add_argument('--tolerance', type=int, default=0, help='경계 일치로 볼 프레임 차이')
+    args = parser.parse_args()
+
+    full = ShotBoundarySegmenter(threshold=args.threshold, downscale_width=None)
+    fast = ShotBoundarySegmenter(threshold=args.threshold, downscale_width=args.downscale_width,
+                                 frame_skip=args.frame_skip, candidate_ratio=args.candidate_ratio)
+
+    expected = {}
+    if not args.videos:
+        video_path = os.path.join(tempfile.mkdtemp(), "synthetic_shots.mp4")
+        expected[video_path] = write_synthetic_video(video_path)
+        args.videos = [video_path]
+
+    total_full, total_fast = 0.0, 0.0
+    mismatched = []
+    for video_path in args.videos:
+        # 세그먼트 길이 필터 전의 경계 프레임끼리 비교한다
+        start = time.perf_counter()
+        full_bounds, _, _ = full._detect_cuts_full(video_path)
+        full_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        fast_bounds, _, _ = fast._detect_cuts_fast(video_path)
+        fast_time = time.perf_counter() - start
+
+        total_full += full_time
+        total_fast += fast_time
+        matched = match_boundaries(full_bounds, fast_bounds, args.tolerance)
+        extra = len(fast_bounds) - match_boundaries(fast_bounds, full_bounds, args.tolerance)
+        if matched != len(full_bounds) or extra:
+            mismatched.append(video_path)
+        if video_path in expected and sorted(full_bounds) != expected[video_path]:
+            mismatched.append(video_path)
+            print(f"🚨 합성 비디오 경계 {expected[video_path]}와 다름: {full_bounds}")
+        print(f"🎬 {video_path}: 경계 {matched}/{len(full_bounds)}개 일치, 빠른 경로에만 있는 경계 {extra}개, "
+              f"전체 해상도 {full_time:.2f}초, 빠른 경로 {fast_time:.2f}초 ({full_time / max(fast_time, 1e-9):.1f}배)")
+
+    print(f"\n📊 총 시간: 전체 해상도 {total_full:.2f}초, 빠른 경로 {total_fast:.2f}초 "
+          f"({total_full / max(total_fast, 1e-9):.1f}배)")
+    if mismatched:
+        raise SystemExit(f"🚨 경계가 다른 비디오 {len(mismatched)}개: {', '.join(mismatched)} "
+                         f"(--candidate-ratio를 낮추거나 --frame-skip을 줄여 다시 확인)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from .segment_muxer import mux_segments
+from .video_metadata import probe_video
+
+
+def split_per_segment(video_path, output_dir, segment_duration):
+    """기존 방식: 세그먼트마다 ffmpeg를 실행해 -ss로 seek 후 스트림 복사"""
+    duration = probe_video(video_path)['duration']
+    os.makedirs(output_dir, exist_ok=True)
+    for index, start in enumerate(range(0, int(duration), segment_duration)):
+        end = min(start + segment_duration, duration)
+        command = ["ffmpeg", "-ss", str(start), "-i", video_path, "-t", str(end - start),
+                   "-c", "copy", os.path.join(output_dir, f"{index:05d}.mp4"), "-y"]
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def split_muxed(video_path, output_dir, segment_duration):
+    return mux_segments(video_path, output_dir, "part", segment_duration=segment_duration)
+
+
+def run(split_fn, videos, segment_duration, workers):
+    work_dir = tempfile.mkdtemp(prefix="split_benchmark_")
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(lambda item: split_fn(item[1], os.path.join(work_dir, str(item[0])), segment_duration),
+                              enumerate(videos)))
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-segment ffmpeg vs single-pass segment muxer splitting benchmark')
+    parser.add_argument('videos', nargs='+', help='분할할 비디오 파일')
+    parser.add_argument('--segment-duration', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=4, help='동시에 분할할 비디오 수')
+    args = parser.parse_args()
+
+    baseline = run(split_per_segment, args.videos, args.segment_duration, 1)
+    muxed = run(split_muxed, args.videos, args.segment_duration, 1)
+    parallel = run(split_muxed, args.videos, args.segment_duration, args.workers)
+
+    print(f"\n📊 비디오 {len(args.videos)}개, {args.segment_duration}초 단위 분할:")
+    print(f"• 세그먼트별 ffmpeg (순차): {baseline:.2f}초")
+    print(f"• segment muxer (순차): {muxed:.2f}초 ({baseline / max(muxed, 1e-9):.1f}배)")
+    print(f"• segment muxer ({args.workers}개 병렬): {parallel:.2f}초 ({baseline / max(parallel, 1e-9):.1f}배)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import time
+import argparse
+import multiprocessing.util
+
+from .staged_pipeline import StagedCaptioningPipeline
+
+# 디코딩 워커 프로세스 전용 설정 (init_stub_worker에서 설정)
+_decode_seconds = 0.0
+_crash_job = None
+
+
+def init_stub_worker(decode_seconds, crash_job=None, crash_on_exit=False):
+    global _decode_seconds, _crash_job
+    _decode_seconds = decode_seconds
+    _crash_job = crash_job
+    if crash_on_exit:
+        # 종료 표시를 보내고 큐를 비운 뒤 비정상 종료 코드로 끝남 (종료 시점의 네이티브 크래시 흉내)
+        multiprocessing.util.Finalize(None, os._exit, args=(3,), exitpriority=-10)
+
+
+def prepare_stub(job):
+    """프레임 디코딩 대용: decode_seconds만큼 CPU를 쓰고 작은 입력을 만든다 (crash_job이면 워커 프로세스가 죽음)"""
+    if job == _crash_job:
+        os._exit(1)
+    deadline = time.perf_counter() + _decode_seconds
+    while time.perf_counter() < deadline:
+        pass
+    yield job, {"input_ids": [job % 7, job % 11, job % 13]}
+
+
+class StubCaptionModel:
+    """모델 파일 없이 파이프라인을 확인할 때 쓰는 작은 대용 모델 (배치당 고정 시간 + 항목당 시간)"""
+
+    def __init__(self, batch_seconds, item_seconds):
+        self.batch_seconds = batch_seconds
+        self.item_seconds = item_seconds
+
+    def generate(self, batch):
+        time.sleep(self.batch_seconds + self.item_seconds * len(batch))
+        return [f"caption {item} ({sum(payload['input_ids'])})" for item, payload in batch]
+
+
+def run_sequential(jobs, model, decode_seconds):
+    init_stub_worker(decode_seconds)
+    start = time.perf_counter()
+    results = []
+    for job in jobs:
+        for item, payload in prepare_stub(job):
+            results.extend(model.generate([(item, payload)]))
+    return results, time.perf_counter() - start
+
+
+def run_staged(jobs, model, args, crash_job=None, crash_on_exit=False, failures=None):
+    pipeline = StagedCaptioningPipeline(
+        prepare_fn=prepare_stub,
+        generate_fn=model.generate,
+        postprocess_fn=lambda item, caption: (item, caption),
+        num_workers=args.workers,
+        batch_size=args.batch_size,
+        worker_init_fn=init_stub_worker,
+        worker_init_args=(args.decode_seconds, crash_job, crash_on_exit),
+        failure_fn=(lambda item, error: failures.append(item)) if failures is not None else None,
+    )
+    start = time.perf_counter()
+    results = pipeline.run(jobs)
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Staged pipeline end-to-end check on CPU with a stand-in model')
+    parser.add_argument('--jobs', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=2, help='디코딩 워커 프로세스 수')
+    parser.add_argument('--batch-size', type=int, default=4)
+    parser.add_argument('--decode-seconds', type=float, default=0.05, help='항목당 디코딩 시간')
+    parser.add_argument('--batch-seconds', type=float, default=0.02, help='배치당 생성 고정 시간')
+    parser.add_argument('--item-seconds', type=float, default=0.01, help='항목당 생성 시간')
+    args = parser.parse_args()
+
+    jobs = list(range(args.jobs))
+    model = StubCaptionModel(args.batch_seconds, args.item_seconds)
+
+    sequential, sequential_time = run_sequential(jobs, model, args.decode_seconds)
+    staged, staged_time = run_staged(jobs, model, args)
+    assert sorted(sequential) == sorted(caption for _, caption in staged), "순차 실행과 결과가 다름"
+    print(f"⏱️ 순차 {sequential_time:.2f}초, 단계 파이프라인 {staged_time:.2f}초 "
+          f"({sequential_time / staged_time:.2f}배), 항목 {len(staged)}개")
+
+    # 디코딩 워커 하나가 종료 표시 없이 죽어도 멈추지 않고 남은 워커로 끝나야 한다
+    crash_job = args.jobs // 2
+    failures = []
+    crashed, crashed_time = run_staged(jobs, model, args, crash_job=crash_job, failures=failures)
+    processed = {item for item, _ in crashed}
+    assert crash_job not in processed, "죽은 워커의 작업이 처리됨"
+    assert crash_job in failures, f"죽은 워커의 작업이 실패로 기록되지 않음: {failures}"
+    # 모든 작업은 처리되거나 실패로 기록되어야 한다 (죽은 워커의 버퍼에 남아 전달되지 못한 결과 포함)
+    assert sorted(processed | set(failures)) == jobs and not processed & set(failures), \
+        f"처리 {len(processed)}개 + 실패 {len(failures)}개 != {len(jobs)}개"
+    print(f"✅ 디코딩 워커 비정상 종료: {crashed_time:.2f}초에 종료, 항목 {len(processed)}/{len(jobs)}개 처리, "
+          f"실패로 기록 {len(failures)}개")
+
+    # 종료 표시를 보낸 뒤 비정상 종료 코드로 끝난 워커를 두 번 세면 다른 워커의 항목이 빠진다
+    exited, exited_time = run_staged(jobs, model, args, crash_on_exit=True)
+    assert sorted(item for item, _ in exited) == jobs, f"처리된 항목 {len(exited)}/{len(jobs)}개"
+    print(f"✅ 종료 표시 후 비정상 종료: {exited_time:.2f}초에 종료, 항목 {len(exited)}/{len(jobs)}개 처리")
+
+
+if __name__ == "__main__":
+    main()
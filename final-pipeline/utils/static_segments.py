@@ -0,0 +1,106 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+def frame_signature(frames, size=16):
+    """샘플링된 프레임들의 저해상도 흑백 시그니처 [N, size, size] (0~1)
+
+    frames는 (N, H, W, 3) uint8 배열 또는 PIL 이미지 리스트.
+    영역 평균으로 축소하므로 압축 노이즈나 작은 움직임에는 둔감하다.
+    """
+    if not isinstance(frames, np.ndarray):
+        frames = np.stack([np.asarray(frame.convert('RGB')) for frame in frames])
+    gray = frames[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+    _, height, width = gray.shape
+    rows = np.linspace(0, height, min(size, height) + 1).astype(int)
+    cols = np.linspace(0, width, min(size, width) + 1).astype(int)
+    sums = np.add.reduceat(np.add.reduceat(gray, rows[:-1], axis=1), cols[:-1], axis=2)
+    counts = np.outer(np.diff(rows), np.diff(cols))
+    return sums / counts / 255.0
+
+
+def signature_distance(a, b):
+    """두 시그니처의 평균 절대 차이 (프레임 수나 크기가 다르면 inf)"""
+    if a is None or b is None or a.shape != b.shape:
+        return float('inf')
+    return float(np.abs(a - b).mean())
+
+
+def _time_key(seconds):
+    return round(float(seconds), 3)
+
+
+class StaticSegmentDetector:
+    """바로 앞 세그먼트와 같은 장면인 세그먼트를 찾아 캡션을 재사용하게 하는 검출기
+
+    캡션을 생성한 세그먼트(anchor)와 그 캡션을 재사용한 세그먼트들이 하나의 연속 구간을 이루며,
+    비디오마다 연속 구간의 끝 시각 -> anchor를 기억한다. 새 세그먼트는 시작 시각에서 끝나는 바로 앞 세그먼트가
+    있을 때만 그 anchor와 비교하므로, 세그먼트가 도착하는 순서(여러 디코딩 워커)와 상관없이 시간상 이웃끼리만 묶인다.
+    threshold 이내면 anchor의 캡션을 재사용하고, 아니면 set_anchor로 새 anchor가 된다.
+    (재사용된 세그먼트는 anchor를 바꾸지 않으므로 천천히 변하는 장면이 한 캡션에 계속 묶이지 않는다)
+    비디오 처리가 끝나면 forget을 호출한다. 끝을 알 수 없는 스트리밍용으로 최근 max_videos개 비디오만 기억한다.
+    """
+
+    def __init__(self, threshold=0.03, signature_size=16, max_videos=256):
+        self.threshold = threshold
+        self.signature_size = signature_size
+        self.max_videos = max_videos
+        # video_path -> {세그먼트 종료 시각: 그 세그먼트가 속한 anchor {"segment", "signature", "caption", "result"}}
+        self.chains = OrderedDict()
+
+        self.reused = 0
+        self.generated = 0
+        self.generation_time = 0.0
+
+    def signature(self, frames):
+        return frame_signature(frames, self.signature_size)
+
+    def match(self, video_path, segment, signature):
+        """바로 앞 세그먼트(segment 시작 시각에 끝남)가 속한 anchor와 같은 장면이면 anchor 항목, 아니면 None"""
+        start_time, end_time = segment
+        links = self.chains.get(video_path)
+        if links is None:
+            return None
+        self.chains.move_to_end(video_path)
+        # 세그먼트의 다음 세그먼트는 하나뿐이므로 비교한 뒤에는 앞 세그먼트의 연결을 지운다
+        anchor = links.pop(_time_key(start_time), None)
+        if anchor is None or signature_distance(anchor['signature'], signature) > self.threshold:
+            return None
+        links[_time_key(end_time)] = anchor
+        return anchor
+
+    def set_anchor(self, video_path, segment, signature):
+        """새로 캡션을 생성할 세그먼트를 anchor로 등록 (caption/result는 생성 후 채운다)"""
+        anchor = {"segment": segment, "signature": signature, "caption": None, "result": None}
+        links = self.chains.setdefault(video_path, {})
+        self.chains.move_to_end(video_path)
+        links[_time_key(segment[1])] = anchor
+        while len(self.chains) > self.max_videos:
+            self.chains.popitem(last=False)
+        return anchor
+
+    def record_reuse(self, count=1):
+        self.reused += count
+
+    def record_generation(self, elapsed, count=1):
+        """실제로 생성한 세그먼트 수와 시간 (절약 시간 추정에 사용)"""
+        self.generated += count
+        self.generation_time += elapsed
+
+    def forget(self, video_path):
+        """비디오 처리가 끝나면 anchor 정리"""
+        self.chains.pop(video_path, None)
+
+    def avoided_time(self):
+        """재사용으로 건너뛴 생성 시간 추정치 (세그먼트당 평균 생성 시간 기준)"""
+        if not self.generated:
+            return 0.0
+        return self.reused * self.generation_time / self.generated
+
+    def summary(self):
+        total = self.reused + self.generated
+        ratio = self.reused / total * 100 if total else 0.0
+        return (f"• 정적 세그먼트 재사용: {self.reused}/{total}개 ({ratio:.1f}%), "
+                f"생성 시간 약 {self.avoided_time():.1f}초 절약")
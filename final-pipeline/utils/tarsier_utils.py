@@ -30,8 +30,11 @@ import base64
 # limitations under the License.
 from PIL import Image
 from typing import List
+import numpy as np
 import torch
+import torch.nn.functional as F
 from transformers import DataCollatorForSeq2Seq
+from transformers.cache_utils import Cache, DynamicCache
 from transformers.models.llava import LlavaProcessor
 import re
 
@@ -44,6 +47,9 @@ class CustomImageProcessor:
         self.processor = processor
 
     def __call__(self, images: List[Image.Image], do_padding=False) -> torch.Tensor:
+        # 디코딩된 (N, H, W, 3) uint8 배열은 프레임 단위 PIL 변환 없이 한 번에 처리
+        if isinstance(images, np.ndarray):
+            return self.preprocess_frames(images, do_padding=do_padding)
         if do_padding:
             images = [self.expand2square(
                 img,
@@ -72,6 +78,57 @@ class CustomImageProcessor:
         pil_img = pil_img.resize((max(width, height), max(width, height)))
         return pil_img
 
+    def preprocess_frames(self, frames: np.ndarray, do_padding=False) -> torch.Tensor:
+        """(N, H, W, 3) uint8 프레임 배열을 한 번의 텐서 연산으로 pixel_values로 변환
+
+        PIL 경로(resize2square/expand2square -> CLIP resize -> center crop -> rescale -> normalize)와
+        같은 순서로 처리한다. PIL처럼 리사이즈마다 uint8로 반올림하며, 결과는 PIL 경로와 허용 오차 내에서 같다.
+        """
+        image_processor = self.processor.image_processor
+        mean = torch.tensor(image_processor.image_mean, dtype=torch.float32).view(1, 3, 1, 1)
+        std = torch.tensor(image_processor.image_std, dtype=torch.float32).view(1, 3, 1, 1)
+
+        pixels = torch.from_numpy(np.ascontiguousarray(frames)).permute(0, 3, 1, 2).float()  # [N, 3, H, W]
+        num_frames, _, height, width = pixels.shape
+        side = max(height, width)
+        if height != width:
+            if do_padding:
+                background = torch.tensor([int(x * 255) for x in image_processor.image_mean], dtype=torch.float32)
+                square = background.view(1, 3, 1, 1).repeat(num_frames, 1, side, side)
+                top, left = (side - height) // 2, (side - width) // 2
+                square[:, :, top:top + height, left:left + width] = pixels
+                pixels = square
+            else:
+                pixels = self._resize(pixels, side, side)
+
+        # 정사각형이므로 shortest_edge 리사이즈는 (size, size) 리사이즈와 같다
+        size = image_processor.size
+        size = size.get('shortest_edge', size.get('height')) if isinstance(size, dict) else size
+        if getattr(image_processor, 'do_resize', True) and size != side:
+            pixels = self._resize(pixels, size, size)
+
+        if getattr(image_processor, 'do_center_crop', True):
+            crop_size = image_processor.crop_size
+            if isinstance(crop_size, dict):
+                crop_height, crop_width = crop_size['height'], crop_size['width']
+            else:
+                crop_height = crop_width = crop_size
+            top = max(0, (pixels.shape[2] - crop_height) // 2)
+            left = max(0, (pixels.shape[3] - crop_width) // 2)
+            pixels = pixels[:, :, top:top + crop_height, left:left + crop_width]
+
+        if getattr(image_processor, 'do_rescale', True):
+            pixels = pixels * image_processor.rescale_factor
+        if getattr(image_processor, 'do_normalize', True):
+            pixels = (pixels - mean) / std
+        return pixels.contiguous()  # [num_images, 3, 336, 336]
+
+    @staticmethod
+    def _resize(pixels, height, width):
+        """PIL BICUBIC 리사이즈에 대응하는 배치 리사이즈 (축소 시 antialias, 결과는 uint8 범위로 반올림)"""
+        pixels = F.interpolate(pixels, size=(height, width), mode='bicubic', align_corners=False, antialias=True)
+        return pixels.round_().clamp_(0, 255)
+
 class Processor(object):
     def __init__(
             self,
@@ -80,11 +137,14 @@ class Processor(object):
             max_seq_len=None,
             add_sep=False,
             do_image_padding=False,
+            vectorized_preprocess=True,
         ):
         self.max_n_frames = max_n_frames
         self.max_seq_len = max_seq_len,
         self.add_sep = add_sep
         self.do_image_padding = do_image_padding
+        # True면 비디오 프레임을 PIL 리스트 대신 uint8 배열로 받아 배치 전처리한다
+        self.vectorized_preprocess = vectorized_preprocess
         if not self.do_image_padding:
             print(f"### do_image_padding is set as False, images will be resized directly!")
 
@@ -110,7 +170,7 @@ class Processor(object):
             self.max_seq_len = self.tokenizer.model_max_length
 
     def process_prompt(self, prompt, images: List[Image.Image]=None):
-        if not images:
+        if images is None or len(images) == 0:
             prompt = prompt.replace("<image>", "").replace("<video>", "")
         elif images is not None:
             prompt = prompt.replace("<video>", "<image>"*len(images))
@@ -136,9 +196,32 @@ class Processor(object):
         else:
             raise ValueError(f"Unsupported data format: {visual_data_path}")
         
-    def load_images(self, visual_data_path, n_frames=None, start_time=0, end_time=-1):
+    def load_images(self, visual_data_path, n_frames=None, start_time=0, end_time=-1, return_indices=False):
+        # return_indices=True면 (프레임, 원본 프레임 인덱스)를 반환 (비디오가 아니면 인덱스는 None)
         sampler = self.select_frames_sampler(visual_data_path)
-        return sampler(visual_data_path, n_frames=min(n_frames, self.max_n_frames) if n_frames else self.max_n_frames, start_time=start_time, end_time=end_time)
+        n_frames = min(n_frames, self.max_n_frames) if n_frames else self.max_n_frames
+        if sampler is sample_video:
+            return sampler(visual_data_path, n_frames=n_frames, start_time=start_time, end_time=end_time,
+                           as_array=self.vectorized_preprocess, return_indices=return_indices)
+        images = sampler(visual_data_path, n_frames=n_frames, start_time=start_time, end_time=end_time)
+        return (images, None) if return_indices else images
+
+    def iter_segment_images(self, video_path, segments, n_frames=None, return_indices=False):
+        n_frames = min(n_frames, self.max_n_frames) if n_frames else self.max_n_frames
+        return iter_video_segments(video_path, segments, n_frames=n_frames, as_array=self.vectorized_preprocess,
+                                   return_indices=return_indices)
+
+    def preprocess_config(self):
+        """pixel_values에 영향을 주는 전처리 설정 (프레임 특징 캐시 키에 사용)"""
+        image_processor = self.processor.processor.image_processor
+        return {
+            "size": image_processor.size,
+            "crop_size": image_processor.crop_size,
+            "image_mean": list(image_processor.image_mean),
+            "image_std": list(image_processor.image_std),
+            "do_image_padding": self.do_image_padding,
+            "vectorized_preprocess": self.vectorized_preprocess,
+        }
 
     def get_pixel_values(self, images):
         if images is not None and len(images) > 0:
@@ -154,9 +237,9 @@ class Processor(object):
         prompt_ids = torch.tensor(prompt_ids, dtype=torch.long).unsqueeze(dim=0)
         return prompt_ids
 
-    def get_inputs(self, prompt, visual_data_file=None, images=None, n_frames=None, edit_prompt=False, return_prompt=False):
+    def get_inputs(self, prompt, visual_data_file=None, images=None, n_frames=None, edit_prompt=False, return_prompt=False, start_time=0, end_time=-1):
         if images is None:
-            images = self.load_images(visual_data_file, n_frames) if visual_data_file else None
+            images = self.load_images(visual_data_file, n_frames, start_time=start_time, end_time=end_time) if visual_data_file else None
         if edit_prompt:
             prompt = self.process_prompt(prompt, images)
         text_inputs = self.get_text_inputs(prompt)
@@ -169,8 +252,8 @@ class Processor(object):
             inputs['prompt'] = prompt
         return inputs
 
-    def __call__(self, prompt, visual_data_file=None, images=None, n_frames=None, edit_prompt=False, return_prompt=False):
-        return self.get_inputs(prompt, visual_data_file, images, n_frames, edit_prompt, return_prompt)
+    def __call__(self, prompt, visual_data_file=None, images=None, n_frames=None, edit_prompt=False, return_prompt=False, start_time=0, end_time=-1):
+        return self.get_inputs(prompt, visual_data_file, images, n_frames, edit_prompt, return_prompt, start_time, end_time)
 
 
 class Color:
@@ -216,6 +299,208 @@ def load_model_and_processor(model_name_or_path, max_n_frames=8):
     model.eval()
     return model, processor
 
+
+def collate_inputs(inputs_list, pad_id, prefix_len=0):
+    """프롬프트 길이와 프레임 수가 다른 입력들을 하나의 배치로 묶는다
+
+    input_ids는 왼쪽 패딩 후 attention_mask를 만들고, pixel_values는 프레임 축으로 이어 붙인다.
+    (모델이 input_ids의 <image> 토큰 순서대로 프레임 특징을 채워 넣으므로 샘플별 프레임 수가 달라도 된다)
+    생성 결과는 모든 샘플이 input_ids.shape[1] 위치부터 새 토큰이다.
+
+    prefix_len > 0이면 모든 샘플이 공유하는 앞쪽 prefix_len 토큰을 맨 앞에 두고 그 뒤를 패딩한다
+    ([프리픽스, 패딩, 나머지]). 위치 id는 attention_mask 누적합이라 왼쪽 패딩과 같은 결과가 된다.
+    """
+    if prefix_len:
+        num_inputs = len(inputs_list)
+        prefix_ids = inputs_list[0]['input_ids'][:, :prefix_len]
+        batch = collate_inputs(
+            [{**inputs, 'input_ids': inputs['input_ids'][:, prefix_len:]} for inputs in inputs_list], pad_id
+        )
+        batch['input_ids'] = torch.cat([prefix_ids.expand(num_inputs, -1), batch['input_ids']], dim=1)
+        batch['attention_mask'] = torch.cat(
+            [torch.ones((num_inputs, prefix_len), dtype=torch.long), batch['attention_mask']], dim=1
+        )
+        return batch
+
+    max_len = max(inputs['input_ids'].shape[1] for inputs in inputs_list)
+    input_ids = torch.full((len(inputs_list), max_len), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(inputs_list), max_len), dtype=torch.long)
+    for i, inputs in enumerate(inputs_list):
+        ids = inputs['input_ids'][0]
+        input_ids[i, max_len - ids.shape[0]:] = ids
+        attention_mask[i, max_len - ids.shape[0]:] = 1
+
+    pixel_values = [inputs['pixel_values'] for inputs in inputs_list if inputs.get('pixel_values') is not None]
+    batch = {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "pixel_values": torch.cat(pixel_values, dim=0) if pixel_values else None,
+    }
+    return {k: v for k, v in batch.items() if v is not None}
+
+
+class AdaptiveBatchGenerator:
+    """메모리 예산에 맞춰 배치 크기를 정하고, OOM이 나면 배치를 반으로 나눠 다시 시도하는 생성기"""
+
+    def __init__(self, model, processor, max_batch_size=8, memory_budget_gb=None, memory_fraction=0.8,
+                 feature_cache=None, use_prefix_cache=False, **generate_kwargs):
+        self.model = model
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        # FrameFeatureCache: 입력에 video_path와 frame_indices가 있으면 프레임 특징을 캐시에서 재사용
+        self.feature_cache = feature_cache
+
+        # use_prefix_cache=True면 고정 instruction의 첫 <image> 앞 토큰들은 KV를 한 번만 계산해 배치마다 복제한다
+        # (Tarsier 프롬프트는 이 프리픽스가 3토큰 정도라 이득이 거의 없으므로 기본값은 사용 안 함)
+        self.use_prefix_cache = use_prefix_cache
+        self.prefix_caches = {}  # 프리픽스 토큰 tuple -> (레이어별 (key, value), Cache 객체 여부)
+        self.generate_kwargs = generate_kwargs
+        self.pad_id = processor.pad_id if processor.pad_id is not None else processor.eos_id
+
+        # 메모리 예산: 지정하지 않으면 현재 남은 GPU 메모리의 memory_fraction 만큼 사용
+        if memory_budget_gb is not None:
+            self.memory_budget = memory_budget_gb * 1024 ** 3
+        elif torch.cuda.is_available():
+            free_memory, _ = torch.cuda.mem_get_info()
+            self.memory_budget = free_memory * memory_fraction
+        else:
+            self.memory_budget = None
+
+        # 토큰 하나당 KV cache 크기 (key + value, 모든 레이어)
+        text_config = model.config.text_config
+        dtype_bytes = torch.finfo(model.dtype).bits // 8 if model.dtype.is_floating_point else 4
+        self.kv_bytes_per_token = 2 * text_config.num_hidden_layers * text_config.hidden_size * dtype_bytes
+
+        # 프레임 하나가 차지하는 토큰 수 (패치 + 행 구분 토큰 + 프레임 구분 토큰)
+        vision_config = model.config.vision_config
+        patches_per_side = vision_config.image_size // vision_config.patch_size
+        self.tokens_per_frame = patches_per_side * patches_per_side + patches_per_side + 1
+
+    def estimate_memory(self, inputs):
+        """입력 하나를 생성하는 데 필요한 KV cache 메모리 추정치 (bytes)"""
+        n_frames = inputs['pixel_values'].shape[0] if inputs.get('pixel_values') is not None else 0
+        seq_len = inputs['input_ids'].shape[1] + n_frames * self.tokens_per_frame
+        seq_len += self.generate_kwargs.get('max_new_tokens', 512)
+        return seq_len * self.kv_bytes_per_token
+
+    def make_batches(self, inputs_list):
+        """입력 순서를 유지하면서 메모리 예산과 max_batch_size 안에서 배치를 나눈다"""
+        batches, batch, batch_memory = [], [], 0
+        for index, inputs in enumerate(inputs_list):
+            memory = self.estimate_memory(inputs)
+            over_budget = self.memory_budget is not None and batch_memory + memory > self.memory_budget
+            if batch and (len(batch) >= self.max_batch_size or over_budget):
+                batches.append(batch)
+                batch, batch_memory = [], 0
+            batch.append(index)
+            batch_memory += memory
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def generate(self, inputs_list):
+        """입력 리스트의 캡션을 입력 순서대로 반환"""
+        captions = [""] * len(inputs_list)
+        for batch in self.make_batches(inputs_list):
+            for index, caption in zip(batch, self._generate_with_fallback([inputs_list[i] for i in batch])):
+                captions[index] = caption
+        return captions
+
+    def _generate_with_fallback(self, inputs_list):
+        try:
+            return self._generate_batch(inputs_list)
+        except torch.cuda.OutOfMemoryError:
+            torch.cuda.empty_cache()
+            if len(inputs_list) == 1:
+                print("🚨 단일 입력에서도 메모리 부족, 건너뜀")
+                return [""]
+            # 배치를 반으로 나눠 재시도하고, 이후 배치 크기도 줄인다
+            half = len(inputs_list) // 2
+            self.max_batch_size = max(1, min(self.max_batch_size, half))
+            print(f"⚠️ 메모리 부족, 배치 분할 후 재시도 (배치 크기: {len(inputs_list)} -> {half})")
+            return self._generate_with_fallback(inputs_list[:half]) + self._generate_with_fallback(inputs_list[half:])
+
+    def _generate_batch(self, inputs_list):
+        prefix_len = self.shared_prefix_length(inputs_list) if self.use_prefix_cache else 0
+        batch_inputs = collate_inputs(inputs_list, self.pad_id, prefix_len=prefix_len)
+        if self.feature_cache is not None and 'pixel_values' in batch_inputs:
+            batch_inputs['image_features'] = self._image_features(inputs_list, batch_inputs.pop('pixel_values'))
+        batch_inputs = {k: v.to(self.model.device) for k, v in batch_inputs.items()}
+        if prefix_len:
+            batch_inputs['past_key_values'] = self._prefix_cache(batch_inputs['input_ids'][:1, :prefix_len], len(inputs_list))
+        with torch.inference_mode():
+            outputs = self.model.generate(**batch_inputs, **self.generate_kwargs)
+        prompt_len = batch_inputs['input_ids'].shape[1]
+        return self.processor.tokenizer.batch_decode(outputs[:, prompt_len:], skip_special_tokens=True)
+
+    def shared_prefix_length(self, inputs_list):
+        """모든 입력이 공유하는 첫 <image> 앞 토큰 수 (공유할 수 없으면 0)
+
+        샘플별 <image> 토큰 수가 다르면 디코딩 단계의 마스크 복원이 프리픽스 배치와 맞지 않으므로 사용하지 않는다.
+        """
+        image_token_index = self.model.config.image_token_index
+        common, image_counts = None, set()
+        for inputs in inputs_list:
+            ids = inputs['input_ids'][0].tolist()
+            image_counts.add(ids.count(image_token_index))
+            head = ids[:ids.index(image_token_index)] if image_token_index in ids else ids[:-1]
+            if common is None:
+                common = head
+            else:
+                length = 0
+                while length < min(len(common), len(head)) and common[length] == head[length]:
+                    length += 1
+                common = common[:length]
+        if len(image_counts) > 1:
+            return 0
+        return len(common or [])
+
+    def _prefix_cache(self, prefix_ids, batch_size):
+        """프리픽스 KV cache를 배치 크기로 복제 (처음 보는 프리픽스만 계산)"""
+        key = tuple(prefix_ids[0].tolist())
+        if key not in self.prefix_caches:
+            with torch.inference_mode():
+                past_key_values = self.model.compute_prefix_cache(prefix_ids)
+            is_cache = isinstance(past_key_values, Cache)
+            legacy = past_key_values.to_legacy_cache() if is_cache else past_key_values
+            self.prefix_caches[key] = (legacy, is_cache)
+
+        legacy, is_cache = self.prefix_caches[key]
+        expanded = tuple(
+            (k.expand(batch_size, -1, -1, -1).clone(), v.expand(batch_size, -1, -1, -1).clone()) for k, v in legacy
+        )
+        return DynamicCache.from_legacy_cache(expanded) if is_cache else expanded
+
+    def _image_features(self, inputs_list, pixel_values):
+        """캐시에 있는 프레임은 저장된 특징을 쓰고, 없는 프레임만 vision tower로 계산해 캐시에 넣는다"""
+        frame_keys = []
+        for inputs in inputs_list:
+            if inputs.get('pixel_values') is None:
+                continue
+            n_frames = inputs['pixel_values'].shape[0]
+            if inputs.get('video_path') and inputs.get('frame_indices') is not None:
+                frame_keys.extend(self.feature_cache.frame_keys(inputs['video_path'], inputs['frame_indices']))
+            else:
+                frame_keys.extend([None] * n_frames)
+
+        features = [self.feature_cache.get(key) if key else None for key in frame_keys]
+        # 배치 안에서 겹치는 프레임(같은 키)은 한 번만 계산
+        missing = {}
+        for i, feature in enumerate(features):
+            if feature is None:
+                missing.setdefault(frame_keys[i] or i, []).append(i)
+        if missing:
+            rows = [positions[0] for positions in missing.values()]
+            with torch.inference_mode():
+                computed = self.model.get_image_features(pixel_values[rows].to(self.model.device))
+            for positions, feature in zip(missing.values(), computed):
+                key = frame_keys[positions[0]]
+                if key:
+                    self.feature_cache.put(key, feature)
+                for i in positions:
+                    features[i] = feature
+        return torch.stack([feature.to(self.model.device) for feature in features])
+
 def file_to_base64(img_path):
     with open(img_path, 'rb') as video_file:
         video_b64_str = base64.b64encode(video_file.read()).decode()
@@ -254,7 +539,9 @@ def sample_video(
     video_path: str, 
     n_frames: int = None,
     start_time: int = 0,
-    end_time: int = -1
+    end_time: int = -1,
+    as_array: bool = False,
+    return_indices: bool = False
     ) -> List[Image.Image]:
 
     assert os.path.exists(video_path), f"File not found: {video_path}"
@@ -263,6 +550,14 @@ def sample_video(
     total_frames = len(vr)
     fps = vr.get_avg_fps()
 
+    frame_indices = segment_frame_indices(total_frames, fps, n_frames, start_time, end_time)
+
+    frames = vr.get_batch(frame_indices).asnumpy()
+    if not as_array:
+        frames = [Image.fromarray(f).convert('RGB') for f in frames]  # as_array면 (N, H, W, 3) uint8 그대로
+    return (frames, frame_indices) if return_indices else frames
+
+def segment_frame_indices(total_frames: int, fps: float, n_frames: int, start_time: float = 0, end_time: float = -1):
     start_frame = 0
     end_frame = total_frames - 1
     if start_time > 0:
@@ -270,15 +565,48 @@ def sample_video(
     if end_time > 0:
         end_frame = max(start_frame, int(fps*end_time))
         end_frame = min(end_frame, (total_frames-1))
-    frame_indices = sample_frame_indices(
+    return sample_frame_indices(
         start_frame=start_frame,
         total_frames=end_frame - start_frame + 1,
         n_frames=n_frames,
     )
 
-    frames = vr.get_batch(frame_indices).asnumpy()
-    frames = [Image.fromarray(f).convert('RGB') for f in frames]
-    return frames
+# 한 비디오의 여러 구간을 VideoReader 하나로 처리한다.
+# 구간 묶음마다 필요한 프레임 인덱스를 미리 모아 정렬된 get_batch 한 번으로 읽은 뒤 구간별로 나눠준다.
+def iter_video_segments(
+    video_path: str,
+    segments: List[tuple],
+    n_frames: int = None,
+    segments_per_batch: int = 16,
+    as_array: bool = False,
+    return_indices: bool = False
+    ):
+
+    assert os.path.exists(video_path), f"File not found: {video_path}"
+    vr = decord.VideoReader(video_path, num_threads=1, ctx=decord.cpu(0))
+    vr.seek(0)
+    total_frames = len(vr)
+    fps = vr.get_avg_fps()
+
+    for i in range(0, len(segments), segments_per_batch):
+        batch_segments = segments[i:i + segments_per_batch]
+        batch_indices = [
+            segment_frame_indices(total_frames, fps, n_frames, start_time, end_time)
+            for start_time, end_time in batch_segments
+        ]
+        unique_indices = sorted(set(idx for indices in batch_indices for idx in indices))
+        batch_frames = vr.get_batch(unique_indices).asnumpy()
+        frame_by_index = dict(zip(unique_indices, batch_frames))
+
+        for segment, indices in zip(batch_segments, batch_indices):
+            if as_array:
+                frames = np.stack([frame_by_index[idx] for idx in indices])
+            else:
+                frames = [Image.fromarray(frame_by_index[idx]).convert('RGB') for idx in indices]
+            if return_indices:
+                yield segment, frames, indices
+            else:
+                yield segment, frames
 
 def sample_gif(
         gif_path: str,
@@ -0,0 +1,167 @@
+import os
+import json
+import atexit
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _parse_rate(rate):
+    """ffprobe의 '30000/1001' 형태 프레임레이트를 float로 변환"""
+    if not rate or rate == "0/0":
+        return 0.0
+    num, _, den = rate.partition('/')
+    return float(num) / float(den) if den else float(num)
+
+
+def probe_video(video_path, with_keyframes=False):
+    """ffprobe로 컨테이너 헤더에서 비디오 메타데이터를 읽는다 (프레임 디코딩 없음)
+
+    Returns:
+        dict: duration, fps, frame_count, width, height (+ keyframes: 키프레임 시각 리스트)
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,avg_frame_rate,r_frame_rate,nb_frames,duration:format=duration",
+        "-of", "json",
+        video_path
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    info = json.loads(result.stdout)
+    stream = info['streams'][0] if info.get('streams') else {}
+
+    duration = float(info.get('format', {}).get('duration') or stream.get('duration') or 0.0)
+    fps = _parse_rate(stream.get('avg_frame_rate')) or _parse_rate(stream.get('r_frame_rate'))
+    frame_count = int(stream['nb_frames']) if stream.get('nb_frames', '').isdigit() else int(round(duration * fps))
+
+    metadata = {
+        "duration": duration,
+        "fps": fps,
+        "frame_count": frame_count,
+        "width": int(stream.get('width', 0)),
+        "height": int(stream.get('height', 0)),
+    }
+    if with_keyframes:
+        metadata["keyframes"] = probe_keyframes(video_path)
+    return metadata
+
+
+def probe_keyframes(video_path):
+    """패킷 플래그만 읽어 키프레임 시각(초)을 반환 (디코딩 없음)
+
+    시각은 컨테이너 시작 시각(format start_time)을 뺀 값이라 ffmpeg -ss에 그대로 넘길 수 있다.
+    """
+    command = [
+        "ffprobe", "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags:format=start_time",
+        "-of", "json",
+        video_path
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+    info = json.loads(result.stdout)
+    start_time = float(info.get('format', {}).get('start_time') or 0.0)
+    keyframes = [
+        round(float(packet['pts_time']) - start_time, 6)
+        for packet in info.get('packets', [])
+        if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, '', 'N/A')
+    ]
+    return sorted(keyframes)
+
+
+def atomic_write_json(path, data):
+    """같은 폴더의 고유한 임시 파일에 쓴 뒤 교체 (여러 프로세스가 동시에 저장해도 서로의 임시 파일을 덮어쓰지 않음)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class VideoMetadataCache:
+    """비디오 메타데이터 캐시
+
+    파일마다 ffprobe를 한 번만 실행하고 결과를 (경로, 크기, 수정 시각) 기준으로 JSON 파일에 저장한다.
+    파일이 바뀌면(크기/수정 시각 변경) 다시 읽는다.
+    JSON 파일은 get_many나 save() 호출 때(그리고 프로세스 종료 시) 한 번에 저장하며, 조회마다 다시 쓰지 않는다.
+    """
+
+    def __init__(self, cache_path="cache/video_metadata.json"):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ 메타데이터 캐시 로드 실패, 새로 생성: {str(e)}")
+        if cache_path:
+            atexit.register(self.save)
+
+    def _lookup(self, path, stat, with_keyframes):
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            return None
+        if with_keyframes and 'keyframes' not in entry['metadata']:
+            return None
+        return entry['metadata']
+
+    def get(self, video_path, with_keyframes=False, save=False):
+        """비디오 메타데이터 반환 (캐시에 없으면 ffprobe 실행, save=True면 바로 JSON 저장)"""
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        with self.lock:
+            metadata = self._lookup(path, stat, with_keyframes)
+        if metadata is not None:
+            return metadata
+
+        metadata = probe_video(path, with_keyframes=with_keyframes)
+        with self.lock:
+            self.entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "metadata": metadata}
+            self.dirty = True
+        if save:
+            self.save()
+        return metadata
+
+    def get_many(self, video_paths, with_keyframes=False, max_workers=8):
+        """여러 비디오의 메타데이터를 병렬로 수집 (실패한 파일은 결과에서 제외)"""
+        def probe(video_path):
+            try:
+                return video_path, self.get(video_path, with_keyframes=with_keyframes, save=False)
+            except Exception as e:
+                print(f"⚠️ {os.path.basename(video_path)} 메타데이터 수집 실패: {str(e)}")
+                return video_path, None
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = dict(executor.map(probe, video_paths))
+        self.save()
+        return {path: metadata for path, metadata in results.items() if metadata is not None}
+
+    def save(self):
+        if not self.cache_path:
+            return
+        with self.lock:
+            if not self.dirty:
+                return
+            atomic_write_json(self.cache_path, self.entries)
+            self.dirty = False
+
+
+_default_cache = None
+
+def get_metadata_cache():
+    """프로세스 전체에서 공유하는 기본 메타데이터 캐시"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = VideoMetadataCache()
+    return _default_cache
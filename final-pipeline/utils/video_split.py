@@ -1,9 +1,17 @@
 from abc import ABC, abstractmethod
 import cv2
-from moviepy import VideoFileClip
-from scenedetect import detect, ContentDetector, AdaptiveDetector
+import decord
+import numpy as np
+from scenedetect import open_video, SceneManager, ContentDetector
 from contextlib import contextmanager, redirect_stdout, redirect_stderr
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing as mp
+from tqdm import tqdm
 import os
+import json
+import time
+import bisect
+from .video_metadata import get_metadata_cache, atomic_write_json
 
 @contextmanager
 def suppress_output():
@@ -15,6 +23,9 @@ def suppress_output():
 
 class VideoSegmenter(ABC):
     """비디오 세그멘테이션을 위한 기본 클래스"""
+
+    # True면 모든 경계가 키프레임이라 -c copy로 잘라도 기록된 구간과 실제 클립 구간이 같다
+    keyframe_aligned = False
     
     @abstractmethod
     def get_segments(self, video_path):
@@ -28,24 +39,42 @@ class VideoSegmenter(ABC):
         """
         pass
 
+    def get_segments_many(self, video_paths):
+        """여러 비디오의 세그먼트를 생성 (실패한 비디오는 결과에서 제외)
+
+        Returns:
+            dict: {video_path: 세그먼트 리스트}
+        """
+        results = {}
+        for video_path in tqdm(video_paths, desc="세그먼트 생성"):
+            try:
+                with suppress_output():  # 세그먼터 로그 억제
+                    results[video_path] = self.get_segments(video_path)
+            except Exception as e:
+                print(f"⚠️ {os.path.basename(video_path)} 세그먼트 생성 실패: {str(e)}")
+        # 새로 읽은 메타데이터는 비디오마다가 아니라 한 번에 저장
+        if getattr(self, 'metadata_cache', None) is not None:
+            self.metadata_cache.save()
+        return results
+
 class FixedDurationSegmenter(VideoSegmenter):
     """고정 길이로 비디오를 나누는 세그멘터"""
     
-    def __init__(self, segment_duration=5):
+    def __init__(self, segment_duration=5, metadata_cache=None):
         self.segment_duration = segment_duration
+        self.metadata_cache = metadata_cache or get_metadata_cache()
     
     def get_segments(self, video_path):
-        with suppress_output():
-            with VideoFileClip(video_path) as video:
-                duration = video.duration
-                segments = []
-                start_time = 0
-                
-                while start_time < duration:
-                    end_time = min(start_time + self.segment_duration, duration)
-                    if end_time - start_time >= 1:  # 최소 1초 이상인 세그먼트만 포함
-                        segments.append((start_time, end_time))
-                    start_time = end_time
+        # 길이는 ffprobe 메타데이터 캐시에서 읽는다 (비디오를 디코더로 열지 않음)
+        duration = self.metadata_cache.get(video_path)['duration']
+        segments = []
+        start_time = 0
+        
+        while start_time < duration:
+            end_time = min(start_time + self.segment_duration, duration)
+            if end_time - start_time >= 1:  # 최소 1초 이상인 세그먼트만 포함
+                segments.append((start_time, end_time))
+            start_time = end_time
                 
         return segments
 
@@ -93,10 +122,76 @@ class FixedDurationSegmenter(VideoSegmenter):
 #             with VideoFileClip(video_path) as video:
 #                 return [(0, video.duration)]
 
+def _detect_scenes(video_path, threshold, min_scene_len, downscale):
+    """PySceneDetect ContentDetector로 장면 목록 검출 (프로세스 풀 워커에서도 실행)
+
+    downscale이 None이면 PySceneDetect의 자동 축소(해상도 기준)를, 정수면 그 배율로 축소해 분석한다.
+    Returns:
+        tuple: ([(start_time, end_time), ...], 소요 시간)
+    """
+    start = time.time()
+    video = open_video(video_path)
+    scene_manager = SceneManager()
+    scene_manager.add_detector(ContentDetector(threshold=threshold, min_scene_len=min_scene_len))
+    if downscale:
+        scene_manager.auto_downscale = False
+        scene_manager.downscale = downscale
+    scene_manager.detect_scenes(video)
+    scenes = [(scene[0].get_seconds(), scene[1].get_seconds()) for scene in scene_manager.get_scene_list()]
+    return scenes, time.time() - start
+
+
+class SceneListCache:
+    """장면 검출 결과를 (파일 경로, 크기, 수정 시각) + 검출 파라미터 기준으로 저장하는 JSON 캐시
+
+    캡션 생성 설정이 바뀌어도 검출 파라미터가 같으면 이전 장면 목록을 그대로 쓴다.
+    """
+
+    def __init__(self, cache_path="cache/scene_lists.json"):
+        self.cache_path = cache_path
+        self.entries = {}
+        self.dirty = False
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"⚠️ 장면 캐시 로드 실패, 새로 생성: {str(e)}")
+
+    def get(self, video_path, params_key):
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            return None
+        scenes = entry['scenes'].get(params_key)
+        return [tuple(scene) for scene in scenes] if scenes is not None else None
+
+    def put(self, video_path, params_key, scenes):
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is None or entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime:
+            entry = self.entries[path] = {"size": stat.st_size, "mtime": stat.st_mtime, "scenes": {}}
+        entry['scenes'][params_key] = [list(scene) for scene in scenes]
+        self.dirty = True
+
+    def save(self):
+        if not self.cache_path or not self.dirty:
+            return
+        atomic_write_json(self.cache_path, self.entries)
+        self.dirty = False
+
+
 class SceneDetectionSegmenter(VideoSegmenter):
-    """Scene detection을 사용하여 비디오를 나누는 세그멘터"""
+    """Scene detection을 사용하여 비디오를 나누는 세그멘터
+
+    여러 비디오는 get_segments_many로 프로세스 풀에서 병렬 검출하며,
+    결과는 SceneListCache에 저장되어 같은 파일 + 같은 파라미터면 다시 검출하지 않는다.
+    """
     
-    def __init__(self, threshold=27.0, min_scene_len=30):
+    def __init__(self, threshold=27.0, min_scene_len=30, metadata_cache=None,
+                 downscale=None, num_workers=4, cache_path="cache/scene_lists.json"):
         """
         Args:
             threshold (float): 장면 변화 감지를 위한 임계값
@@ -108,57 +203,224 @@ class SceneDetectionSegmenter(VideoSegmenter):
                                - 15: 기본값 (~0.5초 @ 30fps)
                                - 10: 짧은 장면 허용
                                - 30: 긴 장면 보장
+            downscale (int): 분석 해상도 축소 배율 (None이면 PySceneDetect 자동 축소)
+            num_workers (int): 여러 비디오를 검출할 프로세스 수
+            cache_path (str): 장면 목록 캐시 파일 (None이면 캐시 사용 안 함)
         """
         self.threshold = threshold
         self.min_scene_len = min_scene_len
+        self.metadata_cache = metadata_cache or get_metadata_cache()
+        self.downscale = downscale
+        self.num_workers = num_workers
+        self.scene_cache = SceneListCache(cache_path) if cache_path else None
+        self.params_key = json.dumps({
+            "detector": "content", "threshold": threshold,
+            "min_scene_len": min_scene_len, "downscale": downscale
+        }, sort_keys=True)
     
     def get_segments(self, video_path):
-        try:
-            # Scene detection 실행
-            scenes = detect(video_path, ContentDetector(
-                threshold=self.threshold,
-                min_scene_len=self.min_scene_len
-            ))
-            
-            # (start_time, end_time) 형태로 변환
-            segments = [(scene[0].get_seconds(), scene[1].get_seconds()) 
-                       for scene in scenes]
-            
-            # 세그먼트가 없는 경우 처리
-            if not segments:
-                print(f"⚠️ No scenes detected in {video_path}, using entire video")
-                with VideoFileClip(video_path) as video:
-                    segments = [(0, video.duration)]
-            
-            return segments
-            
-        except Exception as e:
-            print(f"🚨 Error during scene detection for {video_path}: {str(e)}")
-            # 오류 발생 시 전체 비디오를 하나의 세그먼트로
-            with VideoFileClip(video_path) as video:
-                return [(0, video.duration)]
+        segments = self._get_cached(video_path)
+        if segments is None:
+            try:
+                # Scene detection 실행
+                scenes, _ = _detect_scenes(video_path, self.threshold, self.min_scene_len, self.downscale)
+            except Exception as e:
+                print(f"🚨 Error during scene detection for {video_path}: {str(e)}")
+                # 오류 발생 시 전체 비디오를 하나의 세그먼트로 (캐시하지 않음)
+                return [(0, self.metadata_cache.get(video_path)['duration'])]
+            segments = self._store(video_path, scenes)
+            if self.scene_cache is not None:
+                self.scene_cache.save()
+        return segments
+
+    def get_segments_many(self, video_paths):
+        """여러 비디오의 장면을 프로세스 풀에서 병렬로 검출 (캐시된 비디오는 건너뜀)"""
+        results, pending = {}, []
+        for video_path in video_paths:
+            segments = self._get_cached(video_path)
+            if segments is None:
+                pending.append(video_path)
+            else:
+                results[video_path] = segments
+        if len(results):
+            print(f"♻️ 장면 캐시 사용: {len(results)}개 비디오")
+        if not pending:
+            return results
+
+        wall_start = time.time()
+        detect_time = 0.0
+        ctx = mp.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max(1, self.num_workers), mp_context=ctx) as executor:
+            futures = {
+                executor.submit(_detect_scenes, video_path, self.threshold, self.min_scene_len, self.downscale): video_path
+                for video_path in pending
+            }
+            for future in tqdm(as_completed(futures), total=len(futures), desc="장면 검출"):
+                video_path = futures[future]
+                try:
+                    scenes, elapsed = future.result()
+                except Exception as e:
+                    print(f"🚨 Error during scene detection for {video_path}: {str(e)}")
+                    try:
+                        results[video_path] = [(0, self.metadata_cache.get(video_path)['duration'])]
+                    except Exception as e:
+                        print(f"⚠️ {os.path.basename(video_path)} 세그먼트 생성 실패: {str(e)}")
+                    continue
+                detect_time += elapsed
+                results[video_path] = self._store(video_path, scenes)
+                tqdm.write(f"  • {os.path.basename(video_path)}: 장면 {len(scenes)}개, {elapsed:.1f}초")
+
+        if self.scene_cache is not None:
+            self.scene_cache.save()
+        self.metadata_cache.save()
+        wall_time = time.time() - wall_start
+        print(f"✓ 장면 검출: {len(pending)}개 비디오, 검출 시간 합계 {detect_time:.1f}초, "
+              f"실제 소요 {wall_time:.1f}초 (워커 {self.num_workers}개)")
+        return results
+
+    def _get_cached(self, video_path):
+        if self.scene_cache is None:
+            return None
+        return self.scene_cache.get(video_path, self.params_key)
+
+    def _store(self, video_path, scenes):
+        """검출 결과를 캐시에 넣고 세그먼트로 반환 (장면이 없으면 전체 비디오)"""
+        if self.scene_cache is not None:
+            self.scene_cache.put(video_path, self.params_key, scenes)
+        if not scenes:
+            print(f"⚠️ No scenes detected in {video_path}, using entire video")
+            return [(0, self.metadata_cache.get(video_path)['duration'])]
+        return scenes
 
 class ShotBoundarySegmenter(VideoSegmenter):
-    """Shot boundary detection을 사용하여 비디오를 나누는 세그멘터"""
+    """Shot boundary detection을 사용하여 비디오를 나누는 세그멘터
+
+    기본 경로는 decord로 축소 해상도(downscale_width) 디코딩 후, frame_skip 간격으로 샘플링한 프레임들을
+    청크 단위로 한 번에 비교해 후보 구간(차이가 threshold * candidate_ratio 초과)을 고른다.
+    축소 해상도의 차이 값은 전체 해상도와 크기가 다르므로 경계 판정에는 쓰지 않고, 후보 구간만
+    전체 해상도 연속 프레임으로 다시 읽어 전체 해상도 경로와 같은 기준(threshold)으로 경계 프레임을 찾는다.
+    downscale_width=None이면 원래의 전체 해상도 cv2 경로를 사용한다.
+    """
     
-    def __init__(self, threshold=30, min_segment_length=1):
+    def __init__(self, threshold=30, min_segment_length=1, metadata_cache=None,
+                 downscale_width=160, frame_skip=4, candidate_ratio=0.5, chunk_size=256):
         self.threshold = threshold
         self.min_segment_length = min_segment_length
+        self.metadata_cache = metadata_cache or get_metadata_cache()
+        self.downscale_width = downscale_width
+        self.frame_skip = max(1, frame_skip)
+        self.candidate_ratio = candidate_ratio
+        self.chunk_size = chunk_size
     
     def get_segments(self, video_path):
+        detection = None
+        if self.downscale_width:
+            try:
+                detection = self._detect_cuts_fast(video_path)
+            except Exception as e:
+                print(f"⚠️ Fast shot detection failed for {video_path}, using full-resolution path: {str(e)}")
+        if detection is None:
+            detection = self._detect_cuts_full(video_path)
+
+        segments = []
+        if detection is not None:
+            cut_frames, frame_count, fps = detection
+            segments = self._build_segments(cut_frames, frame_count, fps)
+        
+        # 빈 세그먼트 리스트인 경우 전체 비디오를 하나의 세그먼트로
+        if not segments:
+            print(f"⚠️ No segments detected for {video_path}, using entire video")
+            segments = [(0, self.metadata_cache.get(video_path)['duration'])]
+        
+        return segments
+
+    def _build_segments(self, cut_frames, frame_count, fps):
+        """경계 프레임 인덱스를 (start_time, end_time) 세그먼트로 변환"""
+        segments = []
+        start_time = 0
+        for cut_frame in cut_frames:
+            end_time = cut_frame / fps
+            if end_time - start_time >= self.min_segment_length:
+                segments.append((start_time, end_time))
+            start_time = end_time
+        
+        # 마지막 세그먼트 추가
+        end_time = frame_count / fps
+        if end_time - start_time >= self.min_segment_length:
+            segments.append((start_time, end_time))
+        return segments
+
+    @staticmethod
+    def _to_gray(frames):
+        """(N, H, W, 3) RGB uint8 -> (N, H, W) 그레이스케일 (cv2.COLOR_BGR2GRAY와 같은 14비트 고정소수점 계산)"""
+        gray = frames.astype(np.int32) @ np.array([4899, 9617, 1868], dtype=np.int32)
+        return ((gray + (1 << 13)) >> 14).astype(np.int16)
+
+    def _detect_cuts_fast(self, video_path):
+        """축소 해상도 + 프레임 간격 샘플링 + 후보 구간 정밀 탐색으로 경계 프레임 검출"""
+        metadata = self.metadata_cache.get(video_path)
+        width, height = metadata['width'], metadata['height']
+        if width > self.downscale_width:
+            target_width = self.downscale_width
+            target_height = max(2, int(round(height * target_width / width / 2)) * 2)
+        else:
+            target_width, target_height = -1, -1  # 원본 크기 그대로
+
+        vr = decord.VideoReader(video_path, ctx=decord.cpu(0), width=target_width, height=target_height)
+        fps = vr.get_avg_fps()
+        total_frames = len(vr)
+        if total_frames == 0:
+            return [], 0, fps
+
+        sample_indices = list(range(0, total_frames, self.frame_skip))
+        if sample_indices[-1] != total_frames - 1:
+            sample_indices.append(total_frames - 1)
+
+        candidate_threshold = self.threshold * self.candidate_ratio
+        candidates = []
+        prev_gray, prev_index = None, None
+        for i in range(0, len(sample_indices), self.chunk_size):
+            chunk_indices = sample_indices[i:i + self.chunk_size]
+            gray = self._to_gray(vr.get_batch(chunk_indices).asnumpy())
+            if prev_gray is not None:
+                gray = np.concatenate([prev_gray[None], gray])
+                chunk_indices = [prev_index] + chunk_indices
+
+            # 인접 샘플 간 평균 절대 차이를 청크 전체에 대해 한 번에 계산
+            scores = np.abs(gray[1:] - gray[:-1]).mean(axis=(1, 2))
+            candidates.extend((chunk_indices[k], chunk_indices[k + 1])
+                              for k in np.nonzero(scores > candidate_threshold)[0])
+
+            prev_gray, prev_index = gray[-1], chunk_indices[-1]
+
+        cut_frames = []
+        if candidates:
+            full_vr = decord.VideoReader(video_path, ctx=decord.cpu(0))
+            for a, b in candidates:
+                cut_frames.extend(self._refine_cuts(full_vr, a, b))
+        return cut_frames, total_frames, fps
+
+    def _refine_cuts(self, vr, start_index, end_index):
+        """후보 구간 [start_index, end_index]의 전체 해상도 연속 프레임을 비교해 실제 경계 프레임 반환"""
+        indices = list(range(start_index, end_index + 1))
+        gray = self._to_gray(vr.get_batch(indices).asnumpy())
+        scores = np.abs(gray[1:] - gray[:-1]).mean(axis=(1, 2))
+        return [indices[k + 1] for k in np.nonzero(scores > self.threshold)[0]]
+
+    def _detect_cuts_full(self, video_path):
+        """전체 해상도 프레임을 cv2로 하나씩 읽어 비교 (기존 방식)"""
         cap = cv2.VideoCapture(video_path)
         fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        segments = []
         
         if not cap.isOpened():
             print(f"🚨 Error: Could not open video {video_path}")
-            return segments
+            return None
         
+        cut_frames = []
+        frame_count = 0
         try:
             prev_frame = None
-            start_time = 0
-            frame_count = 0
             
             while frame_count < total_frames:  # total_frames로 체크
                 ret, frame = cap.read()
@@ -175,38 +437,78 @@ class ShotBoundarySegmenter(VideoSegmenter):
                     
                     # Shot boundary 감지
                     if score > self.threshold:
-                        end_time = frame_count / fps
-                        if end_time - start_time >= self.min_segment_length:
-                            segments.append((start_time, end_time))
-                        start_time = end_time
+                        cut_frames.append(frame_count)
                 
                 prev_frame = frame_gray  # 그레이스케일 이미지 저장
                 frame_count += 1
             
-            # 마지막 세그먼트 추가
-            end_time = frame_count / fps
-            if end_time - start_time >= self.min_segment_length:
-                segments.append((start_time, end_time))
-            
         except Exception as e:
             print(f"🚨 Error processing video {video_path}: {str(e)}")
         
         finally:
             cap.release()
         
-        # 빈 세그먼트 리스트인 경우 전체 비디오를 하나의 세그먼트로
-        if not segments:
-            print(f"⚠️ No segments detected for {video_path}, using entire video")
-            segments = [(0, total_frames / fps)]
-        
+        return cut_frames, frame_count, fps
+
+class KeyframeAlignedSegmenter(VideoSegmenter):
+    """경계를 키프레임에 맞추는 세그멘터 (스트림 복사만으로 정확히 자를 수 있음)
+
+    segment_duration 간격의 목표 시각마다 tolerance(초) 이내의 가장 가까운 키프레임을 경계로 쓰고,
+    없으면 목표 시각 이후 첫 키프레임을 쓴다. 키프레임 시각은 ffprobe 패킷 플래그에서 읽어
+    메타데이터 캐시에 저장하며, 세그먼트에는 키프레임의 정확한 시각이 기록된다.
+    """
+
+    keyframe_aligned = True
+
+    def __init__(self, segment_duration=5, tolerance=1.0, min_segment_length=1, metadata_cache=None):
+        self.segment_duration = segment_duration
+        self.tolerance = tolerance
+        self.min_segment_length = min_segment_length
+        self.metadata_cache = metadata_cache or get_metadata_cache()
+
+    def get_segments(self, video_path):
+        metadata = self.metadata_cache.get(video_path, with_keyframes=True)
+        duration = metadata['duration']
+        keyframes = [t for t in metadata['keyframes'] if 0 <= t < duration]
+        if not keyframes:
+            print(f"⚠️ No keyframes found in {video_path}, using fixed-duration segments")
+            return FixedDurationSegmenter(self.segment_duration, self.metadata_cache).get_segments(video_path)
+
+        boundaries = [keyframes[0]]
+        while boundaries[-1] + self.segment_duration < duration:
+            boundary = self._next_boundary(keyframes, boundaries[-1])
+            if boundary is None:
+                break
+            boundaries.append(boundary)
+
+        segments = list(zip(boundaries, boundaries[1:] + [duration]))
+        # 마지막 구간이 너무 짧으면 앞 구간에 합친다
+        if len(segments) > 1 and segments[-1][1] - segments[-1][0] < self.min_segment_length:
+            segments[-2:] = [(segments[-2][0], segments[-1][1])]
         return segments
 
+    def _next_boundary(self, keyframes, start):
+        """start 다음 경계 키프레임 (목표 시각 근처, 최소 길이 보장), 없으면 None"""
+        target = start + self.segment_duration
+        first = bisect.bisect_right(keyframes, start + self.min_segment_length - 1e-6)
+        if first >= len(keyframes):
+            return None
+
+        position = bisect.bisect_left(keyframes, target, lo=first)
+        candidates = [keyframes[i] for i in (position - 1, position) if first <= i < len(keyframes)]
+        nearest = min(candidates, key=lambda t: abs(t - target))
+        if abs(nearest - target) <= self.tolerance:
+            return nearest
+        # 허용 범위 안에 키프레임이 없으면 목표 시각 이후 첫 키프레임
+        return keyframes[position] if position < len(keyframes) else None
+
+
 # Factory 패턴을 사용하여 세그멘터 생성
 def create_segmenter(method="fixed", **kwargs):
     """세그멘터 생성 함수
     
     Args:
-        method (str): 세그멘테이션 방법 ("fixed", "scene", "shot")
+        method (str): 세그멘테이션 방법 ("fixed", "scene", "shot", "keyframe")
         **kwargs: 각 세그멘터의 파라미터
     
     Returns:
@@ -215,7 +517,8 @@ def create_segmenter(method="fixed", **kwargs):
     segmenters = {
         "fixed": FixedDurationSegmenter,
         "scene": SceneDetectionSegmenter,
-        "shot": ShotBoundarySegmenter
+        "shot": ShotBoundarySegmenter,
+        "keyframe": KeyframeAlignedSegmenter
     }
     
     if method not in segmenters:
@@ -1,16 +1,22 @@
 import os
 import json
+import hashlib
 import torch
 import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, wait
 from tqdm import tqdm
 from contextlib import contextmanager, redirect_stdout, redirect_stderr
-from PIL import Image
 from transformers import AutoTokenizer, AutoProcessor, AutoConfig, AutoModel
-from decord import VideoReader, cpu
-from moviepy import VideoFileClip
 from utils.translator import DeepLTranslator, DeepGoogleTranslator
-from utils.tarsier_utils import load_model_and_processor
+from utils.tarsier_utils import load_model_and_processor, Processor, AdaptiveBatchGenerator
 from utils.video_split import create_segmenter
+from utils.video_metadata import get_metadata_cache
+from utils.staged_pipeline import StagedCaptioningPipeline
+from utils.caption_cache import CaptionCache
+from utils.feature_cache import FrameFeatureCache
+from utils.static_segments import StaticSegmentDetector, frame_signature
+from utils.checkpoint import JsonlCheckpoint, segment_key, compact_checkpoint
 
 @contextmanager
 def suppress_output():
@@ -27,20 +33,106 @@ def find_video_file(videos_dir, video_name):
     return None
 
 
+CAPTION_INSTRUCTION = "<video>\nDescribe the video in detail."
+
+# 디코딩 워커 프로세스 전용 전처리기 (init_decode_worker에서 생성)
+_worker_processor = None
+_worker_signature_size = None
+
+def init_decode_worker(model_path, max_n_frames, signature_size=None):
+    """디코딩 워커 초기화: 모델 없이 전처리기(토크나이저 + 이미지 프로세서)만 로드
+
+    signature_size가 있으면 정적 세그먼트 검출용 프레임 시그니처도 워커에서 계산한다.
+    """
+    global _worker_processor, _worker_signature_size
+    with suppress_output():
+        _worker_processor = Processor(model_path, max_n_frames=max_n_frames)
+    _worker_signature_size = signature_size
+
+def prepare_segment_inputs(job):
+    """(video_path, segments) 작업의 각 세그먼트를 모델 입력으로 변환 (워커 프로세스에서 실행)"""
+    video_path, segments = job
+    for (start_time, end_time), images, frame_indices in _worker_processor.iter_segment_images(video_path, segments, return_indices=True):
+        inputs = _worker_processor(CAPTION_INSTRUCTION, images=images, edit_prompt=True)
+        inputs['video_path'], inputs['frame_indices'] = video_path, frame_indices
+        if _worker_signature_size:
+            inputs['signature'] = frame_signature(images, _worker_signature_size)
+        yield (video_path, start_time, end_time), inputs
+
+
 class TarsierVideoCaptioningPipeline:
     def __init__(self, model_path, keep_clips=False, segmentation_method="fixed", 
-                 segmentation_params=None, mode='video2text', video_metadata=None, clips_dir=None):
+                 segmentation_params=None, mode='video2text', video_metadata=None, clips_dir=None,
+                 num_decode_workers=0, batch_size=1, caption_cache_path="cache/caption_cache.db",
+                 feature_cache_dir="cache/frame_features", feature_cache_memory_gb=None, feature_cache_disk_gb=20.0,
+                 static_threshold=0.03):
         # Model initialization
-        self.model, self.processor = load_model_and_processor(model_path, max_n_frames=8)
+        self.model_path = model_path
+        self.max_n_frames = 8
+        self.model, self.processor = load_model_and_processor(model_path, max_n_frames=self.max_n_frames)
         self.model.eval()
+
+        # 0보다 크면 process_directory에서 디코딩 워커 프로세스와 모델 생성을 겹쳐 실행
+        self.num_decode_workers = num_decode_workers
+
+        # 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+        self.caption_cache = CaptionCache(caption_cache_path) if caption_cache_path else None
+
+        # 프레임 특징 캐시: 같은 프레임(영상 내용, 프레임 인덱스, 전처리 설정)은 vision tower를 다시 돌리지 않는다
+        # 기본은 끔: 특징 하나가 수 MB라 RAM이 금방 차고 이후 put마다 생성 경로에서 디스크에 쓰는데,
+        # instruction 하나로 겹치지 않는 구간을 처리하는 보통의 실행에서는 다시 쓰이는 프레임이 없다.
+        # 여러 instruction이나 겹치는 구간으로 같은 영상을 다시 돌릴 때만 feature_cache_memory_gb를 지정한다.
+        self.feature_cache = None
+        if feature_cache_memory_gb:
+            self.feature_cache = FrameFeatureCache(
+                config={
+                    "model": os.path.abspath(model_path),
+                    "vision_feature_layer": self.model.config.vision_feature_layer,
+                    "vision_feature_select_strategy": self.model.config.vision_feature_select_strategy,
+                    **self.processor.preprocess_config(),
+                },
+                max_memory_gb=feature_cache_memory_gb,
+                disk_dir=feature_cache_dir,
+                max_disk_gb=feature_cache_disk_gb,
+                hash_fn=self.caption_cache.content_hash if self.caption_cache else None,
+            )
+
+        # 정적 세그먼트 검출: 직전에 생성한 세그먼트와 거의 같으면 캡션을 재사용 (None이면 사용 안 함)
+        self.static_detector = StaticSegmentDetector(threshold=static_threshold) if static_threshold else None
+
+        # 왼쪽 패딩 배치 생성기 (batch_size는 디코딩 워커 사용 시 한 번에 생성할 최대 세그먼트 수)
+        self.batch_size = batch_size
+        self.batch_generator = AdaptiveBatchGenerator(
+            self.model, self.processor,
+            max_batch_size=batch_size,
+            feature_cache=self.feature_cache,
+            do_sample=True,
+            max_new_tokens=512,
+            top_p=0.9,
+            temperature=0.8,
+            use_cache=True
+        )
+
+        self.generation_config = {
+            "model": os.path.abspath(model_path),
+            "instructions": [CAPTION_INSTRUCTION],
+            "n_frames": self.max_n_frames,
+            **{k: v for k, v in self.batch_generator.generate_kwargs.items() if k != 'use_cache'},
+        }
         
         self.keep_clips = keep_clips
         self.mode = mode
+
+        # keep_clips인 경우에만 클립을 백그라운드에서 저장 (캡션 생성은 원본에서 직접 프레임 샘플링)
+        self.clip_executor = ThreadPoolExecutor(max_workers=2) if keep_clips else None
+        self.clip_futures = []
         
-        # 세그멘터 초기화
+        # 세그멘터 초기화 (비디오 길이 등은 공유 메타데이터 캐시에서 읽음)
+        self.metadata_cache = get_metadata_cache()
         segmentation_params = segmentation_params or {}
         self.segmenter = create_segmenter(
             method=segmentation_method, 
+            metadata_cache=self.metadata_cache,
             **segmentation_params
         )
         
@@ -62,16 +154,29 @@ class TarsierVideoCaptioningPipeline:
         """Generate segments for a video using the selected segmentation method"""
         return self.segmenter.get_segments(video_path)
 
-    def generate_caption(self, video_path):
-        """Generate caption for a video clip using Tarsier"""
+    def generate_caption(self, video_path, start_time=0, end_time=-1, images=None, frame_indices=None):
+        """Generate caption for a video segment using Tarsier
+
+        프레임은 원본 비디오의 (start_time, end_time) 구간에서 직접 샘플링하며,
+        모든 instruction이 같은 프레임을 공유한다. 이미 샘플링된 images가 주어지면 그대로 사용한다.
+        """
         instructions = [
-            "<video>\nDescribe the video in detail."
+            CAPTION_INSTRUCTION
         ]
         
+        if images is None:
+            try:
+                images, frame_indices = self.processor.load_images(
+                    video_path, start_time=start_time, end_time=end_time, return_indices=True
+                )
+            except Exception as e:
+                print(f"🚨 프레임 샘플링 오류: {str(e)}")
+                return ""
+
         captions = []
         for instruction in instructions:
             try:
-                caption = self._generate_single_caption(video_path, instruction)
+                caption = self._generate_single_caption(images, instruction, video_path, frame_indices)
                 captions.append(caption)
             except Exception as e:
                 print(f"🚨 캡션 생성 오류: {str(e)}")
@@ -81,31 +186,76 @@ class TarsierVideoCaptioningPipeline:
         final_caption = " ".join(captions)
         return final_caption
 
-    def _generate_single_caption(self, video_path, instruction):
-        """Generate a single caption with given instruction"""
-        inputs = self.processor(instruction, video_path, edit_prompt=True, return_prompt=True)
+    def _generate_single_caption(self, images, instruction, video_path=None, frame_indices=None):
+        """Generate a single caption with given instruction
+
+        video_path와 frame_indices가 있으면 프레임 특징 캐시를 사용한다 (instruction이 달라도 같은 프레임은 재사용).
+        """
+        inputs = self.processor(instruction, images=images, edit_prompt=True, return_prompt=True)
         if 'prompt' in inputs:
             inputs.pop('prompt')
-        
-        inputs = {k: v.to(self.model.device) for k, v in inputs.items() if v is not None}
-        
-        outputs = self.model.generate(
-            **inputs,
-            do_sample=True,
-            max_new_tokens=512,
-            top_p=0.9,
-            temperature=0.8,
-            use_cache=True
-        )
-        
-        output_text = self.processor.tokenizer.decode(
-            outputs[0][inputs['input_ids'][0].shape[0]:], 
-            skip_special_tokens=True
-        )
-        return output_text
+        inputs['video_path'], inputs['frame_indices'] = video_path, frame_indices
+        return self._generate_from_inputs(inputs)
+
+    def _generate_from_inputs(self, inputs):
+        """전처리된 입력(input_ids, pixel_values)으로 캡션 생성"""
+        return self.batch_generator.generate([inputs])[0]
 
-    def process_video(self, video_path, start_time, end_time):
+    def process_video(self, video_path, start_time, end_time, images=None, frame_indices=None):
         """Process a video segment and generate caption"""
+        caption = self._get_cached_caption(video_path, start_time, end_time)
+        if caption is not None:
+            return self._build_result(video_path, start_time, end_time, caption)
+        return self._caption_segment(video_path, start_time, end_time, images=images, frame_indices=frame_indices)
+
+    def _caption_segment(self, video_path, start_time, end_time, images=None, frame_indices=None):
+        """캐시 조회 없이 캡션을 생성하고 캐시에 저장한 뒤 결과 생성"""
+        # Generate caption (원본 비디오에서 구간 프레임을 직접 샘플링)
+        with suppress_output():  # 캡션 생성 로그 억제
+            caption = self.generate_caption(video_path, start_time, end_time, images=images, frame_indices=frame_indices)
+        if not caption:
+            return None
+        self._put_cached_caption(video_path, start_time, end_time, caption)
+
+        return self._build_result(video_path, start_time, end_time, caption)
+
+    def _get_cached_caption(self, video_path, start_time, end_time):
+        if self.caption_cache is None:
+            return None
+        try:
+            return self.caption_cache.get(video_path, start_time, end_time, self.generation_config)
+        except Exception as e:
+            print(f"⚠️ 캡션 캐시 조회 실패: {str(e)}")
+            return None
+
+    def _put_cached_caption(self, video_path, start_time, end_time, caption):
+        if self.caption_cache is None:
+            return
+        try:
+            self.caption_cache.put(video_path, start_time, end_time, self.generation_config, caption)
+        except Exception as e:
+            print(f"⚠️ 캡션 캐시 저장 실패: {str(e)}")
+
+    def _filter_cached_segments(self, video_path, segments, on_segment_done=None):
+        """캐시된 세그먼트는 바로 결과를 만들고, 생성이 필요한 세그먼트만 반환"""
+        uncached_segments = []
+        results = []
+        for start_time, end_time in segments:
+            caption = self._get_cached_caption(video_path, start_time, end_time)
+            if caption is None:
+                uncached_segments.append((start_time, end_time))
+                continue
+            result = self._build_result(video_path, start_time, end_time, caption)
+            results.append(result)
+            if on_segment_done:
+                on_segment_done(video_path, start_time, end_time, result)
+        return uncached_segments, results
+
+    def _build_result(self, video_path, start_time, end_time, caption, linked_result=None):
+        """생성된 캡션으로 번역, 클립 저장, 결과/매핑 항목 생성
+
+        linked_result가 있으면 정적 세그먼트로 보고 그 결과의 캡션/번역을 재사용하며 static_of에 원래 구간을 남긴다.
+        """
         video_name = os.path.basename(video_path)  # video_XXX.mp4
         if video_name.startswith('video_'):
             video_id = video_name.split('.')[0]  # video_XXX 부분 추출 (확장자 제거)
@@ -114,44 +264,43 @@ class TarsierVideoCaptioningPipeline:
 
         clip_id = f"{video_id}_{int(start_time)}_{int(end_time)}"  # 클립 ID 형식 변경
         
-        # Extract clip
-        clip_path = os.path.join(self.clips_dir, f"{clip_id}.mp4")  # 여기서 클립 파일명 결정
-        try:
-            with suppress_output(), VideoFileClip(video_path) as video:
-                clip = video.subclipped(start_time, end_time)
-                clip.write_videofile(clip_path, codec='libx264', audio=False)
-        except Exception as e:
-            print(f"🚨 클립 추출 오류: {str(e)}")
-            return None
+        # 클립 파일은 keep_clips인 경우에만 백그라운드에서 저장
+        clip_path = None
+        if self.keep_clips:
+            clip_path = os.path.join(self.clips_dir, f"{clip_id}.mp4")  # 여기서 클립 파일명 결정
+            self.clip_futures.append(
+                self.clip_executor.submit(self._save_clip, video_path, clip_path, start_time, end_time)
+            )
         
         # 메타데이터 가져오기
         metadata = self.video_metadata.get(video_name, {})
 
-        # Generate caption
-        with suppress_output():  # 캡션 생성 로그 억제
-            caption = self.generate_caption(clip_path)
-        if not caption:
-            return None
-            
         # Translate caption to Korean if in video2text mode
         caption_ko = None
-        if self.mode == "video2text":
+        if linked_result is not None:
+            caption_ko = linked_result.get("caption_ko")
+        elif self.mode == "video2text":
             caption_ko = self.translator.translate_en_to_ko(caption)
         
+        # 키프레임 정렬 세그먼트는 클립을 -c copy로 자르므로 경계를 반올림하지 않고 정확히 기록
+        time_format = ".6f" if self.segmenter.keyframe_aligned else ".2f"
+
         # Create result entry with metadata
         result = {
             "video_path": f"video_{video_id}/{self.clip_counter:05d}.mp4",
             "video_id": metadata.get('video_id', ''),
             "title": metadata.get('title', video_id),
             "url": metadata.get('url', ''),
-            "start_time": f"{start_time:.2f}",
-            "end_time": f"{end_time:.2f}",
+            "start_time": f"{start_time:{time_format}}",
+            "end_time": f"{end_time:{time_format}}",
             "caption": caption,
             "clip_path": clip_path  # 실제 저장된 클립 경로 추가
         }
         
         if caption_ko:
             result["caption_ko"] = caption_ko
+        if linked_result is not None:
+            result["static_of"] = [linked_result["start_time"], linked_result["end_time"]]
         
         # Update video mapping
         if video_id not in self.video_mapping:
@@ -168,27 +317,110 @@ class TarsierVideoCaptioningPipeline:
         })
         
         self.clip_counter += 1
-        
-        # keep_clips가 False인 경우에만 삭제
-        if not self.keep_clips and os.path.exists(clip_path):
-            os.remove(clip_path)
             
         return result
 
+    def _save_clip(self, video_path, clip_path, start_time, end_time):
+        """구간 클립을 저장 (백그라운드 스레드에서 실행)
+
+        경계가 키프레임이면 재인코딩 없이 스트림 복사, 아니면 libx264로 인코딩한다.
+        """
+        if self.segmenter.keyframe_aligned:
+            codec_args = ["-c", "copy", "-an", "-avoid_negative_ts", "make_zero"]
+        else:
+            codec_args = ["-c:v", "libx264", "-an"]
+        command = [
+            "ffmpeg",
+            "-ss", str(start_time),
+            "-i", video_path,
+            "-t", str(end_time - start_time),
+            *codec_args,
+            clip_path,
+            "-y"
+        ]
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            print(f"🚨 클립 저장 오류: {clip_path}")
+        return clip_path
+
+    def wait_for_clips(self):
+        """백그라운드에서 저장 중인 클립이 모두 완료될 때까지 대기"""
+        if self.clip_futures:
+            wait(self.clip_futures)
+            self.clip_futures = []
+
+    def process_video_segments(self, video_path, segments, on_segment_done=None):
+        """한 비디오의 모든 세그먼트를 디코더 하나로 처리 (캐시된 세그먼트는 디코딩/생성 생략)
+
+        Returns:
+            list: 세그먼트별 결과 (실패한 세그먼트는 None)
+        """
+        segments, results = self._filter_cached_segments(video_path, segments, on_segment_done)
+        if not segments:
+            return results
+        processed = 0
+        try:
+            segment_images = self.processor.iter_segment_images(video_path, segments, return_indices=True)
+            for (start_time, end_time), images, frame_indices in segment_images:
+                anchor, signature = None, None
+                if self.static_detector is not None:
+                    signature = self.static_detector.signature(images)
+                    anchor = self.static_detector.match(video_path, (start_time, end_time), signature)
+
+                if anchor is not None and anchor['result'] is not None:
+                    result = self._link_static_segment(video_path, start_time, end_time, anchor)
+                    self.static_detector.record_reuse()
+                else:
+                    generate_start = time.time()
+                    result = self._caption_segment(video_path, start_time, end_time, images=images, frame_indices=frame_indices)
+                    if self.static_detector is not None:
+                        self.static_detector.record_generation(time.time() - generate_start)
+                        if result is not None:
+                            anchor = self.static_detector.set_anchor(video_path, (start_time, end_time), signature)
+                            anchor.update(caption=result['caption'], result=result)
+                results.append(result)
+                processed += 1
+                if on_segment_done:
+                    on_segment_done(video_path, start_time, end_time, result)
+        except Exception as e:
+            print(f"🚨 프레임 샘플링 오류: {video_path} - {str(e)}")
+            for start_time, end_time in segments[processed:]:
+                results.append(None)
+                if on_segment_done:
+                    on_segment_done(video_path, start_time, end_time, None)
+        if self.static_detector is not None:
+            self.static_detector.forget(video_path)
+        return results
+
+    def _link_static_segment(self, video_path, start_time, end_time, anchor):
+        """anchor 세그먼트의 캡션을 정적 세그먼트 결과로 재사용
+
+        재사용한 캡션은 이 구간에서 생성한 것이 아니고 static_threshold에 따라 달라지므로 캡션 캐시에 넣지 않는다.
+        """
+        return self._build_result(video_path, start_time, end_time, anchor['caption'], linked_result=anchor['result'])
+
     def process_videos(self, video_list):
-        """Process list of videos"""
-        results = []
+        """Process list of videos (같은 원본 비디오의 구간은 묶어서 처리)"""
+        video_segments = {}
         for video_path, start_time, end_time in video_list:
-            result = self.process_video(video_path, start_time, end_time)
-            if result:
-                results.append(result)
+            video_segments.setdefault(video_path, []).append((start_time, end_time))
+
+        results = []
+        for video_path, segments in video_segments.items():
+            results.extend(r for r in self.process_video_segments(video_path, segments) if r)
         return results
 
-    def process_directory(self, videos_dir):
-        """Process all videos in directory with detailed monitoring"""
+    def process_directory(self, videos_dir, checkpoint_path=None):
+        """Process all videos in directory with detailed monitoring
+
+        완료된 세그먼트는 checkpoint_path(JSONL, 기본값은 videos_dir마다 따로)에 바로 기록되며, 다시 실행하면
+        기록된 세그먼트는 건너뛰고 이전 결과를 포함해 반환한다. 이번 실행의 세그먼트에 해당하지 않는
+        기록(지워지거나 바뀐 비디오의 이전 결과)은 반환하지 않는다.
+        """
         video_stats = {
             'total_videos': 0,
             'total_segments': 0,
+            'total_resumed': 0,
             'total_duration': 0,
             'clip_extraction_time': 0,
             'caption_generation_time': 0,
@@ -201,14 +433,11 @@ class TarsierVideoCaptioningPipeline:
         analysis_start = time.time()
         video_files = [f for f in os.listdir(videos_dir) if f.endswith(('.mp4', '.avi', '.mov'))]
         
-        for file in tqdm(video_files, desc="비디오 정보 수집"):
-            try:
-                with suppress_output():  # VideoFileClip 로그 억제
-                    with VideoFileClip(os.path.join(videos_dir, file)) as video:
-                        video_stats['total_duration'] += video.duration
-                        video_stats['total_videos'] += 1
-            except Exception as e:
-                print(f"⚠️ {file} 분석 실패: {str(e)}")
+        # ffprobe 메타데이터를 병렬로 수집 (파일이 바뀌지 않았으면 캐시 재사용)
+        video_infos = self.metadata_cache.get_many([os.path.join(videos_dir, f) for f in video_files])
+        for metadata in video_infos.values():
+            video_stats['total_duration'] += metadata['duration']
+            video_stats['total_videos'] += 1
         
         analysis_time = time.time() - analysis_start
         print(f"✓ 비디오 분석 완료 ({analysis_time:.1f}초)")
@@ -218,42 +447,88 @@ class TarsierVideoCaptioningPipeline:
         # 2. 세그먼트 생성
         print("\n🔄 세그먼트 분할 중...")
         segment_start = time.time()
-        video_list = []
-        
-        for file in tqdm(video_files, desc="세그먼트 생성"):
+        # 세그멘터가 여러 비디오를 한 번에 처리 (scene 방식은 프로세스 풀 + 장면 캐시 사용)
+        segments_by_video = self.segmenter.get_segments_many(
+            [os.path.join(videos_dir, file) for file in video_files]
+        )
+        video_segments = []
+        for file in video_files:
             video_path = os.path.join(videos_dir, file)
-            try:
-                with suppress_output():  # 세그먼터 로그 억제
-                    segments = self.segmenter.get_segments(video_path)
-                    video_stats['total_segments'] += len(segments)
-                    video_list.extend([(video_path, start, end) for start, end in segments])
-            except Exception as e:
-                print(f"⚠️ {file} 세그먼트 생성 실패: {str(e)}")
+            if video_path in segments_by_video:
+                segments = segments_by_video[video_path]
+                video_stats['total_segments'] += len(segments)
+                video_segments.append((video_path, segments))
         
         segment_time = time.time() - segment_start
         print(f"✓ 세그먼트 생성 완료 ({segment_time:.1f}초)")
         print(f"• 총 세그먼트: {video_stats['total_segments']}개")
         print(f"• 평균 세그먼트/비디오: {video_stats['total_segments']/video_stats['total_videos']:.1f}개")
 
-        # 3. 비디오 처리
-        results = []
+        # 3. 체크포인트에서 이전 실행 결과 복구
+        checkpoint = JsonlCheckpoint(checkpoint_path or self.default_checkpoint_path(videos_dir))
+        results = [
+            checkpoint.records[key] for key in (
+                segment_key(video_path, start_time, end_time)
+                for video_path, segments in video_segments for start_time, end_time in segments
+            ) if checkpoint.is_done(key)
+        ]
+        # 클립 번호는 체크포인트의 모든 기록 이후부터 매겨 이전 클립 경로와 겹치지 않게 한다
+        self.clip_counter = max(self.clip_counter, len(checkpoint.records))
+        pending_video_segments = []
+        for video_path, segments in video_segments:
+            pending = [
+                (start_time, end_time) for start_time, end_time in segments
+                if not checkpoint.is_done(segment_key(video_path, start_time, end_time))
+            ]
+            video_stats['total_resumed'] += len(segments) - len(pending)
+            if pending:
+                pending_video_segments.append((video_path, pending))
+        video_segments = pending_video_segments
+        if video_stats['total_resumed']:
+            print(f"♻️ 체크포인트에서 {video_stats['total_resumed']}개 세그먼트 복구 (건너뜀)")
+
+        # 4. 비디오 처리
         print("\n🎬 비디오 처리 중...")
         process_start = time.time()
         
-        pbar = tqdm(total=len(video_list), desc="세그먼트 처리")
-        for video_path, start_time, end_time in video_list:
-            clip_start = time.time()
-            with suppress_output():  # 비디오 처리 로그 억제
-                result = self.process_video(video_path, start_time, end_time)
-            
+        pbar = tqdm(total=video_stats['total_segments'] - video_stats['total_resumed'], desc="세그먼트 처리")
+
+        def on_segment_done(video_path, start_time, end_time, result):
             if result:
+                # 성공한 세그먼트만 기록 (실패한 세그먼트는 다음 실행에서 재시도)
+                checkpoint.append(segment_key(video_path, start_time, end_time), result)
                 results.append(result)
                 video_stats['total_success'] += 1
             else:
                 video_stats['total_failed'] += 1
-                
-            video_stats['clip_extraction_time'] += time.time() - clip_start
             pbar.update(1)
+
+        if self.num_decode_workers > 0:
+            # 디코딩 워커 프로세스들과 모델 생성, 후처리를 겹쳐서 실행
+            uncached_video_segments = []
+            for video_path, segments in video_segments:
+                segments, _ = self._filter_cached_segments(video_path, segments, on_segment_done)
+                if segments:
+                    uncached_video_segments.append((video_path, segments))
+            staged_pipeline = self._create_staged_pipeline(on_segment_done, uncached_video_segments)
+            try:
+                staged_pipeline.run(uncached_video_segments)
+            finally:
+                checkpoint.close()
+            video_stats['total_failed'] += (
+                video_stats['total_segments'] - video_stats['total_resumed']
+                - video_stats['total_success'] - video_stats['total_failed']
+            )
+        else:
+            # 비디오마다 디코더를 한 번만 열어 모든 세그먼트의 프레임을 일괄 추출
+            try:
+                for video_path, segments in video_segments:
+                    clip_start = time.time()
+                    with suppress_output():  # 비디오 처리 로그 억제
+                        self.process_video_segments(video_path, segments, on_segment_done=on_segment_done)
+                    video_stats['clip_extraction_time'] += time.time() - clip_start
+            finally:
+                checkpoint.close()
         pbar.close()
         
         process_time = time.time() - process_start
@@ -262,20 +537,121 @@ class TarsierVideoCaptioningPipeline:
         print("\n📊 처리 결과:")
         print(f"• 총 소요 시간: {process_time:.1f}초")
         print(f"• 클립 처리 시간: {video_stats['clip_extraction_time']:.1f}초")
-        print(f"• 성공: {video_stats['total_success']}/{video_stats['total_segments']}개")
+        print(f"• 성공: {video_stats['total_success']}/{video_stats['total_segments']}개 (복구 {video_stats['total_resumed']}개 별도)")
         print(f"• 실패: {video_stats['total_failed']}개")
+        if self.caption_cache is not None:
+            print(self.caption_cache.summary())
+        if self.static_detector is not None:
+            print(self.static_detector.summary())
+        if self.feature_cache is not None:
+            print(self.feature_cache.summary())
+            self.feature_cache.flush()  # 다음 실행에서 재사용할 수 있도록 RAM의 특징을 디스크에 기록
         print(f"• 평균 처리 속도: {video_stats['total_duration']/process_time:.1f}초/초")
         
         return results
 
+    def _create_staged_pipeline(self, on_segment_done, video_segments):
+        """video_segments((video_path, segments) 작업들)를 처리할 디코딩 -> 생성 -> 후처리 단계 파이프라인 생성"""
+        linked_anchors = {}  # 정적 세그먼트 item -> 캡션을 재사용할 anchor 항목
+        anchor_items = {}  # 새 anchor가 된 item -> anchor 항목 (후처리 결과를 채움)
+        # 비디오의 마지막 세그먼트가 생성 단계를 지나면 검출기의 anchor를 정리한다
+        last_segment_end = {video_path: max(end for _, end in segments) for video_path, segments in video_segments}
+
+        def forget_video(item, error=None):
+            # item은 세그먼트 (video_path, start, end) 또는 디코딩에 실패한 작업 (video_path, segments)
+            if self.static_detector is not None:
+                self.static_detector.forget(item[0])
+
+        def generate(batch):
+            # 도착 순서대로 직전 anchor와 비교해 생성할 세그먼트와 재사용할 세그먼트를 나눈다
+            generate_indices = []
+            for index, (item, inputs) in enumerate(batch):
+                signature = inputs.pop('signature', None)
+                if self.static_detector is None or signature is None:
+                    generate_indices.append(index)
+                    continue
+                video_path, start_time, end_time = item
+                anchor = self.static_detector.match(video_path, (start_time, end_time), signature)
+                if anchor is not None:
+                    linked_anchors[item] = anchor
+                else:
+                    anchor_items[item] = self.static_detector.set_anchor(video_path, (start_time, end_time), signature)
+                    generate_indices.append(index)
+
+            captions = [""] * len(batch)
+            if generate_indices:
+                generate_start = time.time()
+                with suppress_output():
+                    generated = self.batch_generator.generate([batch[i][1] for i in generate_indices])
+                if self.static_detector is not None:
+                    self.static_detector.record_generation(time.time() - generate_start, count=len(generate_indices))
+                for index, caption in zip(generate_indices, generated):
+                    captions[index] = caption
+                    if batch[index][0] in anchor_items:
+                        anchor_items[batch[index][0]]['caption'] = caption
+            # anchor가 같은 배치에 있어도 위에서 캡션이 채워졌으므로 여기서 재사용할 수 있다
+            for index, (item, _) in enumerate(batch):
+                if item in linked_anchors:
+                    captions[index] = linked_anchors[item]['caption'] or ""
+                    if captions[index]:
+                        self.static_detector.record_reuse()
+            # 이미 연결된 anchor는 linked_anchors/anchor_items가 들고 있으므로 후처리 전에 정리해도 된다
+            for item, _ in batch:
+                if item[2] == last_segment_end.get(item[0]):
+                    forget_video(item)
+            return captions
+
+        def postprocess(item, caption):
+            video_path, start_time, end_time = item
+            linked_anchor = linked_anchors.pop(item, None)
+            new_anchor = anchor_items.pop(item, None)
+            result = None
+            if caption and linked_anchor is not None and linked_anchor['result'] is not None:
+                result = self._link_static_segment(video_path, start_time, end_time, linked_anchor)
+            elif caption:
+                self._put_cached_caption(video_path, start_time, end_time, caption)
+                result = self._build_result(video_path, start_time, end_time, caption)
+                if new_anchor is not None:
+                    new_anchor['result'] = result
+            on_segment_done(video_path, start_time, end_time, result)
+            return result
+
+        return StagedCaptioningPipeline(
+            prepare_fn=prepare_segment_inputs,
+            generate_fn=generate,
+            postprocess_fn=postprocess,
+            num_workers=self.num_decode_workers,
+            batch_size=self.batch_size,
+            worker_init_fn=init_decode_worker,
+            worker_init_args=(
+                self.model_path, self.max_n_frames,
+                self.static_detector.signature_size if self.static_detector is not None else None
+            ),
+            failure_fn=forget_video,
+        )
+
+    def default_checkpoint_path(self, videos_dir):
+        """입력 폴더마다 다른 체크포인트 (다른 폴더를 처리한 이전 실행의 세그먼트가 섞이지 않게 한다)"""
+        digest = hashlib.sha1(os.path.abspath(videos_dir).encode('utf-8')).hexdigest()[:12]
+        return os.path.join(self.output_dir, f"checkpoint_{digest}.jsonl")
+
+    def _output_files(self):
+        if self.mode == "video2text":
+            return "v2t_captions.json", "v2t_mapping.json"
+        return "t2v_captions.json", "t2v_mapping.json"
+
+    def compact_checkpoint(self, videos_dir=None, checkpoint_path=None):
+        """JSONL 체크포인트를 DB 입력용 captions JSON으로 변환 (process_directory 없이 복구할 때 사용)"""
+        captions_file, _ = self._output_files()
+        return compact_checkpoint(
+            checkpoint_path or self.default_checkpoint_path(videos_dir),
+            os.path.join(self.output_dir, captions_file)
+        )
+
     def save_results(self, results):
         """Save results to JSON files"""
-        if self.mode == "video2text":
-            captions_file = "v2t_captions.json"
-            mapping_file = "v2t_mapping.json"
-        else:
-            captions_file = "t2v_captions.json"
-            mapping_file = "t2v_mapping.json"
+        self.wait_for_clips()
+        captions_file, mapping_file = self._output_files()
 
         output_path = os.path.join(self.output_dir, captions_file)
         with open(output_path, 'w', encoding='utf-8') as f:
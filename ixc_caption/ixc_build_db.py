@@ -1,35 +1,45 @@
 import os
-import json
+import sys
 import time
 import torch
 from transformers import AutoModel, AutoTokenizer
 
+# 캡션 캐시와 체크포인트 구현은 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'final-pipeline', 'utils'))
+from caption_cache import CaptionCache
+from checkpoint import JsonlCheckpoint, compact_checkpoint
+
 # Initialize model and tokenizer
 torch.set_grad_enabled(False)
 model = AutoModel.from_pretrained('internlm/internlm-xcomposer2d5-7b', attn_implementation='eager', torch_dtype=torch.bfloat16, trust_remote_code=True).cuda().eval()
 tokenizer = AutoTokenizer.from_pretrained('internlm/internlm-xcomposer2d5-7b', trust_remote_code=True)
 model.tokenizer = tokenizer
 
+# 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+caption_cache = CaptionCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'caption_cache.db'))
+QUERY = 'Here are some frames of a video. Describe this video in detail.'
+GENERATION_CONFIG = {"model": 'internlm/internlm-xcomposer2d5-7b', "query": QUERY, "do_sample": False, "max_new_tokens": 1024, "num_beams": 1, "use_meta": True}
+
 # Function to generate captions
-def generate_caption(video_path):
-    query = 'Here are some frames of a video. Describe this video in detail.'
+def generate_caption(video_path, cache_source=None):
+    # cache_source: 임시 클립이면 (원본 경로, 시작, 종료)로 캐시 키를 만든다
+    source_path, start_time, end_time = cache_source or (video_path, 0, -1)
+    cached = caption_cache.get(source_path, start_time, end_time, GENERATION_CONFIG)
+    if cached is not None:
+        return cached
+
     with torch.autocast(device_type='cuda', dtype=torch.float16):
-        response, _ = model.chat(tokenizer, query, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True)
+        response, _ = model.chat(tokenizer, QUERY, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True)
+    caption_cache.put(source_path, start_time, end_time, GENERATION_CONFIG, response)
     return response
 
-# Function to append JSON data
-def append_to_json(json_output_path, data, is_first):
-    mode = 'a' if os.path.exists(json_output_path) else 'w'
-    with open(json_output_path, mode) as json_file:
-        if is_first:
-            json_file.write('[\n')  # JSON 배열 시작
-        else:
-            json_file.write(',\n')  # 각 항목 구분을 위한 쉼표
-        json.dump(data, json_file, indent=4)
+# 세그먼트별 결과는 JSONL 체크포인트에 기록하고, 마지막에 JSON 배열로 변환한다
+def checkpoint_path_for(json_output_path):
+    return os.path.splitext(json_output_path)[0] + '.jsonl'
 
 # Main pipeline function
 def process_videos(input_dir, json_output_path):
-    is_first = True  # JSON 배열의 첫 번째 항목 여부를 확인
+    checkpoint = JsonlCheckpoint(checkpoint_path_for(json_output_path))
 
     # Sort folders by name
     video_folders = sorted([os.path.join(input_dir, d) for d in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, d))])
@@ -60,19 +70,18 @@ def process_videos(input_dir, json_output_path):
                 "end_time": "",    # Empty field (optional to fill later)
                 "caption": caption
             }
-            append_to_json(json_output_path, data, is_first)
-            is_first = False  # 첫 번째 항목 이후에는 쉼표 추가
+            checkpoint.append(video_path, data)
 
-    # Close JSON array
-    with open(json_output_path, 'a') as json_file:
-        json_file.write('\n]')
+    checkpoint.close()
+    compact_checkpoint(checkpoint_path_for(json_output_path), json_output_path)
 
 # Example usage
 input_dir = '/data/ephemeral/home/data/gt_videos'  # Directory with video folders
 json_output_path = '/data/ephemeral/home/min/level4-cv-finalproject-hackathon-cv-15-lv3/ixc_caption/json/caption_gt.json'  # JSON output file
 
-# Delete existing JSON file if exists
-if os.path.exists(json_output_path):
-    os.remove(json_output_path)
+# Delete existing JSON file if exists (이어서 처리하려면 ixc_build_db_continue.py 사용)
+for path in [json_output_path, checkpoint_path_for(json_output_path)]:
+    if os.path.exists(path):
+        os.remove(path)
 
 process_videos(input_dir, json_output_path)
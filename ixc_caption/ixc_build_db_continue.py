@@ -1,48 +1,81 @@
 import os
+import sys
 import json
 import time
 import torch
 from transformers import AutoModel, AutoTokenizer
 
+# 캡션 캐시와 체크포인트 구현은 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'final-pipeline', 'utils'))
+from caption_cache import CaptionCache
+from checkpoint import JsonlCheckpoint, compact_checkpoint
+
 # Initialize model and tokenizer
 torch.set_grad_enabled(False)
 model = AutoModel.from_pretrained('internlm/internlm-xcomposer2d5-7b', attn_implementation='eager', torch_dtype=torch.bfloat16, trust_remote_code=True).cuda().eval()
 tokenizer = AutoTokenizer.from_pretrained('internlm/internlm-xcomposer2d5-7b', trust_remote_code=True)
 model.tokenizer = tokenizer
 
+# 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+caption_cache = CaptionCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'caption_cache.db'))
+QUERY = 'Here are some frames of a video. Describe this video in detail.'
+GENERATION_CONFIG = {"model": 'internlm/internlm-xcomposer2d5-7b', "query": QUERY, "do_sample": False, "max_new_tokens": 1024, "num_beams": 1, "use_meta": True, "temperature": 1}
+
 # Function to generate captions
-def generate_caption(video_path):
-    query = 'Here are some frames of a video. Describe this video in detail.'
+def generate_caption(video_path, cache_source=None):
+    # cache_source: 임시 클립이면 (원본 경로, 시작, 종료)로 캐시 키를 만든다
+    source_path, start_time, end_time = cache_source or (video_path, 0, -1)
+    cached = caption_cache.get(source_path, start_time, end_time, GENERATION_CONFIG)
+    if cached is not None:
+        return cached
+
     with torch.autocast(device_type='cuda', dtype=torch.float16):
-        response, _ = model.chat(tokenizer, query, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True, temperature=1)
+        response, _ = model.chat(tokenizer, QUERY, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True, temperature=1)
+    caption_cache.put(source_path, start_time, end_time, GENERATION_CONFIG, response)
     return response
 
-# Load already processed video paths from existing JSON
-def load_processed_videos(json_output_path):
+# 세그먼트별 결과는 JSONL 체크포인트에 기록하고, 마지막에 JSON 배열로 변환한다
+def checkpoint_path_for(json_output_path):
+    return os.path.splitext(json_output_path)[0] + '.jsonl'
+
+# 이전 방식(JSON 배열에 바로 이어 쓰기)으로 만든 결과 읽기 (닫히지 않았거나 마지막 항목이 끊긴 배열도 읽을 수 있는 만큼 읽음)
+def load_json_results(json_output_path):
     if not os.path.exists(json_output_path):
-        return set()
-    
-    with open(json_output_path, 'r') as file:
+        return []
+    with open(json_output_path, 'r', encoding='utf-8') as file:
+        text = file.read()
+
+    decoder = json.JSONDecoder()
+    results = []
+    pos = text.find('[') + 1
+    while pos > 0:
+        while pos < len(text) and text[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= len(text) or text[pos] == ']':
+            break
         try:
-            data = json.load(file)
-            return set(item['video_path'] for item in data if 'video_path' in item)
+            item, pos = decoder.raw_decode(text, pos)
         except json.JSONDecodeError:
-            return set()  # JSON이 불완전한 경우 빈 집합 반환
-
-# Append JSON data
-def append_to_json(json_output_path, data, is_first):
-    mode = 'a' if os.path.exists(json_output_path) else 'w'
-    with open(json_output_path, mode) as json_file:
-        if is_first:
-            json_file.write('[\n')  # JSON 배열 시작
-        else:
-            json_file.write(',\n')  # 각 항목 구분을 위한 쉼표
-        json.dump(data, json_file, indent=4)
+            print(f"⚠️ {json_output_path}의 끊긴 마지막 항목은 다시 처리합니다.")
+            break
+        results.append(item)
+    return results
+
+# 체크포인트에 없는 기존 JSON 결과를 체크포인트에 옮겨 담는다 (compact_checkpoint가 JSON을 덮어써도 이전 결과가 남도록)
+def seed_checkpoint_from_json(checkpoint, json_output_path):
+    seeded = 0
+    for item in load_json_results(json_output_path):
+        if 'video_path' in item and not checkpoint.is_done(item['video_path']):
+            checkpoint.append(item['video_path'], item)
+            seeded += 1
+    if seeded:
+        print(f"📥 기존 {json_output_path}의 결과 {seeded}개를 체크포인트에 추가")
 
 # Main pipeline function
 def process_videos(input_dir, json_output_path):
-    processed_videos = load_processed_videos(json_output_path)
-    is_first = not os.path.exists(json_output_path) or len(processed_videos) == 0
+    # 체크포인트에 기록된 비디오는 건너뛴다 (중간에 끊긴 마지막 레코드는 자동으로 잘라냄)
+    checkpoint = JsonlCheckpoint(checkpoint_path_for(json_output_path))
+    seed_checkpoint_from_json(checkpoint, json_output_path)
 
     # Sort folders by name
     video_folders = sorted([os.path.join(input_dir, d) for d in os.listdir(input_dir) if os.path.isdir(os.path.join(input_dir, d))])
@@ -55,7 +88,7 @@ def process_videos(input_dir, json_output_path):
             video_path = os.path.join(folder, file)
 
             # Skip if already processed
-            if video_path in processed_videos:
+            if checkpoint.is_done(video_path):
                 print(f"Skipping {video_path} (already processed)")
                 continue
 
@@ -79,15 +112,10 @@ def process_videos(input_dir, json_output_path):
                 "end_time": "",
                 "caption": caption
             }
-            append_to_json(json_output_path, data, is_first)
-            is_first = False  # 첫 번째 항목 이후에는 쉼표 추가
-
-    # Close JSON array if it's not already closed
-    with open(json_output_path, 'rb+') as json_file:
-        json_file.seek(-1, os.SEEK_END)
-        last_char = json_file.read(1)
-        if last_char != b']':
-            json_file.write(b'\n]')
+            checkpoint.append(video_path, data)
+
+    checkpoint.close()
+    compact_checkpoint(checkpoint_path_for(json_output_path), json_output_path)
 
 # Example usage
 input_dir = '/data/ephemeral/home/data/gt_videos'  # Directory with video folders
@@ -1,17 +1,28 @@
 import os
-import json
+import sys
 import torch
 from moviepy.video.io.VideoFileClip import VideoFileClip
 from transformers import AutoModel, AutoTokenizer
 
+# 캡션 캐시와 체크포인트 구현은 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'final-pipeline', 'utils'))
+from caption_cache import CaptionCache
+from checkpoint import JsonlCheckpoint, compact_checkpoint
+
 # Initialize model and tokenizer
 torch.set_grad_enabled(False)
 model = AutoModel.from_pretrained('internlm/internlm-xcomposer2d5-7b', attn_implementation='eager', torch_dtype=torch.bfloat16, trust_remote_code=True).cuda().eval()
 tokenizer = AutoTokenizer.from_pretrained('internlm/internlm-xcomposer2d5-7b', trust_remote_code=True)
 model.tokenizer = tokenizer
 
+# 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+caption_cache = CaptionCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'caption_cache.db'))
+QUERY = 'Here are some frames of a video. Describe this video in detail.'
+GENERATION_CONFIG = {"model": 'internlm/internlm-xcomposer2d5-7b', "query": QUERY, "do_sample": False, "max_new_tokens": 1024, "num_beams": 1, "use_meta": True}
+
 # Function to split video into 5-second clips
-def split_video(video_path, output_dir, clip_duration=5):
+# skip(start_time, end_time)가 True인 구간(체크포인트에 기록된 클립)은 자르지 않는다
+def split_video(video_path, output_dir, clip_duration=5, skip=None):
     clips = []
     with VideoFileClip(video_path) as video:
         duration = video.duration
@@ -19,6 +30,8 @@ def split_video(video_path, output_dir, clip_duration=5):
 
         for start in range(0, int(duration), clip_duration):
             end = min(start + clip_duration, duration)
+            if skip is not None and skip(f"{start:.2f}", f"{end:.2f}"):
+                continue
             clip_filename = f"{base_name}_{start:05d}_{int(end):05d}.mp4"
             clip_path = os.path.join(output_dir, clip_filename)
             video.subclipped(start, end).write_videofile(clip_path, codec='libx264', audio_codec='aac', threads=1, preset='ultrafast', logger=None)
@@ -30,26 +43,30 @@ def split_video(video_path, output_dir, clip_duration=5):
     return clips
 
 # Function to generate captions
-def generate_caption(video_path):
-    query = 'Here are some frames of a video. Describe this video in detail.'
+def generate_caption(video_path, cache_source=None):
+    # cache_source: 임시 클립이면 (원본 경로, 시작, 종료)로 캐시 키를 만든다
+    source_path, start_time, end_time = cache_source or (video_path, 0, -1)
+    cached = caption_cache.get(source_path, start_time, end_time, GENERATION_CONFIG)
+    if cached is not None:
+        return cached
+
     with torch.autocast(device_type='cuda', dtype=torch.float16):
-        response, _ = model.chat(tokenizer, query, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True)
+        response, _ = model.chat(tokenizer, QUERY, [video_path], do_sample=False, max_new_tokens=1024, num_beams=1, use_meta=True)
+    caption_cache.put(source_path, start_time, end_time, GENERATION_CONFIG, response)
     return response
 
-# Function to append JSON data
-def append_to_json(json_output_path, data, is_first):
-    mode = 'a' if os.path.exists(json_output_path) else 'w'
-    with open(json_output_path, mode) as json_file:
-        if is_first:
-            json_file.write('[\n')  # JSON 배열 시작
-        else:
-            json_file.write(',\n')  # 각 항목 구분을 위한 쉼표
-        json.dump(data, json_file, indent=4)
+# 세그먼트별 결과는 JSONL 체크포인트에 기록하고, 마지막에 JSON 배열로 변환한다
+# (다시 실행하면 기록된 클립은 자르지도 캡션을 만들지도 않는다. 처음부터 하려면 .jsonl 파일을 지운다)
+def checkpoint_path_for(json_output_path):
+    return os.path.splitext(json_output_path)[0] + '.jsonl'
+
+def clip_key(video_path, start_time, end_time):
+    return f'{video_path}:{start_time}:{end_time}'
 
 # Main pipeline function
 def process_videos(input_dir, output_dir, json_output_path):
     os.makedirs(output_dir, exist_ok=True)
-    is_first = True  # JSON 배열의 첫 번째 항목 여부를 확인
+    checkpoint = JsonlCheckpoint(checkpoint_path_for(json_output_path))
 
     for root, _, files in os.walk(input_dir):
         for file in files:
@@ -57,12 +74,18 @@ def process_videos(input_dir, output_dir, json_output_path):
                 video_path = os.path.join(root, file)
                 print(f"Processing {video_path}...")
 
-                # Step 1: Split video
-                clips = split_video(video_path, output_dir)
+                # Step 1: Split video (체크포인트에 있는 구간은 건너뜀)
+                clips = split_video(
+                    video_path, output_dir,
+                    skip=lambda start_time, end_time: checkpoint.is_done(clip_key(video_path, start_time, end_time))
+                )
 
                 # Step 2: Generate captions
                 for clip in clips:
-                    caption = generate_caption(clip["video_path"])
+                    caption = generate_caption(
+                        clip["video_path"],
+                        cache_source=(video_path, float(clip["start_time"]), float(clip["end_time"]))
+                    )
 
                     # Step 3: Save JSON data immediately
                     data = {
@@ -74,22 +97,21 @@ def process_videos(input_dir, output_dir, json_output_path):
                         "end_time": clip["end_time"],
                         "caption": caption
                     }
-                    append_to_json(json_output_path, data, is_first)
-                    is_first = False  # 첫 번째 항목 이후에는 쉼표 추가
+                    checkpoint.append(clip_key(video_path, clip["start_time"], clip["end_time"]), data)
 
                     # Step 4: Delete the split video
                     os.remove(clip["video_path"])
 
-    # Step 5: Close JSON array
-    with open(json_output_path, 'a') as json_file:
-        json_file.write('\n]')
+    # Step 5: JSONL 체크포인트를 JSON 배열로 변환
+    checkpoint.close()
+    compact_checkpoint(checkpoint_path_for(json_output_path), json_output_path)
 
 # Example usage
 input_dir = '/data/ephemeral/home/data/split_exp/videos'  # Directory with original videos
 output_dir = '/data/ephemeral/home/min/level4-cv-finalproject-hackathon-cv-15-lv3/ixc_caption/tmp_clip'  # Directory to store temporary clips
 json_output_path = '/data/ephemeral/home/min/level4-cv-finalproject-hackathon-cv-15-lv3/ixc_caption/output.json'  # JSON output file
 
-# Delete existing JSON file if exists
+# Delete existing JSON file if exists (체크포인트는 남겨 두어 중단된 실행을 이어서 처리)
 if os.path.exists(json_output_path):
     os.remove(json_output_path)
 
@@ -1,7 +1,6 @@
 import argparse
 import os
 import time
-import json
 import logging
 import warnings
 import moviepy
@@ -12,6 +11,12 @@ from tqdm import tqdm
 from video_to_text.video_captioning import MPLUGVideoCaptioningPipeline, TarsierVideoCaptioningPipeline
 from text_to_video.embedding import FaissSearch
 
+# annotation 조회 서비스는 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다 (보고서 조회와 DB 구축이 같은 인덱스 사용)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'final-pipeline', 'utils'))
+from annotation_index import get_annotation_index
+
+ANNOTATION_PATH = '/data/ephemeral/home/jaehuni/split_exp/matched_videos.json'
+
 # 모든 로깅과 경고 억제
 logging.getLogger('imageio').setLevel(logging.ERROR)
 logging.getLogger('moviepy').setLevel(logging.ERROR)
@@ -35,8 +40,7 @@ def build_video_db(model_type="mplug", segmentation_method="fixed", segmentation
     # 메타데이터 로드
     print("📂 메타데이터 로드 중...")
     load_time = time.time()
-    with open('/data/ephemeral/home/jaehuni/split_exp/matched_videos.json', 'r', encoding='utf-8') as f:
-        video_metadata = {item['video_name']: item for item in json.load(f)}
+    video_metadata = get_annotation_index(ANNOTATION_PATH)
     print(f"⏱️ 메타데이터 로드 완료 ({time.time() - load_time:.1f}초)")
     
     # 1. 비디오 캡셔닝
@@ -11,6 +11,12 @@ from text_to_video.embedding import FaissSearch
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# annotation 조회 서비스는 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다 (보고서 조회와 DB 구축이 같은 인덱스 사용)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'final-pipeline', 'utils'))
+from annotation_index import get_annotation_index
+
+ANNOTATION_PATH = '../videos/sample.json'
+
 def save_search_result_clip(video_path, start_time, end_time, output_dir, clip_name):
     """검색 결과 클립을 저장"""
     os.makedirs(output_dir, exist_ok=True)
@@ -41,8 +47,7 @@ def text_to_video_search(query_text, model_type="mplug", new_videos_dir=None):
 
     # 메타데이터 로드
     print("📂 메타데이터 로드 중...")
-    with open('../videos/sample.json', 'r', encoding='utf-8') as f:
-        video_metadata = {item['video_name']: item for item in json.load(f)}
+    video_metadata = get_annotation_index(ANNOTATION_PATH)
 
     # 새로운 비디오가 있는 경우 처리
     if new_videos_dir and os.path.exists(new_videos_dir):
@@ -178,8 +183,7 @@ def video_to_text_process(model_type="mplug"):
     # 메타데이터 로드
     print("📂 메타데이터 로드 중...")
     load_time = time.time()
-    with open('../videos/sample.json', 'r', encoding='utf-8') as f:
-        video_metadata = {item['video_name']: item for item in json.load(f)}
+    video_metadata = get_annotation_index(ANNOTATION_PATH)
     print(f"⏱️ 메타데이터 로드 완료 ({time.time() - load_time:.1f}초)")
 
     # 파이프라인 초기화
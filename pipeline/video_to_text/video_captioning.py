@@ -1,5 +1,7 @@
 import os
+import sys
 import json
+import hashlib
 import torch
 from tqdm import tqdm
 from contextlib import contextmanager, redirect_stdout, redirect_stderr
@@ -11,6 +13,12 @@ from utils.translator import DeepLTranslator, DeepGoogleTranslator
 from utils.tarsier_utils import load_model_and_processor
 from utils.video_split import create_segmenter
 
+# 캡션 캐시와 체크포인트 구현은 final-pipeline/utils 한 곳에 두고 그대로 가져다 쓴다
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             'final-pipeline', 'utils'))
+from caption_cache import CaptionCache
+from checkpoint import JsonlCheckpoint, segment_key
+
 @contextmanager
 def suppress_output():
     """모든 출력을 억제하는 컨텍스트 매니저"""
@@ -18,10 +26,28 @@ def suppress_output():
         with redirect_stdout(devnull), redirect_stderr(devnull):
             yield
 
+def default_checkpoint_path(output_dir, videos_dir):
+    """입력 폴더마다 다른 체크포인트 (다른 폴더를 처리한 이전 실행의 세그먼트가 섞이지 않게 한다)"""
+    digest = hashlib.sha1(os.path.abspath(videos_dir).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(output_dir, f"checkpoint_{digest}.jsonl")
+
+def resume_from_checkpoint(checkpoint, video_list):
+    """체크포인트에 기록된 이번 실행 세그먼트의 결과와 아직 처리하지 않은 세그먼트 목록"""
+    results, pending = [], []
+    for video_path, start_time, end_time in video_list:
+        key = segment_key(video_path, start_time, end_time)
+        if checkpoint.is_done(key):
+            results.append(checkpoint.records[key])
+        else:
+            pending.append((video_path, start_time, end_time))
+    if results:
+        print(f"♻️ 체크포인트에서 {len(results)}개 세그먼트 복구 (건너뜀)")
+    return results, pending
+
 class MPLUGVideoCaptioningPipeline:
     def __init__(self, model_path='mPLUG/mPLUG-Owl3-7B-240728', keep_clips=False, 
                  segmentation_method="fixed", segmentation_params=None, mode='video2text',
-                 video_metadata=None):
+                 video_metadata=None, caption_cache_path="cache/caption_cache.db"):
         # 기존 초기화 코드는 그대로 유지
         self.config = AutoConfig.from_pretrained(model_path, trust_remote_code=True)
         self.model = AutoModel.from_pretrained(
@@ -35,6 +61,15 @@ class MPLUGVideoCaptioningPipeline:
         self.tokenizer = AutoTokenizer.from_pretrained(model_path)
         self.processor = self.model.init_processor(self.tokenizer)
         self.MAX_NUM_FRAMES = 16
+
+        # 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+        self.caption_cache = CaptionCache(caption_cache_path) if caption_cache_path else None
+        self.generation_config = {
+            "model": model_path,
+            "prompt": "<|video|> Describe this video in detail.",
+            "n_frames": self.MAX_NUM_FRAMES,
+            "max_new_tokens": 200,
+        }
         
         self.keep_clips = keep_clips
         self.mode = mode
@@ -107,8 +142,8 @@ class MPLUGVideoCaptioningPipeline:
 
         return self.model.generate(**inputs)[0]
 
-    def process_videos(self, video_list):
-        """Process list of videos and generate captions"""
+    def process_videos(self, video_list, checkpoint=None):
+        """Process list of videos and generate captions (checkpoint가 있으면 세그먼트마다 결과 기록)"""
         results = []
 
         for video_path, start_time, end_time in video_list:
@@ -124,13 +159,22 @@ class MPLUGVideoCaptioningPipeline:
             video_id = self.video_name_to_id[video_path]
             clip_id = f"clip{self.clip_counter}"
 
-            # Extract clip
-            clip_path = self._extract_clip(video_path, start_time, end_time)
+            caption = None
+            if self.caption_cache is not None:
+                caption = self.caption_cache.get(video_path, start_time, end_time, self.generation_config)
+
+            # Extract clip (캐시된 캡션이 있고 클립을 남기지 않으면 추출 생략)
+            clip_path = None
+            if caption is None or self.keep_clips:
+                clip_path = self._extract_clip(video_path, start_time, end_time)
 
             try:
                 # Encode and generate caption
-                video_frames = self._encode_video(clip_path)
-                caption = self._generate_caption(video_frames)
+                if caption is None:
+                    video_frames = self._encode_video(clip_path)
+                    caption = self._generate_caption(video_frames)
+                    if self.caption_cache is not None:
+                        self.caption_cache.put(video_path, start_time, end_time, self.generation_config, caption)
                 
                 # video2text 모드일 때만 한글 번역 추가
                 if self.mode == "video2text":
@@ -162,10 +206,12 @@ class MPLUGVideoCaptioningPipeline:
                 
                 self.clip_counter += 1
                 results.append(entry)
+                if checkpoint is not None:
+                    checkpoint.append(segment_key(video_path, start_time, end_time), entry)
 
             finally:
                 # Only remove clip if keep_clips is False
-                if not self.keep_clips and os.path.exists(clip_path):
+                if not self.keep_clips and clip_path and os.path.exists(clip_path):
                     os.remove(clip_path)
 
         return results
@@ -191,8 +237,12 @@ class MPLUGVideoCaptioningPipeline:
         
         return segments
 
-    def process_directory(self, videos_dir):
-        """Process all MP4 files in the directory"""
+    def process_directory(self, videos_dir, checkpoint_path=None):
+        """Process all MP4 files in the directory
+
+        완료된 세그먼트는 checkpoint_path(JSONL, 기본값은 videos_dir마다 따로)에 바로 기록되며,
+        다시 실행하면 기록된 세그먼트는 건너뛰고 이전 결과를 포함해 반환한다.
+        """
         video_list = []
         for file in os.listdir(videos_dir):
             if file.lower().endswith('.mp4'):
@@ -213,7 +263,15 @@ class MPLUGVideoCaptioningPipeline:
             return None
             
         print(f"Total segments to process: {len(video_list)}")
-        return self.process_videos(video_list)
+        checkpoint = JsonlCheckpoint(checkpoint_path or default_checkpoint_path(self.output_dir, videos_dir))
+        results, video_list = resume_from_checkpoint(checkpoint, video_list)
+        # 클립 번호는 체크포인트의 모든 기록 이후부터 매겨 이전 클립 ID와 겹치지 않게 한다
+        self.clip_counter = max(self.clip_counter, len(checkpoint.records) + 1)
+        try:
+            results.extend(self.process_videos(video_list, checkpoint=checkpoint))
+        finally:
+            checkpoint.close()
+        return results
 
     def save_results(self, results):
         """Save results to JSON files in mode-specific output directory"""
@@ -246,10 +304,23 @@ def find_video_file(videos_dir, video_name):
 
 class TarsierVideoCaptioningPipeline:
     def __init__(self, model_path, keep_clips=False, segmentation_method="fixed", 
-                 segmentation_params=None, mode='video2text', video_metadata=None):
+                 segmentation_params=None, mode='video2text', video_metadata=None,
+                 caption_cache_path="cache/caption_cache.db"):
         # Model initialization
         self.model, self.processor = load_model_and_processor(model_path, max_n_frames=8)
         self.model.eval()
+
+        # 캡션 캐시: 같은 (영상 내용, 구간, 생성 설정)이면 모델을 다시 돌리지 않는다
+        self.caption_cache = CaptionCache(caption_cache_path) if caption_cache_path else None
+        self.generation_config = {
+            "model": os.path.abspath(model_path),
+            "instructions": ["<video>\nDescribe the video in detail."],
+            "n_frames": 8,
+            "do_sample": True,
+            "max_new_tokens": 512,
+            "top_p": 0.9,
+            "temperature": 0.8,
+        }
         
         self.keep_clips = keep_clips
         self.mode = mode
@@ -334,20 +405,28 @@ class TarsierVideoCaptioningPipeline:
         # 메타데이터 가져오기
         metadata = self.video_metadata.get(video_name, {})
         
-        # Extract clip
+        caption = None
+        if self.caption_cache is not None:
+            caption = self.caption_cache.get(video_path, start_time, end_time, self.generation_config)
+
+        # Extract clip (캐시된 캡션이 있고 클립을 남기지 않으면 추출 생략)
         clip_path = os.path.join(self.clips_dir, f"{video_id}_{clip_id}.mp4")
-        try:
-            with VideoFileClip(video_path) as video:
-                clip = video.subclipped(start_time, end_time)
-                clip.write_videofile(clip_path, codec='libx264', audio=False)
-        except Exception as e:
-            print(f"🚨 클립 추출 오류: {str(e)}")
-            return None
+        if caption is None or self.keep_clips:
+            try:
+                with VideoFileClip(video_path) as video:
+                    clip = video.subclipped(start_time, end_time)
+                    clip.write_videofile(clip_path, codec='libx264', audio=False)
+            except Exception as e:
+                print(f"🚨 클립 추출 오류: {str(e)}")
+                return None
         
         # Generate caption
-        caption = self.generate_caption(clip_path)
-        if not caption:
-            return None
+        if caption is None:
+            caption = self.generate_caption(clip_path)
+            if not caption:
+                return None
+            if self.caption_cache is not None:
+                self.caption_cache.put(video_path, start_time, end_time, self.generation_config, caption)
             
         # Translate caption to Korean if in video2text mode
         caption_ko = None
@@ -399,8 +478,12 @@ class TarsierVideoCaptioningPipeline:
                 results.append(result)
         return results
 
-    def process_directory(self, videos_dir):
-        """Process all videos in directory"""
+    def process_directory(self, videos_dir, checkpoint_path=None):
+        """Process all videos in directory
+
+        완료된 세그먼트는 checkpoint_path(JSONL, 기본값은 videos_dir마다 따로)에 바로 기록되며,
+        다시 실행하면 기록된 세그먼트는 건너뛰고 이전 결과를 포함해 반환한다.
+        """
         video_list = []
         print("📂 비디오 목록 생성 중...")
         
@@ -414,15 +497,24 @@ class TarsierVideoCaptioningPipeline:
         
         print(f"총 {len(video_files)}개 비디오, {len(video_list)}개 세그먼트 발견")
         
+        checkpoint = JsonlCheckpoint(checkpoint_path or default_checkpoint_path(self.output_dir, videos_dir))
+        results, video_list = resume_from_checkpoint(checkpoint, video_list)
+        # 클립 번호는 체크포인트의 모든 기록 이후부터 매겨 이전 클립 경로와 겹치지 않게 한다
+        self.clip_counter = max(self.clip_counter, len(checkpoint.records))
+
         # 비디오 처리
-        results = []
         pbar = tqdm(total=len(video_list), desc="비디오 처리")
-        for video_path, start_time, end_time in video_list:
-            with suppress_output():
-                result = self.process_video(video_path, start_time, end_time)
-                if result:
-                    results.append(result)
-            pbar.update(1)
+        try:
+            for video_path, start_time, end_time in video_list:
+                with suppress_output():
+                    result = self.process_video(video_path, start_time, end_time)
+                    if result:
+                        # 성공한 세그먼트만 기록 (실패한 세그먼트는 다음 실행에서 재시도)
+                        checkpoint.append(segment_key(video_path, start_time, end_time), result)
+                        results.append(result)
+                pbar.update(1)
+        finally:
+            checkpoint.close()
         pbar.close()
         
         return results
@@ -1,7 +1,9 @@
 import json
 import os
 import re  # 숫자 추출을 위한 정규표현식
+import csv
 import subprocess  # ffmpeg 실행을 위한 모듈
+from concurrent.futures import ThreadPoolExecutor
 from moviepy import VideoFileClip
 from abc import ABC, abstractmethod
 from tqdm import tqdm
@@ -73,34 +75,61 @@ def extract_video_number(video_name):
     match = re.search(r'\d+', video_name)  # 숫자만 추출
     return int(match.group()) if match else None
 
-def save_segment(video_path, output_path, start_time, end_time):
-    """비디오에서 지정된 구간을 잘라서 저장하는 함수
+def mux_segments(video_path, output_dir, segment_duration=5, segment_times=None, min_duration=1):
+    """ffmpeg segment muxer로 비디오 하나의 모든 세그먼트를 한 번에 저장하는 함수
+
+    세그먼트마다 ffmpeg를 실행해 입력을 다시 열고 seek하는 대신 한 프로세스에서 입력을 한 번만 읽는다.
+    -c copy는 키프레임에서만 자르므로, 구간 정보는 muxer의 세그먼트 리스트(CSV)에 기록된 실제 값을 사용한다.
 
     Args:
         video_path (str): 원본 비디오 파일 경로
-        output_path (str): 저장될 클립 파일 경로
-        start_time (float): 클립 시작 시간
-        end_time (float): 클립 종료 시간
+        output_dir (str): 클립 저장 폴더 (00001.mp4부터 번호 순서로 저장)
+        segment_duration (float): 세그먼트 길이 (초, segment_times가 없을 때)
+        segment_times (list): 분할 시각 리스트 (초)
+        min_duration (float): 이보다 짧은 마지막 세그먼트는 버림
+
+    Returns:
+        list of tuple: (클립 파일 이름, 시작 시간, 종료 시간)
     """
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # 폴더가 없으면 생성
+    os.makedirs(output_dir, exist_ok=True)  # 폴더가 없으면 생성
+    list_path = os.path.join(output_dir, "segments.csv")
+
+    if segment_times is not None:
+        split_args = ["-segment_times", ",".join(f"{t:.6f}" for t in segment_times)]
+    else:
+        split_args = ["-segment_time", str(segment_duration)]
 
     command = [
         "ffmpeg",
-        "-ss", str(start_time),
         "-i", video_path,
-        "-t", str(end_time - start_time),
         "-c", "copy",
-        output_path,
+        "-f", "segment",
+        *split_args,
+        "-segment_start_number", "1",
+        "-reset_timestamps", "1",
+        "-segment_list", list_path,
+        "-segment_list_type", "csv",
+        os.path.join(output_dir, "%05d.mp4"),
         "-y"
     ]
-    
+
     try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        # print(f"Segment saved successfully: {output_path}")
+        subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
     except subprocess.CalledProcessError as e:
-        print(f"Error occurred while saving segment: {e.stderr.decode('utf-8')}")
+        print(f"Error occurred while splitting video: {e.stderr.decode('utf-8')}")
+        return []
+
+    with open(list_path, "r", encoding="utf-8", newline="") as f:
+        segments = [(name, float(start_time), float(end_time)) for name, start_time, end_time in csv.reader(f)]
+    os.remove(list_path)
 
-def process_videos_from_json(json_file, video_base_path, designated_path, start, end, segment_method="fixed", segment_duration=1):
+    # 최소 길이보다 짧은 마지막 세그먼트는 기존처럼 버림
+    if len(segments) > 1 and segments[-1][2] - segments[-1][1] < min_duration:
+        os.remove(os.path.join(output_dir, segments[-1][0]))
+        segments = segments[:-1]
+    return segments
+
+def process_videos_from_json(json_file, video_base_path, designated_path, start, end, segment_method="fixed", segment_duration=1, max_workers=4):
     """JSON 파일에서 지정된 범위(start~end)의 비디오만 처리하여 세그먼트 데이터를 생성하는 함수
 
     Args:
@@ -111,6 +140,7 @@ def process_videos_from_json(json_file, video_base_path, designated_path, start,
         end (int): 처리할 비디오 종료 번호 (예: 10)
         segment_method (str): 세그먼테이션 방법 ("fixed", "scene", "shot")
         segment_duration (int): 세그먼트 길이 (초 단위, "fixed" 방식일 경우)
+        max_workers (int): 동시에 분할할 비디오 수 (비디오당 ffmpeg 프로세스 하나)
 
     Returns:
         list: 지정된 범위의 비디오 세그먼트 데이터를 포함하는 JSON 리스트
@@ -119,9 +149,9 @@ def process_videos_from_json(json_file, video_base_path, designated_path, start,
     with open(json_file, "r", encoding="utf-8") as f:
         video_metadata = json.load(f)
 
-    all_scene_data = []  # 모든 비디오의 세그먼트 데이터를 저장할 리스트
+    jobs = []  # (video_info, video_number, video_path, video_save_path)
 
-    for video_info in tqdm(video_metadata):
+    for video_info in video_metadata:
         video_name = video_info["video_name"]
         video_number = extract_video_number(video_name)  # 파일 이름에서 숫자 추출
 
@@ -136,25 +166,32 @@ def process_videos_from_json(json_file, video_base_path, designated_path, start,
             print(f"⚠️ 경고: {video_path} 파일을 찾을 수 없습니다. 건너뜁니다.")
             continue  # 파일이 존재하지 않으면 처리하지 않고 넘어감
 
-        # Ensure the directory for saving clips exists
-        os.makedirs(video_save_path, exist_ok=True)
-
-        try:
-            # 지정된 방법으로 세그먼터 생성
-            segmenter = create_segmenter(method=segment_method, segment_duration=segment_duration)
-            segments = segmenter.get_segments(video_path)  # 세그먼트 리스트 가져오기
+        jobs.append((video_info, video_number, video_path, video_save_path))
 
-            # 🎯 clip_num을 1부터 시작하는 숫자로 설정
-            clip_num = 1
+    def split_job(job):
+        _, _, video_path, video_save_path = job
+        if segment_method == "fixed":
+            # 고정 길이는 muxer가 직접 분할 (비디오 길이를 미리 읽을 필요 없음)
+            return mux_segments(video_path, video_save_path, segment_duration=segment_duration)
+        segmenter = create_segmenter(method=segment_method, segment_duration=segment_duration)
+        segments = segmenter.get_segments(video_path)  # 세그먼트 리스트 가져오기
+        return mux_segments(video_path, video_save_path, segment_times=[s for s, _ in segments[1:]])
 
-            for start_time, end_time in segments:
-                clip_file_name = f"{clip_num:05d}.mp4"  # 1부터 시작하는 숫자 형식 ("00001.mp4")
-                output_clip_path = os.path.join(video_save_path, clip_file_name)
-
-                # 비디오 클립을 저장
-                save_segment(video_path, output_clip_path, start_time, end_time)
+    all_scene_data = []  # 모든 비디오의 세그먼트 데이터를 저장할 리스트
 
-                # JSON 형식으로 저장할 데이터
+    # 비디오 여러 개를 병렬로 분할 (결과는 JSON 순서대로 모음)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(split_job, job) for job in jobs]
+        for job, future in tqdm(zip(jobs, futures), total=len(jobs)):
+            video_info, video_number, video_path, _ = job
+            try:
+                segments = future.result()
+            except Exception as e:
+                print(f"오류가 발생했습니다: {e} - 비디오: {video_path}")
+                continue  # 오류 발생 시 다음 비디오로 넘어감
+
+            for clip_file_name, start_time, end_time in segments:
+                # JSON 형식으로 저장할 데이터 (구간은 muxer가 기록한 실제 값)
                 scene_data = {
                     "video_path": f"video_{video_number}/{clip_file_name}",
                     "video_id": video_info["video_id"],
@@ -165,11 +202,6 @@ def process_videos_from_json(json_file, video_base_path, designated_path, start,
                 }
 
                 all_scene_data.append(scene_data)  # 리스트에 추가
-                clip_num += 1  # clip_num 증가
-
-        except Exception as e:
-            print(f"오류가 발생했습니다: {e} - 비디오: {video_path}")
-            continue  # 오류 발생 시 다음 비디오로 넘어감
 
     return all_scene_data  # 모든 비디오 세그먼트 데이터를 반환
 
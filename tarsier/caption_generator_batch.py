@@ -1,7 +1,7 @@
 import os
 import json
 import time
-from utils import load_model_and_processor
+from utils import load_model_and_processor, AdaptiveBatchGenerator
 import torch
 from tqdm import tqdm
 import threading
@@ -14,27 +14,20 @@ def generate_captions_batch(model, processor, video_paths, max_n_frames=8, max_n
     for video_path in video_paths:
         inputs = processor(modified_prompt, video_path, edit_prompt=True, return_prompt=True)
         inputs.pop('prompt', None)
-        inputs = {k: v.to(model.device) for k, v in inputs.items() if v is not None}
+        inputs = {k: v for k, v in inputs.items() if v is not None}
         inputs_list.append(inputs)
     
-    # 배치 입력 생성 (각 입력을 개별적으로 처리)
-    batch_inputs = {k: torch.cat([inputs[k] for inputs in inputs_list], dim=0) for k in inputs_list[0]}
-    
-    outputs = model.generate(
-        **batch_inputs,
+    # 왼쪽 패딩으로 배치를 구성하고, 메모리 부족 시 배치를 나눠서 재시도
+    batch_generator = AdaptiveBatchGenerator(
+        model, processor,
+        max_batch_size=len(inputs_list),
         do_sample=temperature > 0,
         max_new_tokens=max_new_tokens,
         top_p=top_p,
         temperature=temperature,
         use_cache=True
     )
-    
-    captions = []
-    for i, inputs in enumerate(inputs_list):
-        output_text = processor.tokenizer.decode(outputs[i][inputs['input_ids'][0].shape[0]:], skip_special_tokens=True)
-        captions.append(output_text)
-    
-    return captions
+    return batch_generator.generate(inputs_list)
 
 # 경로 설정
 video_base_path = "/data/ephemeral/home/split_process/split_process_videos"
@@ -216,6 +216,112 @@ def load_model_and_processor(model_name_or_path, max_n_frames=8):
     model.eval()
     return model, processor
 
+
+def collate_inputs(inputs_list, pad_id):
+    """프롬프트 길이와 프레임 수가 다른 입력들을 하나의 배치로 묶는다
+
+    input_ids는 왼쪽 패딩 후 attention_mask를 만들고, pixel_values는 프레임 축으로 이어 붙인다.
+    (모델이 input_ids의 <image> 토큰 순서대로 프레임 특징을 채워 넣으므로 샘플별 프레임 수가 달라도 된다)
+    생성 결과는 모든 샘플이 input_ids.shape[1] 위치부터 새 토큰이다.
+    """
+    max_len = max(inputs['input_ids'].shape[1] for inputs in inputs_list)
+    input_ids = torch.full((len(inputs_list), max_len), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(inputs_list), max_len), dtype=torch.long)
+    for i, inputs in enumerate(inputs_list):
+        ids = inputs['input_ids'][0]
+        input_ids[i, max_len - ids.shape[0]:] = ids
+        attention_mask[i, max_len - ids.shape[0]:] = 1
+
+    pixel_values = [inputs['pixel_values'] for inputs in inputs_list if inputs.get('pixel_values') is not None]
+    batch = {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "pixel_values": torch.cat(pixel_values, dim=0) if pixel_values else None,
+    }
+    return {k: v for k, v in batch.items() if v is not None}
+
+
+class AdaptiveBatchGenerator:
+    """메모리 예산에 맞춰 배치 크기를 정하고, OOM이 나면 배치를 반으로 나눠 다시 시도하는 생성기"""
+
+    def __init__(self, model, processor, max_batch_size=8, memory_budget_gb=None, memory_fraction=0.8, **generate_kwargs):
+        self.model = model
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.generate_kwargs = generate_kwargs
+        self.pad_id = processor.pad_id if processor.pad_id is not None else processor.eos_id
+
+        # 메모리 예산: 지정하지 않으면 현재 남은 GPU 메모리의 memory_fraction 만큼 사용
+        if memory_budget_gb is not None:
+            self.memory_budget = memory_budget_gb * 1024 ** 3
+        elif torch.cuda.is_available():
+            free_memory, _ = torch.cuda.mem_get_info()
+            self.memory_budget = free_memory * memory_fraction
+        else:
+            self.memory_budget = None
+
+        # 토큰 하나당 KV cache 크기 (key + value, 모든 레이어)
+        text_config = model.config.text_config
+        dtype_bytes = torch.finfo(model.dtype).bits // 8 if model.dtype.is_floating_point else 4
+        self.kv_bytes_per_token = 2 * text_config.num_hidden_layers * text_config.hidden_size * dtype_bytes
+
+        # 프레임 하나가 차지하는 토큰 수 (패치 + 행 구분 토큰 + 프레임 구분 토큰)
+        vision_config = model.config.vision_config
+        patches_per_side = vision_config.image_size // vision_config.patch_size
+        self.tokens_per_frame = patches_per_side * patches_per_side + patches_per_side + 1
+
+    def estimate_memory(self, inputs):
+        """입력 하나를 생성하는 데 필요한 KV cache 메모리 추정치 (bytes)"""
+        n_frames = inputs['pixel_values'].shape[0] if inputs.get('pixel_values') is not None else 0
+        seq_len = inputs['input_ids'].shape[1] + n_frames * self.tokens_per_frame
+        seq_len += self.generate_kwargs.get('max_new_tokens', 512)
+        return seq_len * self.kv_bytes_per_token
+
+    def make_batches(self, inputs_list):
+        """입력 순서를 유지하면서 메모리 예산과 max_batch_size 안에서 배치를 나눈다"""
+        batches, batch, batch_memory = [], [], 0
+        for index, inputs in enumerate(inputs_list):
+            memory = self.estimate_memory(inputs)
+            over_budget = self.memory_budget is not None and batch_memory + memory > self.memory_budget
+            if batch and (len(batch) >= self.max_batch_size or over_budget):
+                batches.append(batch)
+                batch, batch_memory = [], 0
+            batch.append(index)
+            batch_memory += memory
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def generate(self, inputs_list):
+        """입력 리스트의 캡션을 입력 순서대로 반환"""
+        captions = [""] * len(inputs_list)
+        for batch in self.make_batches(inputs_list):
+            for index, caption in zip(batch, self._generate_with_fallback([inputs_list[i] for i in batch])):
+                captions[index] = caption
+        return captions
+
+    def _generate_with_fallback(self, inputs_list):
+        try:
+            return self._generate_batch(inputs_list)
+        except torch.cuda.OutOfMemoryError:
+            torch.cuda.empty_cache()
+            if len(inputs_list) == 1:
+                print("🚨 단일 입력에서도 메모리 부족, 건너뜀")
+                return [""]
+            # 배치를 반으로 나눠 재시도하고, 이후 배치 크기도 줄인다
+            half = len(inputs_list) // 2
+            self.max_batch_size = max(1, min(self.max_batch_size, half))
+            print(f"⚠️ 메모리 부족, 배치 분할 후 재시도 (배치 크기: {len(inputs_list)} -> {half})")
+            return self._generate_with_fallback(inputs_list[:half]) + self._generate_with_fallback(inputs_list[half:])
+
+    def _generate_batch(self, inputs_list):
+        batch_inputs = collate_inputs(inputs_list, self.pad_id)
+        batch_inputs = {k: v.to(self.model.device) for k, v in batch_inputs.items()}
+        with torch.inference_mode():
+            outputs = self.model.generate(**batch_inputs, **self.generate_kwargs)
+        prompt_len = batch_inputs['input_ids'].shape[1]
+        return self.processor.tokenizer.batch_decode(outputs[:, prompt_len:], skip_special_tokens=True)
+
 def file_to_base64(img_path):
     with open(img_path, 'rb') as video_file:
         video_b64_str = base64.b64encode(video_file.read()).decode()